@@ -0,0 +1,44 @@
+"""Store benchmark results as JSON baseline and compare against it"""
+
+import json
+import platform
+import sys
+import time
+
+from modules.console_colors import ULTRASINGER_HEAD, green_highlighted, red_highlighted
+
+
+def save_results(results: dict[str, float], file_path: str) -> None:
+    """Save results in seconds as baseline"""
+    baseline = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(file_path, "w", encoding="utf-8") as file:
+        json.dump(baseline, file, indent=2)
+    print(f"{ULTRASINGER_HEAD} Saved baseline -> {file_path}")
+
+
+def compare_results(results: dict[str, float], file_path: str, threshold: float) -> list[str]:
+    """Compare results with a baseline and return the names of all regressions
+
+    A result is a regression if it is slower than the baseline by more than threshold, e.g. 0.2 for 20%.
+    """
+    with open(file_path, "r", encoding="utf-8") as file:
+        baseline = json.load(file)["results"]
+
+    regressions = []
+    for name, seconds in results.items():
+        if name not in baseline:
+            print(f"{ULTRASINGER_HEAD} {name}: {seconds:.4f}s (no baseline)")
+            continue
+        ratio = seconds / baseline[name] if baseline[name] > 0 else float("inf")
+        text = f"{name}: {seconds:.4f}s vs {baseline[name]:.4f}s ({ratio:.2f}x)"
+        if ratio > 1 + threshold:
+            regressions.append(name)
+            print(f"{ULTRASINGER_HEAD} {red_highlighted('regression')} {text}")
+        else:
+            print(f"{ULTRASINGER_HEAD} {green_highlighted('ok')} {text}")
+    return regressions
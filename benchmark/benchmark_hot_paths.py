@@ -0,0 +1,187 @@
+"""Benchmark of the pure Python hot paths between the models
+
+Usage from the repository root:
+    python benchmark/benchmark_hot_paths.py --save benchmark/baseline.json
+    python benchmark/benchmark_hot_paths.py --compare benchmark/baseline.json --threshold 0.2
+    python benchmark/benchmark_hot_paths.py --sizes song,album,live_set --cases remove_silence,calculate_score
+
+Sizes are a 3 minute song (default), a 45 minute album and a 2 hour live set.
+The large sizes show the scaling of the functions and can take a long time.
+"""
+
+import argparse
+import contextlib
+import copy
+import io
+import os
+import sys
+import tempfile
+import time
+from dataclasses import dataclass
+from typing import Any, Callable
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from baseline import compare_results, save_results
+from synthetic_data import (
+    SONG_SIZES,
+    SongSize,
+    create_midi_segments,
+    create_pitched_data,
+    create_silence_parts,
+    create_transcribed_data,
+    create_ultrastar_txt_value,
+    write_ultrastar_txt,
+)
+
+from modules.Audio.silence_processing import remove_silence
+from modules.Midi.midi_creator import create_midi_notes_from_pitched_data
+from modules.Ultrastar import ultrastar_parser
+from modules.Ultrastar.ultrastar_score_calculator import calculate_score
+from modules.Ultrastar.ultrastar_writer import create_ultrastar_txt
+from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted
+
+REAL_BPM = 120.0
+
+
+@dataclass
+class SongData:
+    """Synthetic inputs of one song size"""
+    size: SongSize
+    folder: str
+    pitched_data: Any
+    transcribed_data: list
+    silence_parts: list
+    midi_segments: list
+    ultrastar_txt: Any
+    ultrastar_txt_path: str
+
+
+@dataclass
+class BenchmarkCase:
+    """Function under test, setup creates fresh arguments for every repeat
+
+    load returns the function and is called once before the timed repeats, so imports are not timed.
+    """
+    name: str
+    setup: Callable[[SongData], tuple]
+    load: Callable[[], Callable[..., Any]]
+
+
+def __load_runner_function(name: str) -> Callable:
+    """Functions of UltraSinger.py, which imports the model backends"""
+    import UltraSinger
+    return getattr(UltraSinger, name)
+
+
+def create_song_data(size: SongSize, folder: str) -> SongData:
+    transcribed_data = create_transcribed_data(size.duration_seconds)
+    ultrastar_txt = create_ultrastar_txt_value(transcribed_data)
+    ultrastar_txt_path = os.path.join(folder, f"{size.name}.txt")
+    write_ultrastar_txt(ultrastar_txt, ultrastar_txt_path)
+    return SongData(
+        size=size,
+        folder=folder,
+        pitched_data=create_pitched_data(size.duration_seconds),
+        transcribed_data=transcribed_data,
+        silence_parts=create_silence_parts(transcribed_data),
+        midi_segments=create_midi_segments(transcribed_data),
+        ultrastar_txt=ultrastar_txt,
+        ultrastar_txt_path=ultrastar_txt_path,
+    )
+
+
+CASES = [
+    BenchmarkCase(
+        "remove_silence",
+        lambda data: (data.silence_parts, copy.deepcopy(data.transcribed_data)),
+        lambda: remove_silence,
+    ),
+    BenchmarkCase(
+        "create_midi_notes_from_pitched_data",
+        lambda data: ([d.start for d in data.transcribed_data], [d.end for d in data.transcribed_data],
+                      [d.word for d in data.transcribed_data], data.pitched_data),
+        lambda: create_midi_notes_from_pitched_data,
+    ),
+    BenchmarkCase(
+        "split_syllables_into_segments",
+        lambda data: (copy.deepcopy(data.transcribed_data), REAL_BPM),
+        lambda: __load_runner_function("split_syllables_into_segments"),
+    ),
+    BenchmarkCase(
+        "merge_syllable_segments",
+        lambda data: (copy.deepcopy(data.midi_segments), copy.deepcopy(data.transcribed_data), REAL_BPM),
+        lambda: __load_runner_function("merge_syllable_segments"),
+    ),
+    BenchmarkCase(
+        "calculate_score",
+        lambda data: (data.pitched_data, data.ultrastar_txt),
+        lambda: calculate_score,
+    ),
+    BenchmarkCase(
+        "ultrastar_parser.parse",
+        lambda data: (data.ultrastar_txt_path,),
+        lambda: ultrastar_parser.parse,
+    ),
+    BenchmarkCase(
+        "create_ultrastar_txt",
+        lambda data: (data.midi_segments, os.path.join(data.folder, "output.txt"), copy.deepcopy(data.ultrastar_txt),
+                      REAL_BPM),
+        lambda: create_ultrastar_txt,
+    ),
+]
+
+
+def run_case(case: BenchmarkCase, data: SongData, repeat: int) -> float:
+    """Best time of all repeats in seconds, the output of the function is suppressed"""
+    run = case.load()
+    best = float("inf")
+    for _ in range(repeat):
+        args = case.setup(data)
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run(*args)
+            best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_benchmarks(size_names: list[str], case_names: list[str], repeat: int) -> dict[str, float]:
+    results = {}
+    with tempfile.TemporaryDirectory() as folder:
+        for size in [size for size in SONG_SIZES if size.name in size_names]:
+            print(f"{ULTRASINGER_HEAD} Creating {blue_highlighted(size.name)} ({size.duration_seconds / 60:.0f} min)")
+            data = create_song_data(size, folder)
+            for case in [case for case in CASES if case.name in case_names]:
+                name = f"{size.name}/{case.name}"
+                try:
+                    results[name] = run_case(case, data, repeat)
+                except ImportError as error:
+                    print(f"{ULTRASINGER_HEAD} {name}: skipped, {error}")
+                    continue
+                print(f"{ULTRASINGER_HEAD} {name}: {results[name]:.4f}s")
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="song",
+                        help=f"Comma separated song sizes of {', '.join(size.name for size in SONG_SIZES)}")
+    parser.add_argument("--cases", default=",".join(case.name for case in CASES),
+                        help="Comma separated functions to benchmark")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeats per function, the best time is used")
+    parser.add_argument("--save", help="Save the results as baseline JSON")
+    parser.add_argument("--compare", help="Compare the results with a baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    results = run_benchmarks(args.sizes.split(","), args.cases.split(","), args.repeat)
+    if args.save:
+        save_results(results, args.save)
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
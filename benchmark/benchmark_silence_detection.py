@@ -0,0 +1,78 @@
+"""Benchmark of the silence detection against pydub.silence.detect_silence
+
+Usage from the repository root:
+    python benchmark/benchmark_silence_detection.py
+    python benchmark/benchmark_silence_detection.py --minutes 60 --skip_pydub --save silence.json
+
+pydub checks every millisecond window in Python and takes minutes for an hour of audio.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+from baseline import compare_results, save_results
+from synthetic_data import create_vocal_samples
+
+from modules.Audio.silence_processing import detect_silence
+from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted
+
+SAMPLE_RATE = 16000
+
+
+def detect_silence_with_pydub(int_samples: np.ndarray, sample_rate: int) -> list:
+    from pydub import AudioSegment, silence
+
+    segment = AudioSegment(int_samples.tobytes(), sample_width=2, frame_rate=sample_rate, channels=1)
+    return silence.detect_silence(segment, min_silence_len=50, silence_thresh=-50)
+
+
+def measure(function, *args) -> tuple[float, list]:
+    start = time.perf_counter()
+    result = function(*args)
+    return time.perf_counter() - start, result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--minutes", type=float, default=60, help="Length of the synthetic audio")
+    parser.add_argument("--skip_pydub", action="store_true", help="Only measure the NumPy detection")
+    parser.add_argument("--save", help="Save the results as baseline JSON")
+    parser.add_argument("--compare", help="Compare the results with a baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    print(f"{ULTRASINGER_HEAD} Creating {blue_highlighted(f'{args.minutes:g} min')} of vocals at {SAMPLE_RATE} Hz")
+    samples = create_vocal_samples(args.minutes * 60, SAMPLE_RATE)
+
+    results = {}
+    seconds, sections = measure(detect_silence, samples, SAMPLE_RATE)
+    results[f"{args.minutes:g}min/detect_silence"] = seconds
+    print(f"{ULTRASINGER_HEAD} NumPy: {seconds:.2f}s, {len(sections)} silent sections")
+
+    if not args.skip_pydub:
+        pydub_seconds, pydub_sections = measure(detect_silence_with_pydub, samples, SAMPLE_RATE)
+        results[f"{args.minutes:g}min/pydub_detect_silence"] = pydub_seconds
+        equal = [tuple(section) for section in pydub_sections] == sections
+        print(
+            f"{ULTRASINGER_HEAD} pydub: {pydub_seconds:.2f}s, speedup {pydub_seconds / seconds:.0f}x, "
+            f"{'same' if equal else 'different'} sections"
+        )
+        if not equal:
+            return 1
+
+    if args.save:
+        save_results(results, args.save)
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+"""Benchmark of the startup time of UltraSinger
+
+Measures the time to the first output line and the total time of UltraSinger runs in a new process.
+-h is always measured. With --txt an UltraStar txt input is measured and with --audio a fully cached run,
+which is run once before to fill the cache.
+
+Usage from the repository root:
+    python benchmark/benchmark_startup.py --save startup.json
+    python benchmark/benchmark_startup.py --txt "input/song.txt" --audio "input/song.mp3" --compare startup.json
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+SRC_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+sys.path.insert(0, SRC_FOLDER)
+
+from baseline import compare_results, save_results
+
+from modules.console_colors import ULTRASINGER_HEAD
+
+
+def measure_run(args: list[str]) -> tuple[float, float]:
+    """Seconds to the first output line and to the end of the process"""
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "UltraSinger.py", *args],
+        cwd=SRC_FOLDER,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+        stdin=subprocess.DEVNULL,
+        env={**os.environ, "PYTHONUNBUFFERED": "1"},
+    )
+    process.stdout.readline()
+    first_output = time.perf_counter() - start
+    process.stdout.read()
+    process.wait()
+    total = time.perf_counter() - start
+    if process.returncode != 0:
+        raise RuntimeError(f"UltraSinger {' '.join(args)} failed with exit code {process.returncode}")
+    return first_output, total
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--txt", help="UltraStar txt input to measure")
+    parser.add_argument("--audio", help="Audio input to measure with a filled cache")
+    parser.add_argument("--repeat", type=int, default=3, help="Repeats per run, the best time is used")
+    parser.add_argument("--save", help="Save the results as baseline JSON")
+    parser.add_argument("--compare", help="Compare the results with a baseline JSON")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed slowdown against the baseline")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as folder:
+        cache_args = ["--cache_path", os.path.join(folder, "cache")]
+        runs = {"help": ["-h"]}
+        if args.txt:
+            runs["ultrastar_txt"] = ["-i", args.txt, "-o", os.path.join(folder, "txt"), *cache_args]
+        if args.audio:
+            runs["cached_audio"] = ["-i", args.audio, "-o", os.path.join(folder, "audio"), *cache_args]
+            print(f"{ULTRASINGER_HEAD} Filling cache with {args.audio}")
+            measure_run(runs["cached_audio"])
+
+        results = {}
+        for name, run_args in runs.items():
+            times = [measure_run(run_args) for _ in range(args.repeat)]
+            results[f"{name}/first_output"] = min(first_output for first_output, _ in times)
+            results[f"{name}/total"] = min(total for _, total in times)
+            print(
+                f"{ULTRASINGER_HEAD} {name}: first output {results[f'{name}/first_output']:.2f}s, "
+                f"total {results[f'{name}/total']:.2f}s"
+            )
+
+    if args.save:
+        save_results(results, args.save)
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.threshold)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
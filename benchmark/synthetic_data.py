@@ -0,0 +1,155 @@
+"""Synthetic inputs of realistic size for the benchmarks"""
+
+import random
+from dataclasses import dataclass
+
+import numpy as np
+
+from modules.Midi.MidiSegment import MidiSegment
+from modules.Pitcher.pitched_data import PitchedData
+from modules.Speech_Recognition.TranscribedData import TranscribedData
+from modules.Ultrastar.ultrastar_txt import UltrastarNoteLine, UltrastarTxtNoteTypeTag, UltrastarTxtValue
+from modules.Ultrastar.coverter.ultrastar_converter import get_end_time, get_start_time
+
+# SwiftF0 step size, 256 samples at 16 kHz
+PITCH_STEP_SECONDS = 0.016
+SYLLABLES = ["la ", "na", "da ", "ya", "ma ", "ba", "oh ", "love ", "you", "night "]
+# Midi notes of C4 to C5
+NOTES = [60, 62, 64, 65, 67, 69, 71, 72]
+
+
+@dataclass
+class SongSize:
+    """Size of a synthetic song"""
+    name: str
+    duration_seconds: float
+
+
+SONG_SIZES = [
+    SongSize("song", 3 * 60),
+    SongSize("album", 45 * 60),
+    SongSize("live_set", 2 * 60 * 60),
+]
+
+
+def create_pitched_data(duration_seconds: float, seed: int = 0) -> PitchedData:
+    """Pitch curve of a singer with some unvoiced frames"""
+    rng = random.Random(seed)
+    count = int(duration_seconds / PITCH_STEP_SECONDS)
+    times = [i * PITCH_STEP_SECONDS for i in range(count)]
+    frequencies = []
+    confidence = []
+    frequency = 220.0
+    for _ in range(count):
+        frequency = min(max(frequency * rng.uniform(0.98, 1.02), 80.0), 1000.0)
+        voiced = rng.random() > 0.2
+        frequencies.append(frequency if voiced else 0.0)
+        confidence.append(rng.uniform(0.5, 1.0) if voiced else rng.uniform(0.0, 0.4))
+    return PitchedData(times, frequencies, confidence)
+
+
+def create_vocal_samples(duration_seconds: float, sample_rate: int, seed: int = 0) -> np.ndarray:
+    """16 bit mono vocals, sung phrases of some seconds with quiet breath pauses between them"""
+    rng = np.random.default_rng(seed)
+    count = int(duration_seconds * sample_rate)
+    samples = np.empty(count, dtype=np.int16)
+    position = 0
+    singing = True
+    while position < count:
+        length = min(int(rng.uniform(0.2, 4.0 if singing else 1.5) * sample_rate), count - position)
+        amplitude = rng.integers(2000, 12000) if singing else rng.integers(0, 60)
+        samples[position:position + length] = rng.integers(-amplitude, amplitude + 1, length)
+        position += length
+        singing = not singing
+    return samples
+
+
+def create_transcribed_data(duration_seconds: float, seed: int = 0) -> list[TranscribedData]:
+    """Syllables of about two per second with breath pauses between lines"""
+    rng = random.Random(seed)
+    transcribed_data = []
+    time = 1.0
+    while time < duration_seconds - 2:
+        for _ in range(rng.randint(4, 10)):
+            length = rng.uniform(0.1, 0.9)
+            word = rng.choice(SYLLABLES)
+            transcribed_data.append(
+                TranscribedData(confidence=rng.random(), word=word, start=time, end=time + length,
+                                is_hyphen=False, is_word_end=word.endswith(" "))
+            )
+            time += length + rng.uniform(0.0, 0.1)
+        time += rng.uniform(0.5, 2.0)
+    return transcribed_data
+
+
+def create_silence_parts(transcribed_data: list[TranscribedData], seed: int = 0) -> list[tuple[float, float]]:
+    """Silence between lines and short silences inside some syllables"""
+    rng = random.Random(seed)
+    silence_parts = []
+    previous_end = 0.0
+    for data in transcribed_data:
+        if data.start - previous_end > 0.05:
+            silence_parts.append((round(previous_end, 3), round(data.start, 3)))
+        duration = data.end - data.start
+        if duration > 0.4 and rng.random() < 0.3:
+            start = data.start + duration * 0.4
+            silence_parts.append((round(start, 3), round(start + 0.08, 3)))
+        previous_end = data.end
+    return sorted(set(silence_parts))
+
+
+def create_midi_segments(transcribed_data: list[TranscribedData], seed: int = 0) -> list[MidiSegment]:
+    """Midi segments with the timing of the transcribed data"""
+    rng = random.Random(seed)
+    note = rng.choice(NOTES)
+    midi_segments = []
+    for data in transcribed_data:
+        # Repeated notes to trigger merging
+        if rng.random() < 0.5:
+            note = rng.choice(NOTES)
+        midi_segments.append(MidiSegment(note, data.start, data.end, data.word))
+    return midi_segments
+
+
+def create_ultrastar_txt_value(transcribed_data: list[TranscribedData], bpm: float = 300.0,
+                               seed: int = 0) -> UltrastarTxtValue:
+    """UltraStar txt with one note line per syllable"""
+    rng = random.Random(seed)
+    ultrastar_txt = UltrastarTxtValue()
+    ultrastar_txt.artist = "Benchmark"
+    ultrastar_txt.title = "Synthetic"
+    ultrastar_txt.mp3 = "Benchmark - Synthetic.mp3"
+    ultrastar_txt.bpm = str(bpm)
+    ultrastar_txt.gap = "0"
+    beats_per_second = bpm / 60 * 4
+    for data in transcribed_data:
+        start_beat = round(data.start * beats_per_second)
+        duration = max(1, round((data.end - data.start) * beats_per_second))
+        ultrastar_txt.UltrastarNoteLines.append(
+            UltrastarNoteLine(
+                startBeat=start_beat,
+                startTime=get_start_time(ultrastar_txt.gap, ultrastar_txt.bpm, start_beat),
+                endTime=get_end_time(ultrastar_txt.gap, ultrastar_txt.bpm, start_beat, duration),
+                duration=duration,
+                pitch=rng.randint(-5, 12),
+                word=data.word,
+                noteType=UltrastarTxtNoteTypeTag.NORMAL,
+            )
+        )
+    return ultrastar_txt
+
+
+def write_ultrastar_txt(ultrastar_txt: UltrastarTxtValue, file_path: str) -> None:
+    """Write a minimal UltraStar txt file to parse"""
+    lines = [
+        f"#ARTIST:{ultrastar_txt.artist}\n",
+        f"#TITLE:{ultrastar_txt.title}\n",
+        f"#MP3:{ultrastar_txt.mp3}\n",
+        f"#BPM:{ultrastar_txt.bpm}\n",
+        f"#GAP:{ultrastar_txt.gap}\n",
+    ]
+    for note_line in ultrastar_txt.UltrastarNoteLines:
+        lines.append(f": {note_line.startBeat} {note_line.duration} {note_line.pitch} {note_line.word}\n")
+    lines.append("E\n")
+    with open(file_path, "w", encoding="utf-8") as file:
+        file.writelines(lines)
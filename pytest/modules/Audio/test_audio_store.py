@@ -0,0 +1,75 @@
+"""Tests for audio_store.py"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+import soundfile as sf
+
+from modules.Audio import audio_store
+from modules.Audio.audio_store import clear_audio_store, load_audio, store_audio
+
+
+class AudioStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.audio_path = os.path.join(self.temp_dir.name, "song.wav")
+        samples = 0.5 * np.sin(np.linspace(0, 440 * 2 * np.pi, 44100))
+        sf.write(self.audio_path, np.stack([samples, samples], axis=1), 44100)
+
+    def tearDown(self):
+        clear_audio_store()
+        self.temp_dir.cleanup()
+
+    def test_file_is_decoded_and_resampled_once(self):
+        # Arrange
+        with patch.object(audio_store.librosa, "load", wraps=audio_store.librosa.load) as load, \
+                patch.object(audio_store.librosa, "resample", wraps=audio_store.librosa.resample) as resample:
+            # Act
+            native, native_sample_rate = load_audio(self.audio_path)
+            first_16k, _ = load_audio(self.audio_path, 16000)
+            second_16k, sample_rate = load_audio(self.audio_path, 16000)
+
+        # Assert
+        self.assertEqual(load.call_count, 1)
+        self.assertEqual(resample.call_count, 1)
+        self.assertEqual(native_sample_rate, 44100)
+        self.assertEqual(native.shape, (44100,))
+        self.assertEqual(native.dtype, np.float32)
+        self.assertEqual(sample_rate, 16000)
+        self.assertEqual(first_16k.shape, (16000,))
+        self.assertIs(first_16k, second_16k)
+        self.assertFalse(native.flags.writeable)
+
+    def test_rewritten_file_is_decoded_again(self):
+        # Arrange
+        load_audio(self.audio_path)
+        sf.write(self.audio_path, np.zeros(22050), 22050)
+
+        # Act
+        samples, sample_rate = load_audio(self.audio_path)
+
+        # Assert
+        self.assertEqual(sample_rate, 22050)
+        self.assertFalse(samples.any())
+
+    def test_stored_audio_is_not_decoded(self):
+        # Arrange
+        samples = np.linspace(-0.5, 0.5, 8000, dtype=np.float32)
+        sf.write(self.audio_path, samples, 8000, subtype="FLOAT")
+
+        # Act
+        store_audio(self.audio_path, samples, 8000)
+        with patch.object(audio_store.librosa, "load") as load:
+            loaded, sample_rate = load_audio(self.audio_path)
+
+        # Assert
+        load.assert_not_called()
+        self.assertEqual(sample_rate, 8000)
+        self.assertTrue(np.array_equal(loaded, sf.read(self.audio_path, dtype="float32")[0]))
+
+
+if __name__ == "__main__":
+    unittest.main()
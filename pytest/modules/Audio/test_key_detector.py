@@ -0,0 +1,164 @@
+"""Tests for key_detector.py"""
+
+import unittest
+from unittest.mock import patch
+
+import librosa
+import numpy as np
+
+from modules.Audio import key_detector
+from modules.Audio.key_detector import (
+    NOTE_NAMES,
+    KeyMap,
+    best_keys,
+    compute_chroma,
+    correlate_with_key_templates,
+    detect_key_map,
+    get_allowed_notes_for_key,
+    quantize_midi_note_to_key,
+    quantize_midi_notes_to_key,
+    quantize_note_to_key,
+)
+
+
+SAMPLE_RATE = 16000
+
+
+def reference_best_key(chroma_avg: np.ndarray) -> tuple[str, str]:
+    """Key detection with one np.corrcoef per template"""
+    major_template = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1])
+    minor_template = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0])
+    major_template = major_template / np.sum(major_template)
+    minor_template = minor_template / np.sum(minor_template)
+    best_correlation = -1
+    best_key = None
+    for shift in range(12):
+        major_corr = np.corrcoef(chroma_avg, np.roll(major_template, shift))[0, 1]
+        minor_corr = np.corrcoef(chroma_avg, np.roll(minor_template, shift))[0, 1]
+        if major_corr > best_correlation:
+            best_correlation = major_corr
+            best_key = (NOTE_NAMES[shift], 'major')
+        if minor_corr > best_correlation:
+            best_correlation = minor_corr
+            best_key = (NOTE_NAMES[shift], 'minor')
+    return best_key
+
+
+def create_scale_audio(root: int, seconds: float, rng: np.random.Generator,
+                       scale_steps: tuple[int, ...] = (0, 2, 4, 5, 7, 9, 11),
+                       probabilities: tuple[float, ...] = (0.3, 0.1, 0.2, 0.1, 0.2, 0.05, 0.05)) -> np.ndarray:
+    """Random quarter second tones of a major scale"""
+    steps = rng.choice(scale_steps, size=int(seconds * 4), p=probabilities)
+    times = np.arange(SAMPLE_RATE // 4) / SAMPLE_RATE
+    return np.concatenate([0.3 * np.sin(2 * np.pi * librosa.midi_to_hz(60 + root + step) * times)
+                           for step in steps]).astype(np.float32)
+
+
+class KeyDetectorTest(unittest.TestCase):
+    def test_quantized_midi_note_equals_quantized_note_name(self):
+        for key_note in NOTE_NAMES:
+            for mode in ["major", "minor"]:
+                allowed_notes = get_allowed_notes_for_key(key_note, mode)
+                # Octaves 0 to 8, which are searched by quantize_note_to_key
+                for midi_note in range(12, 120):
+                    with self.subTest(key=key_note, mode=mode, midi_note=midi_note):
+                        # Arrange
+                        expected = librosa.note_to_midi(
+                            quantize_note_to_key(librosa.midi_to_note(midi_note), allowed_notes))
+
+                        # Act
+                        result = quantize_midi_note_to_key(midi_note, allowed_notes)
+
+                        # Assert
+                        self.assertEqual(result, expected)
+
+    def test_quantized_midi_notes_equal_single_quantized_notes(self):
+        for key_note in NOTE_NAMES:
+            for mode in ["major", "minor"]:
+                with self.subTest(key=key_note, mode=mode):
+                    # Arrange
+                    allowed_notes = get_allowed_notes_for_key(key_note, mode)
+                    midi_notes = list(range(-13, 140))
+                    expected = [quantize_midi_note_to_key(midi_note, allowed_notes) for midi_note in midi_notes]
+
+                    # Act
+                    result = quantize_midi_notes_to_key(midi_notes, allowed_notes)
+
+                    # Assert
+                    self.assertEqual(result.tolist(), expected)
+
+    def test_chroma_of_blocks_equals_chroma_of_whole_audio(self):
+        # Arrange
+        rng = np.random.default_rng(0)
+        y = create_scale_audio(0, 20, rng) + 0.05 * rng.standard_normal(20 * SAMPLE_RATE).astype(np.float32)
+
+        # Act
+        with patch.object(key_detector, "CHROMA_BLOCK_SECONDS", 6.0):
+            result = compute_chroma(y, SAMPLE_RATE)
+
+        # Assert
+        expected = librosa.feature.chroma_cqt(y=y, sr=SAMPLE_RATE)
+        self.assertEqual(result.shape, expected.shape)
+        self.assertTrue(np.allclose(result, expected, atol=1e-5))
+
+    def test_template_correlation_equals_corrcoef(self):
+        # Arrange
+        rng = np.random.default_rng(0)
+        chroma_profiles = rng.random((200, 12))
+
+        # Act
+        result = best_keys(correlate_with_key_templates(chroma_profiles))
+
+        # Assert
+        self.assertEqual(result, [reference_best_key(profile / np.sum(profile)) for profile in chroma_profiles])
+
+    def test_key_map_follows_modulation(self):
+        # Arrange
+        rng = np.random.default_rng(0)
+        y = np.concatenate([create_scale_audio(0, 20, rng), create_scale_audio(4, 20, rng)])
+
+        # Act
+        with patch.object(key_detector, "KEY_SECTION_SECONDS", 10.0):
+            key_map = detect_key_map(y, SAMPLE_RATE)
+
+        # Assert
+        self.assertEqual(key_map.section_start_times.tolist(), [0.0, 20.0])
+        self.assertEqual(get_allowed_notes_for_key(*key_map.section_keys[0]), get_allowed_notes_for_key('C', 'major'))
+        self.assertEqual(get_allowed_notes_for_key(*key_map.section_keys[1]), get_allowed_notes_for_key('E', 'major'))
+
+    def test_ambiguous_section_keeps_key_of_song(self):
+        # Arrange
+        rng = np.random.default_rng(1)
+        # Tones of C major and G major, the section alone correlates best with E minor
+        ambiguous = create_scale_audio(0, 10, rng, (7, 9, 11, 2, 4, 6), (0.3, 0.15, 0.2, 0.2, 0.1, 0.05))
+        y = np.concatenate([create_scale_audio(0, 20, rng), ambiguous, create_scale_audio(0, 20, rng)])
+
+        # Act
+        with patch.object(key_detector, "KEY_SECTION_SECONDS", 10.0):
+            key_map = detect_key_map(y, SAMPLE_RATE)
+
+        # Assert
+        self.assertEqual((key_map.key, key_map.mode), ('C', 'major'))
+        self.assertEqual(key_map.section_keys, [('C', 'major')])
+        self.assertEqual(key_map.section_start_times.tolist(), [0.0])
+
+    def test_key_map_quantizes_to_key_of_section(self):
+        # Arrange
+        key_map = KeyMap('C', 'major', np.array([0.0, 30.0]), [('C', 'major'), ('E', 'major')])
+        # F4, in C major but not in E major
+        midi_notes = [65, 65, 65, 200]
+        times = [0.0, 29.9, 30.0, 40.0]
+
+        # Act
+        result = key_map.quantize(midi_notes, times)
+
+        # Assert
+        e_major = get_allowed_notes_for_key('E', 'major')
+        expected_f4 = quantize_midi_note_to_key(65, e_major)
+        self.assertEqual(result.tolist(), [65, 65, expected_f4, quantize_midi_note_to_key(200, e_major)])
+        self.assertIn(expected_f4, [64, 66])
+        self.assertEqual(key_map.allowed_notes_at(35.0), e_major)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,170 @@
+"""Tests for separation.py"""
+
+import os
+import tempfile
+import unittest
+from unittest.mock import patch
+
+import librosa
+import numpy as np
+import soundfile as sf
+
+from modules.Audio import audio_store, separation
+from modules.Audio.audio_store import clear_audio_store, load_audio
+from modules.Audio.separation import (
+    DemucsModel,
+    SeparatedAudio,
+    check_stems_match_audio,
+    get_window_bounds,
+    separate_decoded_audio_in_windows,
+    separate_vocal_from_audio,
+)
+from modules.stage_cache import StageCache
+
+SAMPLE_RATE = 8000
+
+
+def separate_in_fixed_parts(wav: np.ndarray) -> np.ndarray:
+    """Sources of fixed parts of the mix, the vocals are the first source"""
+    return np.stack([0.25 * wav, 0.5 * wav, 0.25 * wav])
+
+
+class SeparationTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = StageCache(os.path.join(self.temp_dir.name, "cache"), "1.0")
+        rng = np.random.default_rng(0)
+        self.samples = (0.3 * rng.standard_normal((10 * SAMPLE_RATE, 2)) + 0.01).astype(np.float32)
+        self.decoded_file_path = os.path.join(self.temp_dir.name, "decoded.wav")
+        sf.write(self.decoded_file_path, self.samples, SAMPLE_RATE, subtype="FLOAT")
+
+    def tearDown(self):
+        clear_audio_store()
+        self.temp_dir.cleanup()
+
+    def separate(self, output_folder: str, separate_window) -> list[str]:
+        os.makedirs(output_folder, exist_ok=True)
+        return separate_decoded_audio_in_windows(self.cache, self.decoded_file_path, self.decoded_file_path,
+                                                 output_folder, separate_window, 2, 0, {"model": "test"}, 3.0, 1.0)
+
+    def test_window_bounds_cover_audio_with_overlap(self):
+        for length in [1, 100, 299, 300, 301, 1000, 1234]:
+            with self.subTest(length=length):
+                # Act
+                bounds = get_window_bounds(length, 300, 100)
+
+                # Assert
+                self.assertEqual(bounds[0][0], 0)
+                self.assertEqual(bounds[-1][1], length)
+                for (start, end), (next_start, next_end) in zip(bounds, bounds[1:]):
+                    self.assertEqual(end - next_start, 100)
+                    self.assertGreater(next_end - next_start, 100)
+
+    def test_overlap_added_windows_equal_separation_of_whole_audio(self):
+        # Arrange
+        output_folder = os.path.join(self.temp_dir.name, "output")
+        mono = self.samples.mean(axis=1, dtype=np.float64)
+        mean = mono.mean()
+
+        # Act
+        window_paths = self.separate(output_folder, separate_in_fixed_parts)
+
+        # Assert
+        self.assertEqual(len(window_paths), 5)
+        vocals, sample_rate = sf.read(os.path.join(output_folder, "vocals.wav"))
+        instrumental, _ = sf.read(os.path.join(output_folder, "no_vocals.wav"))
+        self.assertEqual(sample_rate, SAMPLE_RATE)
+        self.assertTrue(np.allclose(vocals, 0.25 * (self.samples - mean) + mean, atol=1e-5))
+        # The peak of the instrumental is above 1, so it is rescaled
+        expected_instrumental = 0.75 * (self.samples - mean) + 2 * mean
+        expected_instrumental /= 1.01 * np.abs(expected_instrumental).max()
+        self.assertTrue(np.allclose(instrumental, expected_instrumental, atol=1e-5))
+
+    def test_interrupted_separation_resumes_with_missing_windows(self):
+        # Arrange
+        calls = []
+
+        def separate_until_interrupted(wav):
+            if len(calls) == 2:
+                raise KeyboardInterrupt
+            calls.append(len(wav[0]))
+            return separate_in_fixed_parts(wav)
+
+        with self.assertRaises(KeyboardInterrupt):
+            self.separate(os.path.join(self.temp_dir.name, "interrupted"), separate_until_interrupted)
+        calls.clear()
+
+        def separate_and_count(wav):
+            calls.append(len(wav[0]))
+            return separate_in_fixed_parts(wav)
+
+        # Act
+        self.separate(os.path.join(self.temp_dir.name, "resumed"), separate_and_count)
+
+        # Assert
+        self.assertEqual(len(calls), 3)
+        self.separate(os.path.join(self.temp_dir.name, "uninterrupted"), separate_in_fixed_parts)
+        for stem in ["vocals.wav", "no_vocals.wav"]:
+            resumed, _ = sf.read(os.path.join(self.temp_dir.name, "resumed", stem))
+            uninterrupted, _ = sf.read(os.path.join(self.temp_dir.name, "uninterrupted", stem))
+            self.assertTrue(np.array_equal(resumed, uninterrupted))
+
+    def test_separated_vocals_are_stored_in_memory(self):
+        # Arrange
+        wav = self.samples.T
+        separated = SeparatedAudio(0.25 * wav, 4 * wav, SAMPLE_RATE)
+
+        def separate_in_memory(input_file_path, model, device, segment):
+            return SeparatedAudio(separation._rescale_like_demucs(separated.vocals),
+                                  separation._rescale_like_demucs(separated.instrumental), SAMPLE_RATE)
+
+        # Act
+        with patch.object(separation, "separate_audio_in_memory", side_effect=separate_in_memory):
+            folder_path, separated_audio = separate_vocal_from_audio(self.cache, self.decoded_file_path, True, False,
+                                                                     lambda: "cpu", DemucsModel.HTDEMUCS)
+            cached_folder_path, cached_audio = separate_vocal_from_audio(self.cache, self.decoded_file_path, True,
+                                                                         False, lambda: "cpu", DemucsModel.HTDEMUCS)
+
+        # Assert
+        self.assertEqual(cached_folder_path, folder_path)
+        self.assertIsNone(cached_audio)
+        vocals_path = os.path.join(folder_path, "vocals.wav")
+        instrumental, _ = sf.read(os.path.join(folder_path, "no_vocals.wav"), dtype="float32", always_2d=True)
+        self.assertTrue(np.array_equal(instrumental.T, separated_audio.instrumental))
+        self.assertLess(np.abs(instrumental).max(), 1)
+        decoded_vocals, _ = librosa.load(vocals_path, sr=None, mono=True, dtype=np.float32)
+        # The stored vocals are returned without decoding the file
+        with patch.object(audio_store.librosa, "load", side_effect=AssertionError("decoded")):
+            stored_vocals, sample_rate = load_audio(vocals_path)
+        self.assertEqual(sample_rate, SAMPLE_RATE)
+        self.assertTrue(np.array_equal(stored_vocals, decoded_vocals))
+        self.assertTrue(np.array_equal(separated_audio.vocals, separated.vocals))
+
+    def test_stems_must_have_duration_of_audio(self):
+        # Arrange
+        infos = {"song.mp3": (180.0, 44100), "vocals.wav": (180.02, 48000), "no_vocals.wav": (150.0, 44100)}
+
+        # Act / Assert
+        with patch.object(separation, "get_audio_duration_and_sample_rate", side_effect=infos.get):
+            check_stems_match_audio("song.mp3", ["vocals.wav"])
+            with self.assertRaises(ValueError):
+                check_stems_match_audio("song.mp3", ["vocals.wav", "no_vocals.wav"])
+
+    def test_unreadable_stem_is_named(self):
+        # Arrange
+        def probe(file_path):
+            if file_path == "missing.wav":
+                raise Exception("FFprobe failed: missing.wav: No such file or directory")
+            return 180.0, 44100
+
+        # Act
+        with patch.object(separation, "get_audio_duration_and_sample_rate", side_effect=probe):
+            with self.assertRaises(ValueError) as context:
+                check_stems_match_audio("song.mp3", ["vocals.wav", "missing.wav"])
+
+        # Assert
+        self.assertIn("The stem missing.wav can not be read", str(context.exception))
+
+
+if __name__ == "__main__":
+    unittest.main()
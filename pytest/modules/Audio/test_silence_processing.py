@@ -1,10 +1,142 @@
 """Tests for silence_processing.py"""
 
+import copy
+import os
+import random
+import tempfile
 import unittest
+
+import numpy as np
+import soundfile as sf
+from pydub import AudioSegment, silence
+
 from src.modules.Audio.silence_processing import remove_silence
+from modules.Audio.audio_store import clear_audio_store
+from modules.Audio.silence_processing import detect_silence, mute_no_singing_parts, mute_silence_sections
 from modules.Speech_Recognition.TranscribedData import TranscribedData
 
 
+# Implementation before the sweep, which visited every silence for every word
+def reference_remove_silence(silence_parts_list: list[tuple[float, float]], transcribed_data: list[TranscribedData]):
+    new_transcribed_data = []
+
+    for data in transcribed_data:
+        new_transcribed_data.append(data)
+
+        origin_end = data.end
+        was_split = False
+
+        for silence_start, silence_end in silence_parts_list:
+
+            # |    ****    | silence
+            # |  **    **  | data
+            # |0 1 2 3 4 5 | time
+            if silence_start > origin_end or silence_end < data.start:
+                continue
+
+            # |    **  **    | silence
+            # |  **********  | data
+            # |0 1 2 3 4 5 6 | time
+            if silence_start >= data.start and silence_end <= origin_end:
+                next_index = silence_parts_list.index((silence_start, silence_end)) + 1
+                if next_index < len(silence_parts_list) and silence_parts_list[next_index][0] < origin_end:
+                    split_end = silence_parts_list[next_index][0]
+
+                    if silence_parts_list[next_index][1] >= origin_end:
+                        split_word = "~ "
+                        is_word_end = True
+                    else:
+                        split_word = "~"
+                        is_word_end = False
+                else:
+                    split_end = origin_end
+                    split_word = "~ "
+                    is_word_end = True
+
+                split_data = TranscribedData(confidence=data.confidence, word=split_word, end=split_end, start=silence_end, is_word_end=is_word_end)
+
+                if not was_split:
+                    data.end = silence_start
+
+                    if data.end - data.start < 0.1:
+                        data.start = silence_end
+                        data.end = split_end
+                        continue
+
+                    if split_data.end - split_data.start <= 0.1:
+                        continue
+
+                    data.is_word_end = False
+
+                    # Remove last whitespace from the data.word
+                    if data.word[-1] == " ":
+                        data.word = data.word[:-1]
+
+                if split_data.end - split_data.start > 0.1:
+                    was_split = True
+                    new_transcribed_data.append(split_data)
+                elif split_word == "~ " and not data.is_word_end:
+                    if new_transcribed_data[-1].word[-1] != " ":
+                        new_transcribed_data[-1].word += " "
+                    new_transcribed_data[-1].is_word_end = True
+
+                continue
+
+            # |    ****  | silence
+            # |     **   | data
+            # |0 1 2 3 4 | time
+            if silence_start < data.start and silence_end > origin_end:
+                new_transcribed_data.remove(data)
+                break
+
+            # |    ****    | silence
+            # |      ****  | data
+            # |0 1 2 3 4 5 | time
+            if silence_start < data.start:
+                data.start = silence_end
+
+            # |    ****  | silence
+            # |  ****    | data
+            # |0 1 2 3 4 | time
+            if silence_end > origin_end:
+                data.end = silence_start
+
+            # |    ****  | silence
+            # |  **      | data
+            # |0 1 2 3 4 | time
+            if silence_start > origin_end:
+                # Nothing to do with this word anymore, go to next word
+                break
+    return new_transcribed_data
+
+
+def create_random_data(rng: random.Random, sorted_silences: bool):
+    """Words and silences on a 10 ms grid, so that starts and ends often coincide"""
+    transcribed_data = []
+    time = 0.0
+    for _ in range(rng.randint(0, 60)):
+        time += rng.choice([0, 0, 1, 5, 20]) / 100
+        duration = rng.randint(0, 150) / 100
+        data = TranscribedData(word=rng.choice(["la ", "na", "oh "]), confidence=0.9, start=round(time, 2),
+                               end=round(time + duration, 2), is_word_end=rng.random() < 0.5)
+        transcribed_data.append(data)
+        if rng.random() < 0.05:
+            transcribed_data.append(copy.copy(data))
+        time += duration * rng.choice([0.5, 1])
+
+    silence_parts_list = []
+    time = 0.0
+    for _ in range(rng.randint(0, 80)):
+        start = round(time + rng.randint(1, 60) / 100, 2)
+        end = round(start + rng.randint(0, 200) / 100, 2)
+        silence_parts_list.append((start, end))
+        time = end
+    if not sorted_silences:
+        silence_parts_list += [(s, e) for s, e in silence_parts_list if rng.random() < 0.2]
+        rng.shuffle(silence_parts_list)
+    return transcribed_data, silence_parts_list
+
+
 class SilenceProcessingTest(unittest.TestCase):
     def test_remove_silence2(self):
         #
@@ -187,5 +319,65 @@ class SilenceProcessingTest(unittest.TestCase):
         self.assertEqual(result[3].end, 7.0)
         self.assertEqual(result[3].is_word_end, True)
 
+    def test_mute_in_memory_equals_mute_of_file(self):
+        # Arrange
+        sample_rate = 16000
+        rng = np.random.default_rng(0)
+        singing = np.sin(np.linspace(0, 30, 3 * sample_rate)) > 0
+        # Quiet noise below -50 dB between the sung parts
+        amplitude = np.where(singing, 8000, 40)
+        samples = rng.integers(-amplitude, amplitude).astype(np.float32) / 32768
+
+        with tempfile.TemporaryDirectory() as folder:
+            mono_path = os.path.join(folder, "mono.wav")
+            mute_path = os.path.join(folder, "mute.wav")
+            sf.write(mono_path, samples, sample_rate)
+
+            # Act
+            mute_no_singing_parts(mono_path, mute_path)
+            muted_file, _ = sf.read(mute_path, dtype="float32")
+            muted_in_memory = mute_silence_sections(samples.copy(), sample_rate)
+            clear_audio_store()
+
+        # Assert
+        self.assertTrue(np.array_equal(muted_file, muted_in_memory))
+        self.assertLess(np.count_nonzero(muted_in_memory), np.count_nonzero(samples))
+
+    def test_detect_silence_equals_pydub(self):
+        rng = np.random.default_rng(0)
+        for sample_rate in [8000, 16000, 22050, 44100, 48000]:
+            for length in [30, 799, 3 * sample_rate, 5 * sample_rate + 7]:
+                # Arrange
+                # Loud and quiet parts of 100 samples
+                loud = np.repeat(rng.random(length // 100 + 1) > 0.5, 100)[:length]
+                amplitude = np.where(loud, rng.integers(1, 9000), rng.integers(0, 200))
+                samples = rng.integers(-amplitude, amplitude + 1).astype(np.int16)
+                segment = AudioSegment(samples.tobytes(), sample_width=2, frame_rate=sample_rate, channels=1)
+
+                for min_silence_len, silence_thresh in [(50, -50), (10, -40), (100, -45)]:
+                    with self.subTest(sample_rate=sample_rate, length=length, min_silence_len=min_silence_len):
+                        # Act
+                        expected = silence.detect_silence(segment, min_silence_len, silence_thresh)
+                        result = detect_silence(samples, sample_rate, min_silence_len, silence_thresh)
+
+                        # Assert
+                        self.assertEqual(result, [tuple(section) for section in expected])
+
+    def test_remove_silence_equals_reference(self):
+        rng = random.Random(0)
+        for i in range(2000):
+            with self.subTest(i=i):
+                # Arrange
+                transcribed_data, silence_parts_list = create_random_data(rng, sorted_silences=i % 4 != 0)
+                reference_data = copy.deepcopy(transcribed_data)
+
+                # Act
+                expected = reference_remove_silence(silence_parts_list, reference_data)
+                result = remove_silence(silence_parts_list, transcribed_data)
+
+                # Assert
+                self.assertEqual(result, expected)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,63 @@
+"""Tests for midi_creator.py"""
+
+import random
+import unittest
+
+from modules.Midi.midi_creator import create_midi_note_from_pitched_data, create_midi_notes_from_pitched_data
+from modules.Pitcher.pitched_data import PitchedData
+
+
+class MidiCreatorTest(unittest.TestCase):
+    def test_notes_of_all_segments_equal_single_segments(self):
+        rng = random.Random(0)
+        for i in range(300):
+            with self.subTest(i=i):
+                # Arrange
+                count = rng.randint(1, 300)
+                times = [frame * 0.016 for frame in range(count)]
+                # Few pitches give ties between the most frequent notes
+                frequencies = [rng.uniform(80, 900) if rng.random() < 0.3 else rng.choice([220.0, 233.08, 440.0])
+                               for _ in range(count)]
+                confidence = [rng.random() for _ in range(count)]
+                pitched_data = PitchedData(times, frequencies, confidence)
+                start_times = [rng.uniform(-0.1, count * 0.016 + 0.1) for _ in range(rng.randint(0, 20))]
+                end_times = [start_time + rng.uniform(0, 0.5) for start_time in start_times]
+                words = [f"word{index} " for index in range(len(start_times))]
+                allowed_notes = {"C", "D", "E", "F", "G", "A", "B"} if i % 3 == 0 else None
+
+                # Act
+                expected = [create_midi_note_from_pitched_data(start_time, end_times[index], pitched_data, words[index],
+                                                               allowed_notes)
+                            for index, start_time in enumerate(start_times)]
+                result = create_midi_notes_from_pitched_data(start_times, end_times, words, pitched_data,
+                                                             allowed_notes)
+
+                # Assert
+                self.assertEqual(result, expected)
+
+    def test_confidence_threshold_is_compared_as_float(self):
+        # Arrange
+        # float32(0.4) is slightly above 0.4, so the first two frames have a high confidence
+        pitched_data = PitchedData([0.0, 0.016, 0.032, 0.048], [220.0, 440.0, 440.0, 440.0], [0.4, 0.4, 0.1, 0.1])
+
+        # Act
+        single = create_midi_note_from_pitched_data(0.0, 0.048, pitched_data, "word")
+        batched = create_midi_notes_from_pitched_data([0.0], [0.048], ["word"], pitched_data)
+
+        # Assert
+        self.assertEqual(single.note, "A3")
+        self.assertEqual(batched, [single])
+
+    def test_segment_without_frames_raises_like_single_segment(self):
+        # Arrange
+        pitched_data = PitchedData([0.0, 0.016, 0.032], [220.0, 220.0, 440.0], [1.0, 1.0, 1.0])
+
+        # Act / Assert
+        with self.assertRaises(IndexError):
+            create_midi_note_from_pitched_data(0.032, 0.0, pitched_data, "word")
+        with self.assertRaises(IndexError):
+            create_midi_notes_from_pitched_data([0.0, 0.032], [0.016, 0.0], ["a", "b"], pitched_data)
+
+
+if __name__ == "__main__":
+    unittest.main()
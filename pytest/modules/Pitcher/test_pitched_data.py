@@ -0,0 +1,79 @@
+"""Tests for pitched_data.py"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from modules.Pitcher.pitched_data import PitchedData, load_pitched_data, save_pitched_data
+
+
+class PitchedDataTest(unittest.TestCase):
+    def test_detector_arrays_are_not_copied(self):
+        # Arrange
+        times = np.array([0.00796875, 0.02396875])
+        frequencies = np.array([220.0, 0.0], dtype=np.float32)
+        confidence = np.array([0.9, 0.1], dtype=np.float32)
+
+        # Act
+        pitched_data = PitchedData(times, frequencies, confidence)
+
+        # Assert
+        self.assertIs(pitched_data.times, times)
+        self.assertIs(pitched_data.frequencies, frequencies)
+        self.assertIs(pitched_data.confidence, confidence)
+
+    def test_save_and_load_memory_mapped(self):
+        # Arrange
+        pitched_data = PitchedData([0.00796875, 0.02396875], [220.5, 0.0], [0.9, 0.1])
+
+        with tempfile.TemporaryDirectory() as folder:
+            # Act
+            save_pitched_data(pitched_data, folder)
+            loaded = load_pitched_data(folder, mmap_mode="r")
+
+            # Assert
+            self.assertEqual(loaded, pitched_data)
+            self.assertIsInstance(loaded.times.base, np.memmap)
+            self.assertEqual(loaded.times.dtype, np.float64)
+            self.assertEqual(loaded.frequencies.dtype, np.float32)
+            del loaded
+
+    def test_loaded_data_outlives_removed_entry(self):
+        # Arrange
+        pitched_data = PitchedData([0.00796875, 0.02396875], [220.5, 0.0], [0.9, 0.1])
+        temp_dir = tempfile.TemporaryDirectory()
+        entry_path = os.path.join(temp_dir.name, "pitch", "key")
+        os.makedirs(entry_path)
+        save_pitched_data(pitched_data, entry_path)
+
+        # Act
+        loaded = load_pitched_data(entry_path)
+        # Fails on Windows while a file of the entry is memory mapped
+        shutil.rmtree(entry_path)
+        temp_dir.cleanup()
+
+        # Assert
+        self.assertNotIsInstance(loaded.times.base, np.memmap)
+        self.assertEqual(loaded, pitched_data)
+
+    def test_load_json_of_older_versions(self):
+        # Arrange
+        json = '{"times": [0.00796875, 0.02396875], "frequencies": [220.5, 0.0], "confidence": [0.5, 0.25]}'
+
+        with tempfile.TemporaryDirectory() as folder:
+            with open(os.path.join(folder, "pitched_data.json"), "w", encoding="utf-8") as file:
+                file.write(json)
+
+            # Act
+            loaded = load_pitched_data(folder)
+
+        # Assert
+        self.assertEqual(loaded, PitchedData([0.00796875, 0.02396875], [220.5, 0.0], [0.5, 0.25]))
+        self.assertEqual(loaded.to_json(), json)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,10 +1,16 @@
 """Tests for pitcher.py"""
 
 import os
+import tempfile
 import unittest
+from unittest.mock import patch
+
+import numpy as np
+import soundfile as sf
 import src.modules.Pitcher.pitcher as test_subject
 import pytest
 from src.modules.plot import plot
+from modules.Audio.audio_store import clear_audio_store
 
 
 class PitcherTest(unittest.TestCase):
@@ -23,5 +29,47 @@ class PitcherTest(unittest.TestCase):
         plot(pitched_data, test_output, title="pitching test")
         print("done")
 
+    def test_streaming_pitch_equals_pitch_of_whole_file(self):
+        for sample_rate, seconds in [(16000, 25.01), (44100, 25.3), (44100, 0.5)]:
+            with self.subTest(sample_rate=sample_rate, seconds=seconds), tempfile.TemporaryDirectory() as folder:
+                # Arrange
+                times = np.arange(int(sample_rate * seconds)) / sample_rate
+                frequencies = 220 * 2 ** (np.floor(times * 3) % 12 / 12)
+                samples = 0.3 * np.sin(2 * np.pi * np.cumsum(frequencies) / sample_rate)
+                audio_path = os.path.join(folder, "vocals.wav")
+                sf.write(audio_path, np.stack([samples, 0.5 * samples], axis=1), sample_rate)
+
+                # Act
+                expected = test_subject.get_pitch_with_file(audio_path)
+                clear_audio_store()
+                with patch.object(test_subject.sf, "SoundFile", wraps=test_subject.sf.SoundFile) as sound_file:
+                    result = test_subject.get_pitch_with_file_streaming(audio_path, block_seconds=5.0)
+
+                # Assert
+                sound_file.assert_called_once()
+                self.assertTrue(np.array_equal(result.times, expected.times))
+                # The resampling of blocks rounds slightly different, by less than 2 cents
+                self.assertTrue(np.allclose(result.frequencies, expected.frequencies, rtol=1e-3, atol=0))
+                self.assertTrue(np.allclose(result.confidence, expected.confidence, atol=1e-2))
+                if sample_rate == 16000:
+                    self.assertEqual(result, expected)
+
+    def test_parallel_pitch_equals_pitch_of_whole_file(self):
+        for seconds in [25.01, 0.5]:
+            with self.subTest(seconds=seconds), tempfile.TemporaryDirectory() as folder:
+                # Arrange
+                times = np.arange(int(16000 * seconds)) / 16000
+                frequencies = 220 * 2 ** (np.floor(times * 3) % 12 / 12)
+                audio_path = os.path.join(folder, "vocals.wav")
+                sf.write(audio_path, 0.3 * np.sin(2 * np.pi * np.cumsum(frequencies) / 16000), 16000)
+
+                # Act
+                expected = test_subject.get_pitch_with_file(audio_path)
+                result = test_subject.get_pitch_with_file_parallel(audio_path, workers=3)
+                clear_audio_store()
+
+                # Assert
+                self.assertEqual(result, expected)
+
 if __name__ == "__main__":
     unittest.main()
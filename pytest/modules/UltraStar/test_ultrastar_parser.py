@@ -2,8 +2,9 @@
 
 import unittest
 import os
+import tempfile
 from unittest.mock import patch, MagicMock
-from modules.Ultrastar.ultrastar_parser import parse_ultrastar_txt
+from modules.Ultrastar.ultrastar_parser import get_stem_file_paths, parse, parse_ultrastar_txt
 
 
 class TestUltraStarParser(unittest.TestCase):
@@ -35,3 +36,23 @@ class TestUltraStarParser(unittest.TestCase):
         mock_parse.assert_called_once()
         mock_dirname.assert_called_once()
         mock_create_folder.assert_called_once()
+
+    def test_stems_next_to_txt_are_found(self):
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # Arrange
+            txt_path = os.path.join(temp_dir, "song.txt")
+            with open(txt_path, "w", encoding="utf-8") as file:
+                file.write("#TITLE:Title\n#ARTIST:Artist\n#MP3:song.mp3\n#VOCALS:song [Vocals].mp3\n"
+                           "#INSTRUMENTAL:song [Instrumental].mp3\n#BPM:300\n#GAP:0\n: 0 4 5 la\nE\n")
+            open(os.path.join(temp_dir, "song [Vocals].mp3"), "wb").close()
+
+            # Act
+            ultrastar_class = parse(txt_path)
+            vocals_path, instrumental_path = get_stem_file_paths(txt_path, ultrastar_class)
+
+            # Assert
+            self.assertEqual(ultrastar_class.vocals, "song [Vocals].mp3")
+            self.assertEqual(ultrastar_class.instrumental, "song [Instrumental].mp3")
+            self.assertEqual(vocals_path, os.path.join(temp_dir, "song [Vocals].mp3"))
+            # Referenced, but missing next to the txt
+            self.assertIsNone(instrumental_path)
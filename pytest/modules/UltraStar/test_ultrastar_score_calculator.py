@@ -0,0 +1,123 @@
+"""Tests for ultrastar_score_calculator.py"""
+
+import random
+import unittest
+
+import librosa
+
+from modules.Midi.midi_creator import create_midi_note_from_pitched_data
+from modules.Pitcher.pitched_data import PitchedData
+from modules.Ultrastar.coverter.ultrastar_converter import (
+    get_end_time_from_ultrastar,
+    get_start_time_from_ultrastar,
+    ultrastar_note_to_midi_note,
+)
+from modules.Ultrastar.ultrastar_score_calculator import (
+    MAX_SONG_LINE_BONUS,
+    Points,
+    add_point,
+    calculate_score,
+    create_score_parts,
+    get_part_midi_notes,
+    get_score,
+)
+from modules.Ultrastar.ultrastar_txt import UltrastarNoteLine, UltrastarTxtNoteTypeTag, UltrastarTxtValue
+
+
+def reference_calculate_score(pitched_data: PitchedData, ultrastar_class: UltrastarTxtValue):
+    """Score calculation with one pitch detection per part"""
+    simple_points = Points()
+    accurate_points = Points()
+    reachable_line_bonus_per_word = MAX_SONG_LINE_BONUS / len(ultrastar_class.UltrastarNoteLines)
+    step_size = 0.09
+
+    for i, note_line in enumerate(ultrastar_class.UltrastarNoteLines):
+        if note_line.word == "" or note_line.noteType == UltrastarTxtNoteTypeTag.FREESTYLE:
+            continue
+
+        start_time = get_start_time_from_ultrastar(ultrastar_class, i)
+        end_time = get_end_time_from_ultrastar(ultrastar_class, i)
+        parts = int((end_time - start_time) / step_size)
+        parts = 1 if parts == 0 else parts
+        accurate_part_line_bonus_points = 0
+        simple_part_line_bonus_points = 0
+        ultrastar_note = librosa.midi_to_note(ultrastar_note_to_midi_note(int(note_line.pitch)))
+
+        for part in range(parts):
+            start = start_time + step_size * part
+            end = start + step_size
+            if end_time < end or part == parts - 1:
+                end = end_time
+            midi_segment = create_midi_note_from_pitched_data(start, end, pitched_data, note_line.word)
+            if midi_segment.note[:-1] == ultrastar_note[:-1]:
+                simple_points = add_point(note_line.noteType, simple_points)
+                simple_part_line_bonus_points += 1
+            if midi_segment.note == ultrastar_note:
+                accurate_points = add_point(note_line.noteType, accurate_points)
+                accurate_part_line_bonus_points += 1
+            accurate_points.parts += 1
+            simple_points.parts += 1
+
+        if accurate_part_line_bonus_points >= parts:
+            accurate_points.line_bonus += reachable_line_bonus_per_word
+        if simple_part_line_bonus_points >= parts:
+            simple_points.line_bonus += reachable_line_bonus_per_word
+
+    return get_score(simple_points), get_score(accurate_points)
+
+
+def create_random_song(rng: random.Random) -> tuple[PitchedData, UltrastarTxtValue]:
+    ultrastar_class = UltrastarTxtValue()
+    ultrastar_class.gap = str(rng.randint(0, 3000))
+    ultrastar_class.bpm = f"{rng.uniform(150, 400):.2f}".replace(".", ",")
+    note_types = list(UltrastarTxtNoteTypeTag)
+    beat = 0
+    for _ in range(rng.randint(1, 60)):
+        beat += rng.randint(0, 8)
+        # Lines ending long before their start have no parts
+        duration = rng.choice([rng.randint(1, 16), 0, -20])
+        pitch = rng.randint(-2, 20)
+        word = rng.choice(["la ", "", "~"])
+        ultrastar_class.UltrastarNoteLines.append(
+            UltrastarNoteLine(startBeat=beat, startTime=0, endTime=0, duration=duration, pitch=pitch, word=word,
+                              noteType=rng.choice(note_types)))
+        beat += max(duration, 1)
+
+    # Pitched data of the whole song, with a few pitches so that the notes often match
+    count = int((int(ultrastar_class.gap) / 1000 + beat * 60 / 1000) / 0.016) + 100
+    ultrastar_pitches = [librosa.midi_to_hz(ultrastar_note_to_midi_note(pitch)) for pitch in range(-2, 20)]
+    frequencies = [rng.choice(ultrastar_pitches) * rng.choice([1, 1, 1, 2, 0.5]) for _ in range(count)]
+    confidence = [rng.random() for _ in range(count)]
+    return PitchedData([frame * 0.016 for frame in range(count)], frequencies, confidence), ultrastar_class
+
+
+class UltrastarScoreCalculatorTest(unittest.TestCase):
+    def test_score_equals_score_of_single_parts(self):
+        rng = random.Random(0)
+        for i in range(100):
+            with self.subTest(i=i):
+                # Arrange
+                pitched_data, ultrastar_class = create_random_song(rng)
+
+                # Act
+                expected = reference_calculate_score(pitched_data, ultrastar_class)
+                result = calculate_score(pitched_data, ultrastar_class)
+
+                # Assert
+                self.assertEqual(result, expected)
+
+    def test_given_part_notes_are_not_detected_again(self):
+        # Arrange
+        pitched_data, ultrastar_class = create_random_song(random.Random(1))
+        part_midi_notes = get_part_midi_notes(create_score_parts(ultrastar_class), pitched_data, ultrastar_class)
+
+        # Act
+        # Without frames every part detection would fail
+        result = calculate_score(PitchedData([], [], []), ultrastar_class, part_midi_notes)
+
+        # Assert
+        self.assertEqual(result, calculate_score(pitched_data, ultrastar_class))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -79,9 +79,9 @@ class TestCreateUltrastarTxt(unittest.TestCase):
 
     def arrange(self) -> tuple[int, list[MidiSegment], str]:
         midi_segments = [
-            MidiSegment(note="C#3", start=0.5, end=2.5, word="UltraSinger "),
-            MidiSegment(note="D3", start=3.0, end=4.5, word="is "),
-            MidiSegment(note="D#3", start=5.5, end=7.5, word="cool! ")]
+            MidiSegment(midi_note=49, start=0.5, end=2.5, word="UltraSinger "),
+            MidiSegment(midi_note=50, start=3.0, end=4.5, word="is "),
+            MidiSegment(midi_note=51, start=5.5, end=7.5, word="cool! ")]
 
         ultrastar_file_output = "output.txt"
         bpm = 120
@@ -0,0 +1,79 @@
+"""Tests for batch.py"""
+
+import os
+import tempfile
+import unittest
+
+from modules.batch import collect_batch_input_files, get_batch_output_base_folder
+
+
+class BatchTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.folder = self.temp_dir.name
+        for name in ["b - song.mp3", "a - song.wav", "a - song.txt", "cover.jpg", "video.mp4"]:
+            with open(os.path.join(self.folder, name), "w", encoding="utf-8") as file:
+                file.write("")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def test_collect_from_folder(self):
+        # Act
+        result = collect_batch_input_files(self.folder)
+
+        # Assert
+        self.assertEqual(result, [os.path.join(self.folder, "a - song.txt"),
+                                  os.path.join(self.folder, "a - song.wav"),
+                                  os.path.join(self.folder, "b - song.mp3"),
+                                  os.path.join(self.folder, "video.mp4")])
+
+    def test_collect_from_glob(self):
+        # Act
+        result = collect_batch_input_files(os.path.join(self.folder, "a - *"))
+
+        # Assert
+        self.assertEqual(result, [os.path.join(self.folder, "a - song.txt"),
+                                  os.path.join(self.folder, "a - song.wav")])
+
+    def test_collect_from_list_file(self):
+        # Arrange
+        list_file = os.path.join(self.folder, "songs.lst")
+        with open(list_file, "w", encoding="utf-8") as file:
+            file.write("# nightly\n\nb - song.mp3\nhttps://www.youtube.com/watch?v=YwNs1Z0qRY0\nb - song.mp3\n"
+                       "a - song.txt\ncover.jpg\n")
+
+        # Act
+        result = collect_batch_input_files(list_file)
+
+        # Assert
+        self.assertEqual(result, [os.path.join(self.folder, "b - song.mp3"),
+                                  "https://www.youtube.com/watch?v=YwNs1Z0qRY0",
+                                  os.path.join(self.folder, "a - song.txt")])
+
+    def test_txt_files_are_collected_from_every_input_form(self):
+        # Arrange
+        list_file = os.path.join(self.folder, "songs.lst")
+        with open(list_file, "w", encoding="utf-8") as file:
+            file.write("a - song.txt\n")
+        txt_file = os.path.join(self.folder, "a - song.txt")
+
+        for batch_input in [self.folder, os.path.join(self.folder, "*"), list_file]:
+            with self.subTest(batch_input=batch_input):
+                # Act
+                result = collect_batch_input_files(batch_input)
+
+                # Assert
+                self.assertIn(txt_file, result)
+                self.assertNotIn(os.path.join(self.folder, "cover.jpg"), result)
+
+    def test_collect_missing_input(self):
+        with self.assertRaises(FileNotFoundError):
+            collect_batch_input_files(os.path.join(self.folder, "missing"))
+
+    def test_output_base_folder(self):
+        self.assertEqual(get_batch_output_base_folder(self.folder), os.path.join(self.folder, "output"))
+
+
+if __name__ == "__main__":
+    unittest.main()
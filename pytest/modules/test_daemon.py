@@ -0,0 +1,150 @@
+"""Tests for daemon.py"""
+
+import json
+import threading
+import unittest
+import urllib.error
+import urllib.request
+from enum import Enum
+
+from modules.daemon import (
+    JobQueue,
+    JobResult,
+    JobStatus,
+    apply_settings_overrides,
+    create_daemon_server,
+)
+
+
+class FakeModel(Enum):
+    SMALL = "small"
+    LARGE = "large"
+
+
+class FakeSettings:
+    APP_VERSION = "1.0"
+    JOB_SETTINGS = frozenset({"model", "batch_size", "force_cpu", "segment"})
+    OPTIONAL_SETTING_TYPES = {"segment": float}
+    model = FakeModel.SMALL
+    batch_size = 16
+    force_cpu = False
+    segment = None
+    daemon_port = 8723
+
+
+class DaemonTest(unittest.TestCase):
+    def test_apply_settings_overrides(self):
+        # Act
+        settings = apply_settings_overrides(FakeSettings(), {"model": "large", "batch_size": 4})
+
+        # Assert
+        self.assertEqual(settings.model, FakeModel.LARGE)
+        self.assertEqual(settings.batch_size, 4)
+
+    def test_apply_settings_overrides_converts_to_setting_type(self):
+        # Act
+        settings = apply_settings_overrides(FakeSettings(), {"batch_size": "4", "force_cpu": "true", "segment": "7"})
+
+        # Assert
+        self.assertEqual(settings.batch_size, 4)
+        self.assertIs(settings.force_cpu, True)
+        self.assertEqual(settings.segment, 7.0)
+        self.assertIsNone(apply_settings_overrides(FakeSettings(), {"segment": None}).segment)
+
+    def test_apply_settings_overrides_rejects_values_of_other_types(self):
+        for overrides in [{"batch_size": "four"}, {"batch_size": 4.5}, {"batch_size": True}, {"batch_size": None},
+                          {"force_cpu": 1}, {"model": "medium"}, {"segment": [7]}]:
+            with self.subTest(overrides=overrides):
+                with self.assertRaises(ValueError):
+                    apply_settings_overrides(FakeSettings(), overrides)
+
+    def test_apply_settings_overrides_rejects_unknown_and_constants(self):
+        with self.assertRaises(ValueError):
+            apply_settings_overrides(FakeSettings(), {"unknown": 1})
+        with self.assertRaises(ValueError):
+            apply_settings_overrides(FakeSettings(), {"APP_VERSION": "2.0"})
+
+    def test_apply_settings_overrides_rejects_process_settings(self):
+        # Act
+        with self.assertRaises(ValueError) as context:
+            apply_settings_overrides(FakeSettings(), {"batch_size": 4, "daemon_port": 9000})
+
+        # Assert
+        self.assertIn("daemon_port", str(context.exception))
+
+    def test_job_api(self):
+        # Arrange
+        release_job = threading.Event()
+
+        def run_job(job):
+            release_job.wait(5)
+            if job.input_file_path == "broken.mp3":
+                raise ValueError("broken")
+            return JobResult("output/song", "output/song/song.txt")
+
+        job_queue = JobQueue(run_job, max_size=2)
+        server = create_daemon_server(job_queue, 0, lambda overrides: apply_settings_overrides(FakeSettings(), overrides))
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        try:
+            # Act
+            bad_status = self.post(f"{url}/jobs", {"input": "song.mp3", "settings": {"unknown": 1}})[0]
+            process_status, process_error = self.post(f"{url}/jobs",
+                                                      {"input": "song.mp3", "settings": {"daemon_port": 9000}})
+            status, first = self.post(f"{url}/jobs", {"input": "song.mp3"})
+            queued_status, _ = self.post(f"{url}/jobs", {"input": "broken.mp3"})
+            full_status, _ = self.post(f"{url}/jobs", {"input": "other.mp3"})
+            jobs_before = self.get(f"{url}/jobs")
+            job_queue.start()
+            release_job.set()
+            job_queue.join()
+            finished = self.get(f"{url}/jobs/{first['id']}")
+            jobs = self.get(f"{url}/jobs")
+
+            # Assert
+            self.assertEqual(bad_status, 400)
+            self.assertEqual(process_status, 400)
+            self.assertIn("daemon_port", process_error["error"])
+            self.assertEqual(status, 202)
+            self.assertEqual(first["status"], JobStatus.QUEUED.value)
+            self.assertEqual(queued_status, 202)
+            self.assertEqual(full_status, 503)
+            self.assertEqual(len(jobs_before), 2)
+            self.assertEqual(finished["status"], JobStatus.FINISHED.value)
+            self.assertEqual(finished["ultrastar_file_output"], "output/song/song.txt")
+            self.assertEqual([job["status"] for job in jobs], [JobStatus.FINISHED.value, JobStatus.FAILED.value])
+        finally:
+            server.shutdown()
+            server.server_close()
+
+    def test_only_last_finished_jobs_are_kept(self):
+        # Arrange
+        job_queue = JobQueue(lambda job: JobResult("output", "output/song.txt"), max_size=5, max_finished_jobs=2)
+        jobs = [job_queue.submit(f"song{index}.mp3", {}) for index in range(4)]
+
+        # Act
+        job_queue.start()
+        job_queue.join()
+
+        # Assert
+        self.assertEqual([job.id for job in job_queue.list()], [job.id for job in jobs[2:]])
+        self.assertIsNone(job_queue.get(jobs[0].id))
+
+    @staticmethod
+    def post(url, content):
+        request = urllib.request.Request(url, data=json.dumps(content).encode("utf-8"), method="POST")
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, json.loads(response.read())
+        except urllib.error.HTTPError as error:
+            return error.code, json.loads(error.read())
+
+    @staticmethod
+    def get(url):
+        with urllib.request.urlopen(url) as response:
+            return json.loads(response.read())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,113 @@
+"""Tests for model_registry.py"""
+
+import unittest
+from unittest.mock import patch
+
+from modules import model_registry
+from modules.model_registry import (
+    ModelKey,
+    get_model,
+    get_model_registry_report,
+    set_model_budget,
+    unload_models,
+)
+
+
+class FakeModel:
+    def __init__(self, name: str, size_bytes: int):
+        self.name = name
+        self.size_bytes = size_bytes
+
+
+class ModelRegistryTest(unittest.TestCase):
+    def setUp(self):
+        unload_models()
+        self.loaded = []
+        self.size_patch = patch.object(model_registry, "estimate_model_size",
+                                       side_effect=lambda model, growth: model.size_bytes)
+        self.size_mock = self.size_patch.start()
+
+    def tearDown(self):
+        self.size_patch.stop()
+        set_model_budget(None)
+        unload_models()
+
+    def load(self, key: ModelKey, size_bytes: int = 100) -> FakeModel:
+        def load_model():
+            self.loaded.append(key)
+            return FakeModel(key.model_name, size_bytes)
+
+        return get_model(key, load_model)
+
+    def test_same_key_is_loaded_once(self):
+        # Arrange
+        report = get_model_registry_report()
+        key = ModelKey("whisper", "large-v2", "cpu", "int8", "en")
+
+        # Act
+        first = self.load(key)
+        second = self.load(key)
+        other_language = self.load(ModelKey("whisper", "large-v2", "cpu", "int8", "de"))
+
+        # Assert
+        self.assertIs(first, second)
+        self.assertIsNot(first, other_language)
+        self.assertEqual(len(self.loaded), 2)
+        result = get_model_registry_report()
+        self.assertEqual(result["hits"] - report["hits"], 1)
+        self.assertEqual(result["misses"] - report["misses"], 2)
+        self.assertEqual(len(result["loaded_models"]), 2)
+
+    def test_least_recently_used_models_are_unloaded_over_budget(self):
+        # Arrange
+        report = get_model_registry_report()
+        set_model_budget(250)
+        english = ModelKey("whisper_align", "default", language="en")
+        german = ModelKey("whisper_align", "default", language="de")
+        french = ModelKey("whisper_align", "default", language="fr")
+
+        # Act
+        self.load(english)
+        self.load(german)
+        # English is used again, so German is the least recently used
+        self.load(english)
+        self.load(french)
+        self.load(english)
+
+        # Assert
+        result = get_model_registry_report()
+        self.assertEqual(result["evictions"] - report["evictions"], 1)
+        self.assertEqual([model["language"] for model in result["loaded_models"]], ["fr", "en"])
+        self.assertEqual(self.loaded, [english, german, french])
+
+    def test_model_over_budget_is_kept_until_next_model(self):
+        # Arrange
+        set_model_budget(50)
+        first = ModelKey("demucs", "htdemucs")
+        second = ModelKey("demucs", "htdemucs_ft")
+
+        # Act
+        self.load(first)
+        self.load(first)
+        self.load(second)
+
+        # Assert
+        self.assertEqual(self.loaded, [first, second])
+        self.assertEqual([model["model_name"] for model in get_model_registry_report()["loaded_models"]],
+                         ["htdemucs_ft"])
+
+    def test_model_size_includes_gpu_memory_growth(self):
+        # Arrange
+        key = ModelKey("whisper", "large-v2", "cuda", "float16", "en")
+
+        # Act
+        with patch.object(model_registry, "get_resident_bytes", side_effect=[1000, 1500]), \
+                patch.object(model_registry, "get_cuda_allocated_bytes", side_effect=[200, 500]):
+            self.load(key)
+
+        # Assert
+        self.assertEqual(self.size_mock.call_args[0][1], 800)
+
+
+if __name__ == "__main__":
+    unittest.main()
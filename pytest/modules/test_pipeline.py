@@ -0,0 +1,85 @@
+"""Tests for pipeline.py"""
+
+import threading
+import unittest
+
+from modules.pipeline import Stage, run_stages, validate_stages
+
+
+class PipelineTest(unittest.TestCase):
+    def test_run_stages_in_declared_order_with_one_worker(self):
+        # Arrange
+        order = []
+
+        def stage(name, result=None):
+            def run(**kwargs):
+                order.append(name)
+                return result
+            return run
+
+        stages = [
+            Stage("audio", stage("audio", "song.wav"), outputs=["audio"]),
+            Stage("bpm", stage("bpm", 120.0), ["audio"], ["bpm"]),
+            Stage("txt", stage("txt", "song.txt"), ["bpm", "pitch"], ["txt"]),
+            Stage("pitch", stage("pitch", [440.0]), ["audio"], ["pitch"]),
+        ]
+
+        # Act
+        values = run_stages(stages, max_workers=1)
+
+        # Assert
+        self.assertEqual(order, ["audio", "bpm", "pitch", "txt"])
+        self.assertEqual(values["txt"], "song.txt")
+
+    def test_run_independent_stages_concurrently(self):
+        # Arrange
+        barrier = threading.Barrier(2, timeout=5)
+
+        def wait_for_other_stage(audio):
+            # Only returns if both stages run at the same time
+            barrier.wait()
+            return audio
+
+        stages = [
+            Stage("audio", lambda: "song.wav", outputs=["audio"]),
+            Stage("bpm", wait_for_other_stage, ["audio"], ["bpm"]),
+            Stage("pitch", wait_for_other_stage, ["audio"], ["pitch"]),
+            Stage("txt", lambda bpm, pitch: (bpm, pitch), ["bpm", "pitch"], ["txt", "score"]),
+        ]
+
+        # Act
+        values = run_stages(stages, max_workers=4)
+
+        # Assert
+        self.assertEqual(values["txt"], "song.wav")
+        self.assertEqual(values["score"], "song.wav")
+
+    def test_run_stages_raises_stage_error(self):
+        # Arrange
+        executed = []
+
+        def fail(audio):
+            raise ValueError("broken")
+
+        stages = [
+            Stage("audio", lambda: "song.wav", outputs=["audio"]),
+            Stage("pitch", fail, ["audio"], ["pitch"]),
+            Stage("txt", lambda pitch: executed.append(pitch), ["pitch"]),
+        ]
+
+        # Act / Assert
+        with self.assertRaises(ValueError):
+            run_stages(stages, max_workers=2)
+        self.assertEqual(executed, [])
+
+    def test_validate_stages(self):
+        with self.assertRaises(ValueError):
+            validate_stages([Stage("txt", lambda pitch: None, ["pitch"])], {})
+        with self.assertRaises(ValueError):
+            validate_stages([Stage("a", lambda: 1, outputs=["a"]), Stage("b", lambda: 1, outputs=["a"])], {})
+        with self.assertRaises(ValueError):
+            validate_stages([Stage("a", lambda b: 1, ["b"], ["a"]), Stage("b", lambda a: 1, ["a"], ["b"])], {})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,124 @@
+"""Tests for stage_cache.py"""
+
+import os
+import tempfile
+import unittest
+
+from modules.stage_cache import StageCache
+
+
+class StageCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.cache = StageCache(os.path.join(self.temp_dir.name, "cache"), "1.0")
+        self.first_song = self.write_file("first/song.wav", b"audio")
+        self.same_song = self.write_file("second/other name.wav", b"audio")
+        self.other_song = self.write_file("third/song.wav", b"other audio")
+        self.created = []
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def write_file(self, name, content):
+        path = os.path.join(self.temp_dir.name, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as file:
+            file.write(content)
+        return path
+
+    def create(self, entry_path):
+        self.created.append(entry_path)
+        with open(os.path.join(entry_path, "result.json"), "w", encoding="utf-8") as file:
+            file.write("{}")
+
+    def test_same_content_hits_cache(self):
+        # Act
+        first_path, first_hit = self.cache.get_or_create("pitch", [self.first_song], {"model": "a"}, self.create)
+        same_path, same_hit = self.cache.get_or_create("pitch", [self.same_song], {"model": "a"}, self.create)
+
+        # Assert
+        self.assertFalse(first_hit)
+        self.assertTrue(same_hit)
+        self.assertEqual(first_path, same_path)
+        self.assertEqual(len(self.created), 1)
+        self.assertTrue(os.path.isfile(os.path.join(first_path, "result.json")))
+
+    def test_other_content_params_or_version_miss_cache(self):
+        # Act
+        paths = {
+            self.cache.get_or_create("pitch", [self.first_song], {"model": "a"}, self.create)[0],
+            self.cache.get_or_create("pitch", [self.other_song], {"model": "a"}, self.create)[0],
+            self.cache.get_or_create("pitch", [self.first_song], {"model": "b"}, self.create)[0],
+            StageCache(self.cache.root_folder_path, "2.0").get_or_create(
+                "pitch", [self.first_song], {"model": "a"}, self.create)[0],
+        }
+
+        # Assert
+        self.assertEqual(len(paths), 4)
+        self.assertEqual(len(self.created), 4)
+
+    def test_failed_creation_leaves_no_entry(self):
+        # Arrange
+        def fail(entry_path):
+            self.create(entry_path)
+            raise RuntimeError("crashed")
+
+        # Act
+        with self.assertRaises(RuntimeError):
+            self.cache.get_or_create("pitch", [self.first_song], {}, fail)
+        _, hit = self.cache.get_or_create("pitch", [self.first_song], {}, self.create)
+
+        # Assert
+        self.assertFalse(hit)
+        self.assertEqual(os.listdir(os.path.join(self.cache.root_folder_path, "pitch")),
+                         [os.path.basename(self.created[-1]).split(".")[0]])
+
+    def test_skip_cache_recreates_entry(self):
+        # Act
+        self.cache.get_or_create("pitch", [self.first_song], {}, self.create)
+        path, hit = self.cache.get_or_create("pitch", [self.first_song], {}, self.create, skip_cache=True)
+
+        # Assert
+        self.assertFalse(hit)
+        self.assertEqual(len(self.created), 2)
+        self.assertTrue(os.path.isfile(os.path.join(path, "result.json")))
+
+    def test_evict_audio_before_json_and_least_recently_used_first(self):
+        # Arrange
+        def create_file(size):
+            def create(entry_path):
+                with open(os.path.join(entry_path, "result"), "wb") as file:
+                    file.write(b"0" * size)
+            return create
+
+        old_stems = self.cache.get_or_create("separation", [self.first_song], {}, create_file(100))[0]
+        new_stems = self.cache.get_or_create("separation", [self.other_song], {}, create_file(100))[0]
+        pitch = self.cache.get_or_create("pitch", [self.first_song], {}, create_file(10))[0]
+        os.utime(pitch, (1000, 1000))
+        os.utime(old_stems, (2000, 2000))
+        os.utime(new_stems, (3000, 3000))
+
+        # Act
+        evicted = self.cache.evict(150)
+        evicted_again = self.cache.evict(150)
+
+        # Assert
+        self.assertEqual([entry.path for entry in evicted], [old_stems])
+        self.assertEqual(evicted_again, [])
+        self.assertFalse(os.path.exists(old_stems))
+        self.assertTrue(os.path.exists(new_stems))
+        self.assertTrue(os.path.exists(pitch))
+
+    def test_evict_keeps_recently_used_entries(self):
+        # Arrange
+        self.cache.get_or_create("separation", [self.first_song], {}, self.create)
+
+        # Act
+        evicted = self.cache.evict(0, grace_seconds=60)
+
+        # Assert
+        self.assertEqual(evicted, [])
+
+
+if __name__ == "__main__":
+    unittest.main()
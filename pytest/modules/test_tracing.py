@@ -0,0 +1,90 @@
+"""Tests for tracing.py"""
+
+import json
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from modules.pipeline import Stage, run_stages
+from modules.tracing import annotate, get_resident_bytes, span, start_trace, stop_trace, write_trace_report
+
+
+class TracingTest(unittest.TestCase):
+    def tearDown(self):
+        stop_trace()
+
+    def test_span_without_trace_does_nothing(self):
+        with span("stage") as current:
+            annotate(cache="hit")
+        self.assertIsNone(current)
+
+    def test_stages_are_traced(self):
+        # Arrange
+        tracer = start_trace("song.mp3")
+
+        def pitch(audio):
+            with span("detector"):
+                annotate(cache_pitch="miss")
+            return sum(range(100000))
+
+        stages = [
+            Stage("audio", lambda: "song.wav", outputs=["audio"]),
+            Stage("pitch", pitch, ["audio"], ["pitch"]),
+        ]
+
+        # Act
+        run_stages(stages, max_workers=2)
+
+        # Assert
+        spans = {span.name: span for span in tracer.spans}
+        self.assertEqual(set(spans), {"audio", "pitch", "detector"})
+        self.assertEqual(spans["detector"].parent, "pitch")
+        self.assertIsNone(spans["pitch"].parent)
+        self.assertEqual(spans["detector"].attributes, {"cache_pitch": "miss"})
+        self.assertGreaterEqual(spans["pitch"].wall_seconds, spans["detector"].wall_seconds)
+        self.assertGreaterEqual(spans["pitch"].start_seconds, spans["audio"].start_seconds + spans["audio"].wall_seconds)
+
+    @unittest.skipIf(get_resident_bytes() is None, "Resident memory is only read from /proc")
+    def test_span_records_its_memory_growth(self):
+        # Arrange
+        tracer = start_trace("song.mp3")
+
+        # Act
+        with span("large"):
+            samples = np.ones(64 * 1024 ** 2 // 8)
+        with span("small"):
+            pass
+
+        # Assert
+        spans = {span.name: span for span in tracer.spans}
+        self.assertGreater(spans["large"].rss_delta_mb, 48)
+        self.assertLess(spans["small"].rss_delta_mb, 16)
+        del samples
+
+    def test_write_trace_report(self):
+        # Arrange
+        tracer = start_trace("song.mp3")
+        with span("transcription"):
+            pass
+
+        with tempfile.TemporaryDirectory() as folder:
+            # Act
+            report_path, chrome_trace_path = write_trace_report(tracer, folder, "song")
+
+            with open(report_path, encoding="utf-8") as file:
+                report = json.load(file)
+            with open(chrome_trace_path, encoding="utf-8") as file:
+                chrome_trace = json.load(file)
+
+            # Assert
+            self.assertEqual(os.path.basename(report_path), "song.trace.json")
+            self.assertEqual(report["name"], "song.mp3")
+            self.assertIn("process_peak_rss_mb", report)
+            self.assertEqual([s["name"] for s in report["spans"]], ["transcription"])
+            self.assertEqual([e["ph"] for e in chrome_trace["traceEvents"]], ["X", "M"])
+
+
+if __name__ == "__main__":
+    unittest.main()
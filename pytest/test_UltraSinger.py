@@ -0,0 +1,97 @@
+"""Tests for UltraSinger.py"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import textwrap
+import unittest
+from unittest.mock import patch
+
+import numpy as np
+
+import UltraSinger
+from modules.Pitcher import pitcher
+from modules.Pitcher.pitched_data import PitchedData
+from modules.ProcessData import ProcessDataPaths
+from modules.stage_cache import StageCache
+
+SRC_FOLDER_PATH = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+# Runs in a fresh interpreter, as other tests may already have imported torch
+CACHED_TRANSCRIPTION_SCRIPT = textwrap.dedent("""
+    import sys
+    import types
+    from unittest.mock import patch
+
+    import UltraSinger
+    from modules.Speech_Recognition.TranscriptionResult import TranscriptionResult
+    from modules.stage_cache import StageCache
+
+    cache = StageCache(sys.argv[1], "1.0")
+    whisper = types.ModuleType("modules.Speech_Recognition.Whisper")
+    whisper.transcribe_with_whisper = lambda *args: TranscriptionResult([], "en")
+    with patch.dict(sys.modules, {"modules.Speech_Recognition.Whisper": whisper}), \\
+            patch.object(UltraSinger, "check_gpu_support", return_value="cuda"):
+        UltraSinger.transcribe_audio(cache, sys.argv[2])
+
+    UltraSinger.settings.pytorch_device_checked = False
+    with patch.object(UltraSinger, "check_gpu_support", side_effect=AssertionError("device checked")):
+        result = UltraSinger.transcribe_audio(cache, sys.argv[2])
+    print(result.device, "torch" in sys.modules)
+""")
+
+
+class UltraSingerTest(unittest.TestCase):
+    def test_cached_transcription_does_not_import_torch(self):
+        # Arrange
+        with tempfile.TemporaryDirectory() as folder:
+            audio_path = os.path.join(folder, "song.wav")
+            with open(audio_path, "wb") as file:
+                file.write(b"audio")
+
+            # Act
+            output = subprocess.run(
+                [sys.executable, "-c", CACHED_TRANSCRIPTION_SCRIPT, os.path.join(folder, "cache"), audio_path],
+                capture_output=True, text=True, check=True, cwd=SRC_FOLDER_PATH,
+                env={**os.environ, "PYTHONPATH": SRC_FOLDER_PATH},
+            ).stdout
+
+        # Assert
+        self.assertEqual(output.splitlines()[-1], "cuda False")
+
+    def test_pitch_modes_have_own_cache_entries(self):
+        # Arrange
+        calls = []
+
+        def detect(mode):
+            def get_pitch(filename, *args):
+                calls.append(mode)
+                return PitchedData(np.array([0.0]), np.array([440.0]), np.array([0.9]))
+            return get_pitch
+
+        modes = [(False, 1), (True, 1), (False, 2), (False, 4), (False, 1), (True, 1)]
+
+        with tempfile.TemporaryDirectory() as folder, \
+                patch.object(pitcher, "get_pitch_with_file", side_effect=detect("batch")), \
+                patch.object(pitcher, "get_pitch_with_file_streaming", side_effect=detect("streaming")), \
+                patch.object(pitcher, "get_pitch_with_file_parallel", side_effect=detect("parallel")), \
+                patch.multiple(UltraSinger.settings, streaming_pitch=False, pitch_workers=1):
+            process_data_paths = ProcessDataPaths()
+            process_data_paths.processing_audio_path = os.path.join(folder, "song.wav")
+            with open(process_data_paths.processing_audio_path, "wb") as file:
+                file.write(b"audio")
+            cache = StageCache(os.path.join(folder, "cache"), "1.0")
+
+            # Act
+            for streaming_pitch, pitch_workers in modes:
+                UltraSinger.settings.streaming_pitch = streaming_pitch
+                UltraSinger.settings.pitch_workers = pitch_workers
+                UltraSinger.pitch_audio(process_data_paths, cache)
+
+        # Assert
+        self.assertEqual(calls, ["batch", "streaming", "parallel", "parallel"])
+
+
+if __name__ == "__main__":
+    unittest.main()
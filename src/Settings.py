@@ -3,7 +3,7 @@ from dataclasses import dataclass
 from dataclasses_json import dataclass_json
 
 from modules.Audio.separation import DemucsModel
-from modules.Speech_Recognition.Whisper import WhisperModel
+from modules.Speech_Recognition.WhisperModel import WhisperModel
 from modules.Ultrastar.ultrastar_txt import FormatVersion
 
 
@@ -14,6 +14,27 @@ class Settings:
     APP_VERSION = "0.0.13.dev16"
     CONFIDENCE_THRESHOLD = 0.6
     CONFIDENCE_PROMPT_TIMEOUT = 4
+    # Settings a daemon job can override, the others belong to the process and are shared by all jobs
+    JOB_SETTINGS = frozenset({
+        "create_midi", "create_plot", "create_audio_chunks", "hyphenation", "use_separated_vocal", "create_karaoke",
+        "ignore_audio", "keep_cache", "quantize_to_key", "output_folder_path", "trace", "in_memory_preprocessing",
+        "streaming_pitch", "language", "format_version", "demucs_model", "demucs_segment", "separation_window",
+        "vocals_file_path", "instrumental_file_path", "transcriber", "whisper_model", "whisper_align_model",
+        "whisper_batch_size", "whisper_compute_type", "keep_numbers", "force_cpu", "force_whisper_cpu", "cookiefile",
+        "skip_cache_vocal_separation", "skip_cache_denoise_vocal_audio", "skip_cache_transcription",
+        "skip_cache_pitch_detection", "calculate_score",
+    })
+    # Types of the job settings which are None by default, the settings of daemon jobs are converted to them
+    OPTIONAL_SETTING_TYPES = {
+        "language": str,
+        "demucs_segment": float,
+        "separation_window": float,
+        "vocals_file_path": str,
+        "instrumental_file_path": str,
+        "whisper_align_model": str,
+        "whisper_compute_type": str,
+        "cookiefile": str,
+    }
 
     create_midi = True
     create_plot = False
@@ -31,12 +52,35 @@ class Settings:
     # Process data Paths
     input_file_path = ""
     output_folder_path = ""
+    cache_path = None  # Shared cache of stage results, by default the cache folder of the song
+    cache_max_size = None  # Disk budget of the cache in GB, audio intermediates are evicted before transcriptions and pitch data
+    model_cache_max_size = None  # Memory budget of the loaded models in GB, RAM and GPU together, least recently used models are unloaded first. None keeps all
+
+    # Batch
+    batch_input_path = None  # Folder, glob pattern or list file with songs to process in one run
+    batch_workers = 1  # Number of worker processes, every worker loads the models once
+
+    # Daemon
+    daemon_mode = False  # Keep models loaded and accept jobs over a local HTTP API
+    daemon_port = 8723
+    daemon_queue_size = 16  # Max number of waiting jobs
+
+    # Pipeline
+    pipeline_workers = 1  # Number of threads for independent stages, 1 runs all stages one after another. More threads compete for CPU and GPU
+    trace = False  # Write wall time, CPU time, memory, IO and cache hits of every stage to <song>.trace.json
+    in_memory_preprocessing = False  # Denoise, mono and mute without intermediate wav files
+    streaming_pitch = False  # Pitch the processing audio in blocks, for long recordings with bounded memory
+    pitch_workers = 1  # Number of processes for the pitch detection, more than 1 splits the audio into chunks
     
     language = None
     format_version = FormatVersion.V1_2_0
 
     # Demucs
     demucs_model = DemucsModel.HTDEMUCS  # htdemucs|htdemucs_ft|htdemucs_6s|hdemucs_mmi|mdx|mdx_extra|mdx_q|mdx_extra_q|SIG
+    demucs_segment = None  # Seconds per separated segment, smaller segments need less memory. None uses the model default
+    separation_window = None  # Seconds per separation window for long songs, finished windows are cached to resume. None separates the whole song
+    vocals_file_path = None  # Separated vocals of the input, given together with the instrumental they replace the separation
+    instrumental_file_path = None  # Separated instrumental of the input
 
     # Whisper
     transcriber = "whisper"  # whisper
@@ -49,6 +93,7 @@ class Settings:
 
     # Device
     pytorch_device = 'cpu'  # cpu|cuda
+    pytorch_device_checked = False  # GPU support is checked when the first model runs
     force_cpu = False
     force_whisper_cpu = False
 
@@ -2,36 +2,41 @@
 
 import copy
 import getopt
+import multiprocessing
 import os
 import sys
+from typing import Optional
+
 import Levenshtein
-import librosa
+import soundfile as sf
 
+from concurrent.futures import ProcessPoolExecutor
 from packaging import version
 
 from modules import os_helper
 from modules.init_interactive_mode import init_settings_interactive
-from modules.Audio.denoise import denoise_vocal_audio
-from modules.Audio.separation import separate_vocal_from_audio
+from modules.Audio.denoise import DENOISE_FILTER, denoise_samples, denoise_vocal_audio, denoise_vocal_samples
+from modules.Audio.separation import SeparatedAudio, check_stems_match_audio, separate_vocal_from_audio
 from modules.Audio.vocal_chunks import (
     create_audio_chunks_from_transcribed_data,
     create_audio_chunks_from_ultrastar_data,
 )
-from modules.Audio.key_detector import detect_key_from_audio, get_allowed_notes_for_key
-from modules.Audio.silence_processing import remove_silence_from_transcription_data, mute_no_singing_parts
-from modules.Audio.separation import DemucsModel
-from modules.Audio.convert_audio import convert_audio_to_mono_wav, convert_audio_format
-from modules.Audio.youtube import (
-    download_from_youtube,
+from modules.Audio.key_detector import detect_key_map_from_audio
+from modules.Audio.silence_processing import (
+    remove_silence_from_transcription_data,
+    mute_no_singing_parts,
+    mute_silence_sections,
 )
+from modules.Audio.separation import DemucsModel
+from modules.Audio.convert_audio import convert_audio_to_mono_wav, convert_audio_format, convert_samples_to_mono
 from modules.Audio.bpm import get_bpm_from_file
+from modules.Audio.audio_store import clear_audio_store, store_audio
 
 from modules.console_colors import (
     ULTRASINGER_HEAD,
     blue_highlighted,
     gold_highlighted,
     red_highlighted,
-    green_highlighted,
     cyan_highlighted,
     bright_green_highlighted,
 )
@@ -42,33 +47,38 @@ from modules.Midi.midi_creator import (
 )
 from modules.Midi.MidiSegment import MidiSegment
 from modules.Midi.note_length_calculator import get_thirtytwo_note_second, get_sixteenth_note_second
-from modules.Pitcher.pitcher import (
-    get_pitch_with_file,
-)
-from modules.Pitcher.pitched_data import PitchedData
+from modules.Pitcher.pitched_data import PitchedData, load_pitched_data, save_pitched_data
 from modules.Speech_Recognition.TranscriptionResult import TranscriptionResult
 from modules.Speech_Recognition.hyphenation import (
     hyphenate_each_word,
 )
-from modules.Speech_Recognition.Whisper import transcribe_with_whisper
 from modules.Ultrastar import (
     ultrastar_writer,
 )
 from modules.Speech_Recognition.TranscribedData import TranscribedData
-from modules.Speech_Recognition.Whisper import WhisperModel
+from modules.Speech_Recognition.WhisperModel import WhisperModel
 from modules.Ultrastar.ultrastar_score_calculator import Score, calculate_score_points
 from modules.Ultrastar.ultrastar_txt import FILE_ENCODING, FormatVersion
 from modules.Ultrastar.coverter.ultrastar_txt_converter import from_ultrastar_txt, \
     create_ultrastar_txt_from_midi_segments, create_ultrastar_txt_from_automation
-from modules.Ultrastar.ultrastar_parser import parse_ultrastar_txt
+from modules.Ultrastar.ultrastar_parser import get_stem_file_paths, parse_ultrastar_txt
 from modules.common_print import print_support, print_help, print_version
-from modules.os_helper import check_file_exists, get_unused_song_output_dir
-from modules.plot import create_plots
+from modules.os_helper import get_unused_song_output_dir
+from modules.pipeline import Stage, run_stages
+from modules.stage_cache import EVICTION_GRACE_SECONDS, StageCache
+from modules.model_registry import get_model_registry_report, set_model_budget, unload_models
+from modules.tracing import Tracer, span, start_trace, stop_trace, write_trace_report
 from modules.musicbrainz_client import search_musicbrainz
-from modules.sheet import create_sheet
 from modules.ProcessData import ProcessData, ProcessDataPaths, MediaInfo
 from modules.DeviceDetection.device_detection import check_gpu_support
 from modules.Image.image_helper import save_image
+from modules.batch import (
+    BatchResult,
+    collect_batch_input_files,
+    get_batch_output_base_folder,
+    print_batch_summary,
+)
+from modules.daemon import Job, JobResult, apply_settings_overrides, serve_daemon
 from modules.ffmpeg_helper import (
     is_ffmpeg_available,
     get_ffmpeg_and_ffprobe_paths,
@@ -160,89 +170,179 @@ def run() -> tuple[str, Score, Score]:
     if settings.quantize_to_key:
         print(f"{ULTRASINGER_HEAD} {bright_green_highlighted('Option:')} {cyan_highlighted('Notes will be quantized to the detected musical key')}")
 
-    process_data = InitProcessData()
+    set_model_budget(None if settings.model_cache_max_size is None else int(settings.model_cache_max_size * 1024 ** 3))
+    tracer = start_trace(settings.input_file_path) if settings.trace else None
+    try:
+        return run_traced(tracer)
+    finally:
+        stop_trace()
+        # The daemon and batch workers process the next song in the same process
+        clear_audio_store()
+
+
+def run_traced(tracer: Optional[Tracer]) -> tuple[str, Score, Score]:
+    """Run all stages of a song, the spans are collected if tracer is set"""
+    with span("init"):
+        process_data = InitProcessData()
 
     process_data.process_data_paths.cache_folder_path = (
         os.path.join(settings.output_folder_path, "cache")
         if settings.cache_override_path is None
         else settings.cache_override_path
     )
+    stage_cache = StageCache(
+        process_data.process_data_paths.cache_folder_path if settings.cache_path is None else settings.cache_path,
+        settings.APP_VERSION,
+    )
 
-    # Create process audio
-    process_data.process_data_paths.processing_audio_path = CreateProcessAudio(process_data)
+    # Run the stages, independent stages run concurrently
+    values = run_stages(create_pipeline_stages(process_data, stage_cache), max_workers=settings.pipeline_workers)
+    accurate_score, simple_score, ultrastar_file_output = values["ultrastar_txt"]
 
-    # Get BPM from wav file
-    if not settings.input_file_is_ultrastar_txt:
-        process_data.media_info.bpm = get_bpm_from_file(process_data.process_data_paths.processing_audio_path)
+    # Cleanup
+    with span("cleanup"):
+        if settings.cache_max_size is not None:
+            # Other batch workers may still use entries of their running songs
+            grace_seconds = EVICTION_GRACE_SECONDS if settings.batch_workers > 1 else 0
+            stage_cache.evict(int(settings.cache_max_size * 1024 ** 3), grace_seconds)
+        if not settings.keep_cache:
+            remove_cache_folder(process_data.process_data_paths.cache_folder_path)
+
+    if tracer is not None:
+        tracer.attributes["model_registry"] = get_model_registry_report()
+        write_trace_report(tracer, settings.output_folder_path, process_data.basename)
 
-    # Detect key
-    detected_key, detected_mode = detect_key_from_audio(process_data.process_data_paths.processing_audio_path)
-    if process_data.media_info.music_key is None:
-        process_data.media_info.music_key = f"{detected_key} {detected_mode}"
+    # Print Support
+    print_support()
+    return ultrastar_file_output, simple_score, accurate_score
 
-    # Audio transcription
-    process_data.media_info.language = settings.language
-    if not settings.ignore_audio:
-        TranscribeAudio(process_data)
 
-    # Split syllables into segments
-    if not settings.ignore_audio:
-        process_data.transcribed_data = split_syllables_into_segments(process_data.transcribed_data,
-                                                                  process_data.media_info.bpm)
+def create_pipeline_stages(process_data: ProcessData, stage_cache: StageCache) -> list[Stage]:
+    """Create the stages of the processing pipeline
 
-    # Create audio chunks
-    if settings.create_audio_chunks:
-        create_audio_chunks(process_data)
+    The stages write their results into process_data. The declared inputs and outputs only define the order,
+    so a stage must not read a part of process_data which is written by a stage it does not depend on.
+    Nothing is locked, so concurrent stages with --pipeline_workers must write different fields and not settings.
+    """
 
-    # Pitch audio
-    process_data.pitched_data = pitch_audio(process_data.process_data_paths)
+    def process_audio():
+        # Create process audio
+        process_data.process_data_paths.processing_audio_path = CreateProcessAudio(process_data, stage_cache)
+        return process_data.process_data_paths.processing_audio_path
+
+    def export_stems(processing_audio_path):
+        ExportStems(process_data)
+
+    def bpm(processing_audio_path):
+        # Get BPM from wav file
+        if not settings.input_file_is_ultrastar_txt:
+            process_data.media_info.bpm = get_bpm_from_file(processing_audio_path)
+        return process_data.media_info.bpm
+
+    def music_key(processing_audio_path):
+        # Detect key
+        key_map = detect_key_map_from_audio(processing_audio_path)
+        if process_data.media_info.music_key is None:
+            process_data.media_info.music_key = f"{key_map.key} {key_map.mode}"
+        return key_map
+
+    def transcription(processing_audio_path):
+        # Audio transcription
+        process_data.media_info.language = settings.language
+        if not settings.ignore_audio:
+            TranscribeAudio(process_data, stage_cache)
+        return process_data.transcribed_data
+
+    def syllable_segments(transcribed_data, real_bpm):
+        # Split syllables into segments
+        if not settings.ignore_audio:
+            process_data.transcribed_data = split_syllables_into_segments(transcribed_data, real_bpm)
+        return process_data.transcribed_data
+
+    def audio_chunks(syllable_data):
+        # Create audio chunks
+        create_audio_chunks(process_data)
 
-    # Allowed keys for quantization
-    allowed_notes_for_key = None
-    if settings.quantize_to_key and not settings.ignore_audio:
-        allowed_notes_for_key = get_allowed_notes_for_key(detected_key, detected_mode)
+    def pitch(processing_audio_path):
+        # Pitch audio
+        process_data.pitched_data = pitch_audio(process_data.process_data_paths, stage_cache)
+        return process_data.pitched_data
+
+    def midi_segments(syllable_data, pitched_data, key_map, audio_chunks=None):
+        # Keys of the song sections for quantization
+        if not settings.quantize_to_key:
+            key_map = None
+
+        # Create Midi_Segments
+        if not settings.ignore_audio:
+            process_data.midi_segments = create_midi_segments_from_transcribed_data(
+                syllable_data,
+                pitched_data,
+                key_map=key_map
+            )
 
-    # Create Midi_Segments
-    if not settings.ignore_audio:
-        process_data.midi_segments = create_midi_segments_from_transcribed_data(
-            process_data.transcribed_data,
-            process_data.pitched_data,
-            allowed_notes_for_key
-        )
-    else:
-        process_data.midi_segments = create_repitched_midi_segments_from_ultrastar_txt(process_data.pitched_data,
-                                                                                       process_data.parsed_file)
+            # Merge syllable segments
+            process_data.midi_segments, process_data.transcribed_data = merge_syllable_segments(
+                process_data.midi_segments,
+                syllable_data,
+                process_data.media_info.bpm)
+        else:
+            process_data.midi_segments = create_repitched_midi_segments_from_ultrastar_txt(pitched_data,
+                                                                                           process_data.parsed_file)
+        return process_data.midi_segments
 
-    # Merge syllable segments
-    if not settings.ignore_audio:
-        process_data.midi_segments, process_data.transcribed_data = merge_syllable_segments(process_data.midi_segments,
-                                                                                        process_data.transcribed_data,
-                                                                                        process_data.media_info.bpm)
+    def plot(midi_segments):
+        # Create plot
+        from modules.plot import create_plots
 
-    # Create plot
-    if settings.create_plot:
         create_plots(process_data, settings.output_folder_path)
 
-    # Create Ultrastar txt
-    accurate_score, simple_score, ultrastar_file_output = CreateUltraStarTxt(process_data)
+    def ultrastar_txt(midi_segments):
+        # Create Ultrastar txt
+        return CreateUltraStarTxt(process_data)
 
-    # Create Midi
-    if settings.create_midi:
-        create_midi_file(process_data.media_info.bpm, settings.output_folder_path, process_data.midi_segments,
+    def midi(midi_segments):
+        # Create Midi
+        create_midi_file(process_data.media_info.bpm, settings.output_folder_path, midi_segments,
                          process_data.basename)
 
-    # Sheet music
-    create_sheet(process_data.midi_segments, settings.output_folder_path,
-                 process_data.process_data_paths.cache_folder_path, settings.musescore_path, process_data.basename,
-                 process_data.media_info)
+    def sheet(midi_segments):
+        # Sheet music
+        from modules.sheet import create_sheet
 
-    # Cleanup
-    if not settings.keep_cache:
-        remove_cache_folder(process_data.process_data_paths.cache_folder_path)
+        create_sheet(midi_segments, settings.output_folder_path,
+                     process_data.process_data_paths.cache_folder_path, settings.musescore_path,
+                     process_data.basename, process_data.media_info)
 
-    # Print Support
-    print_support()
-    return ultrastar_file_output, simple_score, accurate_score
+    midi_segments_inputs = ["syllable_data", "pitched_data", "key_map"]
+    if settings.create_audio_chunks:
+        # Merging changes the syllable data, so the chunks must be created before
+        midi_segments_inputs.append("audio_chunks")
+
+    # With one worker the stages run in this order
+    stages = [
+        Stage("process_audio", process_audio, outputs=["processing_audio_path"]),
+        Stage("bpm", bpm, ["processing_audio_path"], ["real_bpm"]),
+        Stage("key", music_key, ["processing_audio_path"], ["key_map"]),
+        Stage("transcription", transcription, ["processing_audio_path"], ["transcribed_data"]),
+        Stage("syllable_segments", syllable_segments, ["transcribed_data", "real_bpm"], ["syllable_data"]),
+    ]
+    if settings.create_audio_chunks:
+        stages.append(Stage("audio_chunks", audio_chunks, ["syllable_data"], ["audio_chunks"]))
+    stages += [
+        Stage("pitch", pitch, ["processing_audio_path"], ["pitched_data"]),
+        Stage("midi_segments", midi_segments, midi_segments_inputs, ["midi_segments"]),
+    ]
+    if settings.create_plot:
+        stages.append(Stage("plot", plot, ["midi_segments"]))
+    stages += [
+        Stage("export_stems", export_stems, ["processing_audio_path"]),
+        Stage("ultrastar_txt", ultrastar_txt, ["midi_segments"], ["ultrastar_txt"]),
+    ]
+    if settings.create_midi:
+        stages.append(Stage("midi", midi, ["midi_segments"]))
+    stages.append(Stage("sheet", sheet, ["midi_segments"]))
+    return stages
 
 
 def split_syllables_into_segments(
@@ -338,7 +438,7 @@ def merge_syllable_segments(midi_segments: list[MidiSegment],
 
     for i, data in enumerate(transcribed_data):
         # Check if previous element exists
-        is_same_note = i > 0 and midi_segments[i].note == midi_segments[i - 1].note
+        is_same_note = i > 0 and midi_segments[i].midi_note == midi_segments[i - 1].midi_note
         has_breath_pause = False
 
         if previous_data is not None:
@@ -354,18 +454,12 @@ def merge_syllable_segments(midi_segments: list[MidiSegment],
             duration = data.end - data.start
 
             # Calculate pitch jump in semitones
-            try:
-                prev_midi = librosa.note_to_midi(midi_segments[i - 1].note)
-                curr_midi = librosa.note_to_midi(midi_segments[i].note)
-                semitone_diff = abs(curr_midi - prev_midi)
-
-                # Slide: Short duration AND small pitch jump (1-2 semitones)
-                is_potential_slide = (duration <= max_slide_duration and
-                                     semitone_diff <= 2 and
-                                     semitone_diff > 0)
-            except:
-                # Ignore slide detection on error
-                pass
+            semitone_diff = abs(midi_segments[i].midi_note - midi_segments[i - 1].midi_note)
+
+            # Slide: Short duration AND small pitch jump (1-2 semitones)
+            is_potential_slide = (duration <= max_slide_duration and
+                                 semitone_diff <= 2 and
+                                 semitone_diff > 0)
 
         # Check if current segment should be merged with previous due to same pitch
         should_merge_same_pitch = False
@@ -388,7 +482,7 @@ def merge_syllable_segments(midi_segments: list[MidiSegment],
 
             # For slides: Keep the original note (not the transition note)
             if is_potential_slide and not is_same_note:
-                new_midi_notes[-1].note = midi_segments[i - 1].note
+                new_midi_notes[-1].midi_note = midi_segments[i - 1].midi_note
 
             # Take over space and word_end flag from current segment
             # "~ " means end of word - add space to previous segment
@@ -470,12 +564,19 @@ def InitProcessData():
         process_data.basename = basename
         process_data.process_data_paths.audio_output_file_path = audio_file_path
         process_data.media_info.audio_extension = audio_extension
+        # Stems next to the txt replace the separation when re-pitching
+        (
+            process_data.process_data_paths.vocals_audio_file_path,
+            process_data.process_data_paths.instrumental_audio_file_path,
+        ) = get_stem_file_paths(settings.input_file_path, ultrastar_class)
         # todo: ignore transcribe
         settings.ignore_audio = True
 
     elif settings.input_file_path.startswith("https:"):
         # Youtube
         print(f"{ULTRASINGER_HEAD} {gold_highlighted('Full Automatic Mode')}")
+        from modules.Audio.youtube import download_from_youtube
+
         process_data = ProcessData()
         (
             process_data.basename,
@@ -496,9 +597,8 @@ def InitProcessData():
     return process_data
 
 
-def TranscribeAudio(process_data):
-    transcription_result = transcribe_audio(process_data.process_data_paths.cache_folder_path,
-                                            process_data.process_data_paths.processing_audio_path)
+def TranscribeAudio(process_data, stage_cache: StageCache):
+    transcription_result = transcribe_audio(stage_cache, process_data.process_data_paths.processing_audio_path)
 
     if process_data.media_info.language is None:
         process_data.media_info.language = transcription_result.detected_language
@@ -509,30 +609,36 @@ def TranscribeAudio(process_data):
     # Todo: Is it really unnecessary?
     remove_unecessary_punctuations(process_data.transcribed_data)
     if settings.hyphenation:
-        hyphen_words = hyphenate_each_word(process_data.media_info.language, process_data.transcribed_data)
+        with span("hyphenation"):
+            hyphen_words = hyphenate_each_word(process_data.media_info.language, process_data.transcribed_data)
 
         if hyphen_words is not None:
             process_data.transcribed_data = add_hyphen_to_data(process_data.transcribed_data, hyphen_words)
 
-    process_data.transcribed_data = remove_silence_from_transcription_data(
-        process_data.process_data_paths.processing_audio_path, process_data.transcribed_data
-    )
+    with span("silence_removal"):
+        process_data.transcribed_data = remove_silence_from_transcription_data(
+            process_data.process_data_paths.processing_audio_path, process_data.transcribed_data
+        )
 
 
-def CreateUltraStarTxt(process_data: ProcessData):
-    # Move instrumental and vocals
-    if settings.create_karaoke and version.parse(settings.format_version.value) < version.parse(
+def ExportStems(process_data: ProcessData):
+    # Move instrumental and vocals, a txt can reference vocals without an instrumental
+    has_instrumental = bool(process_data.process_data_paths.instrumental_audio_file_path)
+    if settings.create_karaoke and has_instrumental and version.parse(settings.format_version.value) < version.parse(
             FormatVersion.V1_1_0.value):
         karaoke_output_path = os.path.join(settings.output_folder_path, process_data.basename + " [Karaoke]." + process_data.media_info.audio_extension)
         convert_audio_format(process_data.process_data_paths.instrumental_audio_file_path, karaoke_output_path)
 
     if version.parse(settings.format_version.value) >= version.parse(FormatVersion.V1_1_0.value):
-        instrumental_output_path = os.path.join(settings.output_folder_path,
-                                                process_data.basename + " [Instrumental]." + process_data.media_info.audio_extension)
-        convert_audio_format(process_data.process_data_paths.instrumental_audio_file_path, instrumental_output_path)
+        if has_instrumental:
+            instrumental_output_path = os.path.join(settings.output_folder_path,
+                                                    process_data.basename + " [Instrumental]." + process_data.media_info.audio_extension)
+            convert_audio_format(process_data.process_data_paths.instrumental_audio_file_path, instrumental_output_path)
         vocals_output_path = os.path.join(settings.output_folder_path, process_data.basename + " [Vocals]." + process_data.media_info.audio_extension)
         convert_audio_format(process_data.process_data_paths.vocals_audio_file_path, vocals_output_path)
 
+
+def CreateUltraStarTxt(process_data: ProcessData):
     # Create Ultrastar txt
     if not settings.ignore_audio:
         ultrastar_file_output = create_ultrastar_txt_from_automation(
@@ -562,7 +668,36 @@ def CreateUltraStarTxt(process_data: ProcessData):
     return accurate_score, simple_score, ultrastar_file_output
 
 
-def CreateProcessAudio(process_data) -> str:
+def use_given_stems(process_data_paths: ProcessDataPaths) -> bool:
+    """Use the stems given on the command line or referenced by the UltraStar txt instead of separating the audio"""
+    if settings.vocals_file_path is not None:
+        print(f"{ULTRASINGER_HEAD} Using the given vocals and instrumental instead of separating them")
+        try:
+            check_stems_match_audio(process_data_paths.audio_output_file_path,
+                                    [settings.vocals_file_path, settings.instrumental_file_path])
+        except ValueError as error:
+            print(f"{ULTRASINGER_HEAD} {red_highlighted('Error:')} {error}")
+            sys.exit(1)
+        process_data_paths.vocals_audio_file_path = settings.vocals_file_path
+        process_data_paths.instrumental_audio_file_path = settings.instrumental_file_path
+        return True
+
+    if not process_data_paths.vocals_audio_file_path:
+        return False
+    stem_file_paths = [path for path in [process_data_paths.vocals_audio_file_path,
+                                         process_data_paths.instrumental_audio_file_path] if path]
+    try:
+        check_stems_match_audio(process_data_paths.audio_output_file_path, stem_file_paths)
+    except ValueError as error:
+        print(f"{ULTRASINGER_HEAD} {red_highlighted('Not using the stems of the txt:')} {error}")
+        process_data_paths.vocals_audio_file_path = ""
+        process_data_paths.instrumental_audio_file_path = ""
+        return False
+    print(f"{ULTRASINGER_HEAD} Using the stems of the UltraStar txt instead of separating them")
+    return True
+
+
+def CreateProcessAudio(process_data, stage_cache: StageCache) -> str:
     # Set processing audio to cache file
     process_data.process_data_paths.processing_audio_path = os.path.join(
         process_data.process_data_paths.cache_folder_path, process_data.basename + ".wav"
@@ -570,75 +705,144 @@ def CreateProcessAudio(process_data) -> str:
     os_helper.create_folder(process_data.process_data_paths.cache_folder_path)
 
     # Separate vocal from audio
-    audio_separation_folder_path = separate_vocal_from_audio(
-        process_data.process_data_paths.cache_folder_path,
-        process_data.process_data_paths.audio_output_file_path,
-        settings.use_separated_vocal,
-        settings.create_karaoke,
-        settings.pytorch_device,
-        settings.demucs_model,
-        settings.skip_cache_vocal_separation
-    )
-    process_data.process_data_paths.vocals_audio_file_path = os.path.join(audio_separation_folder_path, "vocals.wav")
-    process_data.process_data_paths.instrumental_audio_file_path = os.path.join(audio_separation_folder_path,
-                                                                                "no_vocals.wav")
+    separated_audio = None
+    with span("separation"):
+        if not use_given_stems(process_data.process_data_paths):
+            audio_separation_folder_path, separated_audio = separate_vocal_from_audio(
+                stage_cache,
+                process_data.process_data_paths.audio_output_file_path,
+                settings.use_separated_vocal,
+                settings.create_karaoke,
+                get_pytorch_device,
+                settings.demucs_model,
+                settings.skip_cache_vocal_separation,
+                settings.demucs_segment,
+                settings.separation_window
+            )
+            process_data.process_data_paths.vocals_audio_file_path = os.path.join(audio_separation_folder_path,
+                                                                                  "vocals.wav")
+            process_data.process_data_paths.instrumental_audio_file_path = os.path.join(audio_separation_folder_path,
+                                                                                        "no_vocals.wav")
 
     if settings.use_separated_vocal:
         input_path = process_data.process_data_paths.vocals_audio_file_path
     else:
         input_path = process_data.process_data_paths.audio_output_file_path
 
+    if settings.in_memory_preprocessing:
+        # Just separated vocals are denoised from memory instead of decoding vocals.wav again
+        return create_process_audio_in_memory(input_path, stage_cache,
+                                              separated_audio if settings.use_separated_vocal else None)
+
     # Denoise vocal audio
-    denoised_output_path = os.path.join(
-        process_data.process_data_paths.cache_folder_path, process_data.basename + "_denoised.wav"
-    )
-    denoise_vocal_audio(input_path, denoised_output_path, settings.skip_cache_denoise_vocal_audio)
+    with span("denoise"):
+        denoised_folder_path, _ = stage_cache.get_or_create(
+            "denoise",
+            [input_path],
+            {"filter": DENOISE_FILTER},
+            lambda entry_path: denoise_vocal_audio(input_path, os.path.join(entry_path, "denoised.wav"), True),
+            settings.skip_cache_denoise_vocal_audio,
+        )
+    denoised_output_path = os.path.join(denoised_folder_path, "denoised.wav")
 
     # Convert to mono audio
     mono_output_path = os.path.join(
         process_data.process_data_paths.cache_folder_path, process_data.basename + "_mono.wav"
     )
-    convert_audio_to_mono_wav(denoised_output_path, mono_output_path)
+    with span("mono"):
+        convert_audio_to_mono_wav(denoised_output_path, mono_output_path)
 
     # Mute silence sections
     mute_output_path = os.path.join(
         process_data.process_data_paths.cache_folder_path, process_data.basename + "_mute.wav"
     )
-    mute_no_singing_parts(mono_output_path, mute_output_path)
+    with span("mute"):
+        mute_no_singing_parts(mono_output_path, mute_output_path)
 
     # Define the audio file to process
     return mute_output_path
 
 
-def transcribe_audio(cache_folder_path: str, processing_audio_path: str) -> TranscriptionResult:
+def create_process_audio_in_memory(input_path: str, stage_cache: StageCache,
+                                   separated_audio: Optional[SeparatedAudio] = None) -> str:
+    """Denoise, convert to mono and mute in memory, only the processing audio is written
+
+    The separated audio must be the samples of the input file, it is used instead of decoding the file.
+    """
+    processed = {}
+
+    def preprocess(entry_path: str) -> None:
+        with span("denoise"):
+            if separated_audio is None:
+                samples, sample_rate = denoise_vocal_samples(input_path)
+            else:
+                samples = denoise_samples(separated_audio.vocals.T, separated_audio.sample_rate)
+                sample_rate = separated_audio.sample_rate
+        with span("mono"):
+            samples = convert_samples_to_mono(samples)
+        with span("mute"):
+            print(f"{ULTRASINGER_HEAD} Mute audio parts with no singing")
+            samples = mute_silence_sections(samples, sample_rate)
+        # Float wav, so the written file decodes to exactly these samples
+        sf.write(os.path.join(entry_path, "processed.wav"), samples, sample_rate, subtype="FLOAT")
+        processed["audio"] = samples, sample_rate
+
+    preprocess_folder_path, _ = stage_cache.get_or_create(
+        "preprocess",
+        [input_path],
+        {"filter": DENOISE_FILTER},
+        preprocess,
+        settings.skip_cache_denoise_vocal_audio,
+    )
+    processed_path = os.path.join(preprocess_folder_path, "processed.wav")
+    if "audio" in processed:
+        # The stages reuse the samples instead of decoding the file
+        store_audio(processed_path, *processed["audio"])
+    return processed_path
+
+
+def transcribe_audio(stage_cache: StageCache, processing_audio_path: str) -> TranscriptionResult:
     """Transcribe audio with AI"""
-    transcription_result = None
-    whisper_align_model_string = None
     if settings.transcriber == "whisper":
-        if not settings.whisper_align_model is None:
-            whisper_align_model_string = settings.whisper_align_model.replace("/", "_")
-        whisper_device = "cpu" if settings.force_whisper_cpu else settings.pytorch_device
-        transcription_config = f"{settings.transcriber}_{settings.whisper_model.value}_{whisper_device}_{whisper_align_model_string}_{settings.whisper_batch_size}_{settings.whisper_compute_type}_{settings.language}"
-        transcription_path = os.path.join(cache_folder_path, f"{transcription_config}.json")
-        cached_transcription_available = check_file_exists(transcription_path)
-        if settings.skip_cache_transcription or not cached_transcription_available:
-            transcription_result = transcribe_with_whisper(
+        force_whisper_cpu = settings.force_whisper_cpu or settings.force_cpu
+        transcription_config = {
+            "transcriber": settings.transcriber,
+            "model": settings.whisper_model.value,
+            # The requested device mode is the key, as detecting the device imports torch.
+            # The device the transcription ran on is recorded in transcription.json
+            "device": "cpu" if force_whisper_cpu else "auto",
+            "align_model": settings.whisper_align_model,
+            "batch_size": settings.whisper_batch_size,
+            "compute_type": settings.whisper_compute_type,
+            "language": settings.language,
+            "keep_numbers": settings.keep_numbers,
+        }
+
+        def transcribe(entry_path: str) -> None:
+            # Imported on first use, as importing whisperx and torch takes seconds
+            from modules.Speech_Recognition.Whisper import transcribe_with_whisper
+
+            device = "cpu" if force_whisper_cpu else get_pytorch_device()
+            result = transcribe_with_whisper(
                 processing_audio_path,
                 settings.whisper_model,
-                whisper_device,
+                device,
                 settings.whisper_align_model,
                 settings.whisper_batch_size,
                 settings.whisper_compute_type,
                 settings.language,
                 settings.keep_numbers,
             )
-            with open(transcription_path, "w", encoding=FILE_ENCODING) as file:
-                file.write(transcription_result.to_json())
-        else:
-            print(f"{ULTRASINGER_HEAD} {green_highlighted('cache')} reusing cached transcribed data")
-            with open(transcription_path) as file:
-                json = file.read()
-                transcription_result = TranscriptionResult.from_json(json)
+            result.device = device
+            with open(os.path.join(entry_path, "transcription.json"), "w", encoding=FILE_ENCODING) as file:
+                file.write(result.to_json())
+
+        transcription_folder_path, _ = stage_cache.get_or_create(
+            "transcription", [processing_audio_path], transcription_config, transcribe,
+            settings.skip_cache_transcription
+        )
+        with open(os.path.join(transcription_folder_path, "transcription.json"), encoding=FILE_ENCODING) as file:
+            transcription_result = TranscriptionResult.from_json(file.read())
     else:
         raise NotImplementedError
     return transcription_result
@@ -707,28 +911,37 @@ def infos_from_audio_video_input_file() -> tuple[str, str, str, MediaInfo]:
 
 
 def pitch_audio(
-        process_data_paths: ProcessDataPaths) -> PitchedData:
+        process_data_paths: ProcessDataPaths, stage_cache: StageCache) -> PitchedData:
     """Pitch audio"""
+    # The modes only match within frame tolerance, and the chunks depend on the workers, so each has its own entry
+    if settings.streaming_pitch:
+        pitch_params = {"pitcher": "swiftf0", "mode": "streaming"}
+    elif settings.pitch_workers > 1:
+        pitch_params = {"pitcher": "swiftf0", "mode": "parallel", "workers": settings.pitch_workers}
+    else:
+        pitch_params = {"pitcher": "swiftf0", "mode": "batch"}
 
-    pitching_config = f"swiftf0_{settings.ignore_audio}"
-    pitched_data_path = os.path.join(process_data_paths.cache_folder_path, f"{pitching_config}.json")
-    cache_available = check_file_exists(pitched_data_path)
-
-    if settings.skip_cache_pitch_detection or not cache_available:
-        pitched_data = get_pitch_with_file(
-            process_data_paths.processing_audio_path
+    def pitch(entry_path: str) -> None:
+        from modules.Pitcher.pitcher import (
+            get_pitch_with_file,
+            get_pitch_with_file_parallel,
+            get_pitch_with_file_streaming,
         )
 
-        pitched_data_json = pitched_data.to_json()
-        with open(pitched_data_path, "w", encoding=FILE_ENCODING) as file:
-            file.write(pitched_data_json)
-    else:
-        print(f"{ULTRASINGER_HEAD} {green_highlighted('cache')} reusing cached pitch data")
-        with open(pitched_data_path) as file:
-            json = file.read()
-            pitched_data = PitchedData.from_json(json)
+        if pitch_params["mode"] == "streaming":
+            pitched_data = get_pitch_with_file_streaming(process_data_paths.processing_audio_path)
+        elif pitch_params["mode"] == "parallel":
+            pitched_data = get_pitch_with_file_parallel(process_data_paths.processing_audio_path,
+                                                        settings.pitch_workers)
+        else:
+            pitched_data = get_pitch_with_file(process_data_paths.processing_audio_path)
+        save_pitched_data(pitched_data, entry_path)
 
-    return pitched_data
+    pitched_data_folder_path, _ = stage_cache.get_or_create(
+        "pitch", [process_data_paths.processing_audio_path], pitch_params, pitch,
+        settings.skip_cache_pitch_detection
+    )
+    return load_pitched_data(pitched_data_folder_path)
 
 
 def main(argv: list[str]) -> None:
@@ -738,13 +951,94 @@ def main(argv: list[str]) -> None:
     check_requirements()
     if settings.interactive_mode:
         init_settings_interactive(settings)
-    run()
+    if settings.daemon_mode:
+        run_daemon()
+    elif settings.batch_input_path is not None:
+        run_batch()
+    else:
+        run()
     sys.exit()
 
 
-def check_requirements() -> None:
-    if not settings.force_cpu:
+def run_daemon() -> None:
+    """Keep the process and its loaded models alive and process jobs from the local job API"""
+    base_settings = copy.deepcopy(settings)
+    try:
+        serve_daemon(
+            lambda job: run_daemon_job(base_settings, job),
+            settings.daemon_port,
+            settings.daemon_queue_size,
+            lambda overrides: apply_settings_overrides(copy.deepcopy(base_settings), overrides),
+        )
+    finally:
+        unload_models()
+
+
+def run_daemon_job(base_settings: Settings, job: Job) -> JobResult:
+    """Run one daemon job with the daemon settings and the overrides of the job"""
+    global settings
+    settings = apply_settings_overrides(copy.deepcopy(base_settings), job.settings_overrides)
+    settings.input_file_path = job.input_file_path
+    if settings.output_folder_path == "":
+        settings.output_folder_path = get_default_output_folder_path(settings.input_file_path)
+    ultrastar_file_output, _, _ = run()
+    return JobResult(settings.output_folder_path, ultrastar_file_output)
+
+
+def run_batch() -> list[BatchResult]:
+    """Process all songs of the batch input with the same settings"""
+    input_files = collect_batch_input_files(settings.batch_input_path)
+    print(
+        f"{ULTRASINGER_HEAD} {gold_highlighted('Batch Mode')} - {blue_highlighted(str(len(input_files)))} songs with {blue_highlighted(str(settings.batch_workers))} worker(s)"
+    )
+
+    base_settings = copy.deepcopy(settings)
+    results = []
+    if settings.batch_workers <= 1:
+        for i, input_file_path in enumerate(input_files):
+            print(f"{ULTRASINGER_HEAD} {gold_highlighted(f'Batch [{i + 1}/{len(input_files)}]')} {input_file_path}")
+            results.append(run_batch_song(base_settings, input_file_path))
+        # The workers of a pool unload their models when they exit
+        unload_models()
+    else:
+        # Spawn instead of fork, as forked CUDA and model states are not safe to reuse
+        with ProcessPoolExecutor(max_workers=settings.batch_workers,
+                                 mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [executor.submit(run_batch_song, base_settings, input_file_path)
+                       for input_file_path in input_files]
+            for future in futures:
+                results.append(future.result())
+
+    print_batch_summary(results)
+    return results
+
+
+def run_batch_song(base_settings: Settings, input_file_path: str) -> BatchResult:
+    """Run one song of a batch with a fresh copy of the batch settings
+
+    Loaded models stay in the process, so only the first song of every worker pays for loading them.
+    """
+    global settings
+    settings = copy.deepcopy(base_settings)
+    settings.input_file_path = input_file_path
+    try:
+        ultrastar_file_output, _, _ = run()
+        return BatchResult(input_file_path, ultrastar_file_output=ultrastar_file_output)
+    except (Exception, SystemExit) as exception:
+        # A broken song must not stop the rest of the batch
+        print(f"{ULTRASINGER_HEAD} {red_highlighted('Error:')} {input_file_path} -> {exception}")
+        return BatchResult(input_file_path, error=repr(exception))
+
+
+def get_pytorch_device() -> str:
+    """Device for the models, GPU support is checked on first use as it imports torch"""
+    if not settings.force_cpu and not settings.pytorch_device_checked:
         settings.pytorch_device = check_gpu_support()
+        settings.pytorch_device_checked = True
+    return settings.pytorch_device
+
+
+def check_requirements() -> None:
     print(f"{ULTRASINGER_HEAD} ----------------------")
 
     if not is_ffmpeg_available(settings.user_ffmpeg_path):
@@ -847,6 +1141,14 @@ def init_settings(argv: list[str]) -> Settings:
             except ValueError as ve:
                 print(f"{ULTRASINGER_HEAD} The model {arg} is not a valid demucs model selection. Please use one of the following models: {blue_highlighted(', '.join([m.value for m in DemucsModel]))}")
                 sys.exit()
+        elif opt in ("--demucs_segment"):
+            settings.demucs_segment = float(arg)
+        elif opt in ("--separation_window"):
+            settings.separation_window = float(arg)
+        elif opt in ("--vocals"):
+            settings.vocals_file_path = arg
+        elif opt in ("--instrumental"):
+            settings.instrumental_file_path = arg
         elif opt in ("--cookiefile"):
             settings.cookiefile = arg
         elif opt in ("--interactive"):
@@ -855,16 +1157,52 @@ def init_settings(argv: list[str]) -> Settings:
             settings.quantize_to_key = arg
         elif opt in ("--ffmpeg"):
             settings.user_ffmpeg_path = arg
-    if settings.output_folder_path == "":
-        if settings.input_file_path.startswith("https:"):
-            dirname = os.getcwd()
-        else:
-            dirname = os.path.dirname(settings.input_file_path)
-        settings.output_folder_path = os.path.join(dirname, "output")
+        elif opt in ("--batch"):
+            settings.batch_input_path = arg
+        elif opt in ("--batch_workers"):
+            settings.batch_workers = int(arg)
+        elif opt in ("--daemon"):
+            settings.daemon_mode = True
+        elif opt in ("--daemon_port"):
+            settings.daemon_port = int(arg)
+        elif opt in ("--daemon_queue_size"):
+            settings.daemon_queue_size = int(arg)
+        elif opt in ("--pipeline_workers"):
+            settings.pipeline_workers = int(arg)
+        elif opt in ("--cache_path"):
+            settings.cache_path = arg
+        elif opt in ("--cache_max_size"):
+            settings.cache_max_size = float(arg)
+        elif opt in ("--model_cache_max_size"):
+            settings.model_cache_max_size = float(arg)
+        elif opt in ("--in_memory_preprocessing"):
+            settings.in_memory_preprocessing = True
+        elif opt in ("--streaming_pitch"):
+            settings.streaming_pitch = True
+        elif opt in ("--pitch_workers"):
+            settings.pitch_workers = int(arg)
+        elif opt in ("--trace"):
+            settings.trace = True
+    if (settings.vocals_file_path is None) != (settings.instrumental_file_path is None):
+        print(f"{ULTRASINGER_HEAD} {red_highlighted('Error:')} --vocals and --instrumental must be given together")
+        sys.exit(1)
+    if settings.output_folder_path == "" and settings.batch_input_path is not None:
+        settings.output_folder_path = get_batch_output_base_folder(settings.batch_input_path)
+    elif settings.output_folder_path == "" and not settings.daemon_mode:
+        settings.output_folder_path = get_default_output_folder_path(settings.input_file_path)
 
     return settings
 
 
+def get_default_output_folder_path(input_file_path: str) -> str:
+    """Default output folder next to the input file"""
+    if input_file_path.startswith("https:"):
+        dirname = os.getcwd()
+    else:
+        dirname = os.path.dirname(input_file_path)
+    return os.path.join(dirname, "output")
+
+
 #For convenience, made True/False options into noargs
 def arg_options():
     short = "hi:o:amv:"
@@ -874,6 +1212,10 @@ def arg_options():
         "crepe=",
         "crepe_step_size=",
         "demucs=",
+        "demucs_segment=",
+        "separation_window=",
+        "vocals=",
+        "instrumental=",
         "whisper=",
         "whisper_align_model=",
         "whisper_batch_size=",
@@ -896,7 +1238,20 @@ def arg_options():
         "quantize_to_key",
         "interactive",
         "cookiefile=",
-        "ffmpeg="
+        "ffmpeg=",
+        "batch=",
+        "batch_workers=",
+        "daemon",
+        "daemon_port=",
+        "daemon_queue_size=",
+        "pipeline_workers=",
+        "cache_path=",
+        "cache_max_size=",
+        "model_cache_max_size=",
+        "trace",
+        "in_memory_preprocessing",
+        "streaming_pitch",
+        "pitch_workers=",
     ]
     return long, short
 
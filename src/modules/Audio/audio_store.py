@@ -0,0 +1,80 @@
+"""Decoded audio shared between the stages of a song"""
+
+import os
+import threading
+from dataclasses import dataclass, field
+
+import librosa
+import numpy as np
+
+WHISPER_SAMPLE_RATE = 16000
+SWIFT_F0_SAMPLE_RATE = 16000
+
+
+@dataclass
+class DecodedAudio:
+    """Mono float32 samples of a file at the native and all requested sample rates"""
+    native_sample_rate: int
+    samples: dict[int, np.ndarray] = field(default_factory=dict)
+    lock: threading.Lock = field(default_factory=threading.Lock)
+
+
+# Every file is decoded once per song and each sample rate is resampled at most once
+_decoded_audio: dict[tuple[str, int, int], DecodedAudio] = {}
+_store_lock = threading.Lock()
+
+
+def __store_key(audio_path: str) -> tuple[str, int, int]:
+    """A rewritten file gets a new key, so a stale decode is never returned"""
+    stat = os.stat(audio_path)
+    return os.path.abspath(audio_path), stat.st_size, stat.st_mtime_ns
+
+
+def __decode(audio_path: str) -> DecodedAudio:
+    samples, native_sample_rate = librosa.load(audio_path, sr=None, mono=True, dtype=np.float32)
+    samples.flags.writeable = False
+    return DecodedAudio(int(native_sample_rate), {int(native_sample_rate): samples})
+
+
+def load_audio(audio_path: str, sample_rate: int = None) -> tuple[np.ndarray, int]:
+    """Mono float32 samples and sample rate of an audio file, the native rate if sample_rate is None
+
+    The samples are shared and read only, copy them before changing them.
+    """
+    key = __store_key(audio_path)
+    with _store_lock:
+        if key not in _decoded_audio:
+            _decoded_audio[key] = DecodedAudio(0)
+        decoded_audio = _decoded_audio[key]
+
+    # Other files are decoded concurrently, the same file only once
+    with decoded_audio.lock:
+        if decoded_audio.native_sample_rate == 0:
+            decoded = __decode(audio_path)
+            decoded_audio.native_sample_rate = decoded.native_sample_rate
+            decoded_audio.samples = decoded.samples
+        if sample_rate is None:
+            sample_rate = decoded_audio.native_sample_rate
+        if sample_rate not in decoded_audio.samples:
+            samples = librosa.resample(
+                decoded_audio.samples[decoded_audio.native_sample_rate],
+                orig_sr=decoded_audio.native_sample_rate,
+                target_sr=sample_rate,
+            ).astype(np.float32, copy=False)
+            samples.flags.writeable = False
+            decoded_audio.samples[sample_rate] = samples
+        return decoded_audio.samples[sample_rate], sample_rate
+
+
+def store_audio(audio_path: str, samples: np.ndarray, sample_rate: int) -> None:
+    """Add the samples of a just written file, which must decode to exactly these samples"""
+    samples = samples.astype(np.float32, copy=True)
+    samples.flags.writeable = False
+    with _store_lock:
+        _decoded_audio[__store_key(audio_path)] = DecodedAudio(sample_rate, {sample_rate: samples})
+
+
+def clear_audio_store() -> None:
+    """Free the decoded audio of the finished song"""
+    with _store_lock:
+        _decoded_audio.clear()
@@ -1,6 +1,6 @@
 import librosa
-import soundfile as sf
 
+from modules.Audio.audio_store import load_audio
 from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted
 
 
@@ -15,11 +15,5 @@ def get_bpm_from_data(data, sampling_rate):
 
 def get_bpm_from_file(wav_file: str) -> float:
     """Get real bpm from audio file"""
-    data, sampling_rate = sf.read(wav_file, dtype='float32')
-    # Transpose if stereo to match librosa's expected format
-    if len(data.shape) > 1:
-        data = data.T
-    # Convert to mono if stereo
-    if data.ndim > 1:
-        data = librosa.to_mono(data)
+    data, sampling_rate = load_audio(wav_file)
     return get_bpm_from_data(data, sampling_rate)
@@ -3,18 +3,26 @@
 import subprocess
 import os
 import librosa
+import numpy as np
 import soundfile as sf
 
+from modules.Audio.audio_store import load_audio
 from modules.console_colors import ULTRASINGER_HEAD
 
 
 def convert_audio_to_mono_wav(input_file_path: str, output_file_path: str) -> None:
     """Convert audio to mono wav"""
     print(f"{ULTRASINGER_HEAD} Converting audio for AI")
-    y, sr = librosa.load(input_file_path, mono=True, sr=None)
+    y, sr = load_audio(input_file_path)
     sf.write(output_file_path, y, sr)
 
 
+def convert_samples_to_mono(samples: np.ndarray) -> np.ndarray:
+    """Convert samples of shape (samples, channels) to mono like librosa.load"""
+    print(f"{ULTRASINGER_HEAD} Converting audio for AI")
+    return librosa.to_mono(samples.T)
+
+
 def convert_audio_format(input_file_path: str, output_file_path: str) -> None:
     """Convert audio to the format specified by the output file extension using ffmpeg"""
     output_format = os.path.splitext(output_file_path)[1].lstrip('.')
@@ -1,10 +1,14 @@
 """Reduce noise from audio"""
 
+from typing import Optional
+
 import ffmpeg
+import numpy as np
 
 from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted, green_highlighted
 from modules.os_helper import check_file_exists
 
+DENOISE_FILTER = "afftdn=nr=70:nf=-80:tn=1"
 
 def __ffmpeg_reduce_noise(input_file_path: str, output_file: str) -> None:
     """Reduce noise from vocal audio with ffmpeg."""
@@ -26,7 +30,7 @@ def __ffmpeg_reduce_noise(input_file_path: str, output_file: str) -> None:
     try:
         (
             ffmpeg.input(input_file_path)
-            .output(output_file, af="afftdn=nr=70:nf=-80:tn=1")
+            .output(output_file, af=DENOISE_FILTER)
             .overwrite_output()
             .run(capture_stdout=True, capture_stderr=True)
         )
@@ -43,3 +47,34 @@ def denoise_vocal_audio(input_path: str, output_path: str, skip_cache: bool = Fa
         __ffmpeg_reduce_noise(input_path, output_path)
     else:
         print(f"{ULTRASINGER_HEAD} {green_highlighted('cache')} reusing cached denoised audio")
+
+
+def __ffmpeg_reduce_noise_in_memory(stream, channels: int, input_bytes: Optional[bytes] = None) -> np.ndarray:
+    """Denoise an ffmpeg input stream into float32 samples of shape (samples, channels)"""
+    print(
+        f"{ULTRASINGER_HEAD} Reduce noise from vocal audio with {blue_highlighted('ffmpeg')} in memory."
+    )
+    try:
+        output, _ = (
+            stream
+            .output("pipe:", format="f32le", acodec="pcm_f32le", af=DENOISE_FILTER)
+            .run(input=input_bytes, capture_stdout=True, capture_stderr=True)
+        )
+    except ffmpeg.Error as ffmpeg_exception:
+        print("ffmpeg stderr:", ffmpeg_exception.stderr.decode("utf8"))
+        raise ffmpeg_exception
+    return np.frombuffer(output, np.float32).reshape(-1, channels)
+
+
+def denoise_vocal_samples(input_path: str) -> tuple[np.ndarray, int]:
+    """Denoise vocal audio into memory, returns float32 samples of shape (samples, channels) and the sample rate"""
+    stream = ffmpeg.probe(input_path, select_streams="a")["streams"][0]
+    channels = int(stream["channels"])
+    return __ffmpeg_reduce_noise_in_memory(ffmpeg.input(input_path), channels), int(stream["sample_rate"])
+
+
+def denoise_samples(samples: np.ndarray, sample_rate: int) -> np.ndarray:
+    """Denoise float32 samples of shape (samples, channels) in memory, they are piped through ffmpeg"""
+    channels = samples.shape[1]
+    return __ffmpeg_reduce_noise_in_memory(ffmpeg.input("pipe:", format="f32le", ac=channels, ar=sample_rate),
+                                           channels, np.ascontiguousarray(samples, dtype=np.float32).tobytes())
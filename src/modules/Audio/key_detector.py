@@ -1,8 +1,12 @@
 """Key detection and pitch quantization to musical scale"""
 
+from dataclasses import dataclass, field
+from typing import Optional
+
 import librosa
 import numpy as np
 
+from modules.Audio.audio_store import SWIFT_F0_SAMPLE_RATE, load_audio
 from modules.console_colors import (
     ULTRASINGER_HEAD,
 blue_highlighted)
@@ -11,54 +15,264 @@ blue_highlighted)
 MAJOR_SCALE = [0, 2, 4, 5, 7, 9, 11]
 MINOR_SCALE = [0, 2, 3, 5, 7, 8, 10]
 NOTE_NAMES = ['C', 'C#', 'D', 'D#', 'E', 'F', 'F#', 'G', 'G#', 'A', 'A#', 'B']
+MIDI_NOTE_COUNT = 128
+
+# Quantized midi note of every midi note number, one table per key.
+# Ties are decided by the iteration order of the allowed notes, so the order is part of the cache key.
+_quantization_tables: dict[tuple[str, ...], np.ndarray] = {}
+
+
+# The chroma reaches up to C8, the 16 kHz samples of the pitch detection are used
+KEY_DETECTION_SAMPLE_RATE = SWIFT_F0_SAMPLE_RATE
+# Chroma is computed in blocks, the margins keep the edges of the blocks like in one pass over the song
+CHROMA_HOP_LENGTH = 512
+CHROMA_BINS_PER_OCTAVE = 36
+CHROMA_BLOCK_SECONDS = 30.0
+CHROMA_BLOCK_MARGIN_SECONDS = 2.0
+# Length of the sections of the key map
+KEY_SECTION_SECONDS = 30.0
+# A section only gets its own key if that key correlates clearly better with it than the key of the song
+KEY_CHANGE_MIN_CORRELATION = 0.5
+KEY_CHANGE_MIN_MARGIN = 0.25
+# Weight of the neighbouring sections in the chroma of a section
+KEY_SECTION_NEIGHBOUR_WEIGHT = 0.25
+# A key change must last this many sections, so a single noisy section keeps the key of the song
+KEY_CHANGE_MIN_SECTIONS = 2
+
+MAJOR_TEMPLATE = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1])  # Major scale pattern
+MINOR_TEMPLATE = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0])  # Minor scale pattern
+MODES = ['major', 'minor']
+
+
+@dataclass
+class KeyMap:
+    """Key of the whole song and the keys of its sections"""
+    key: str
+    mode: str
+    # Start time in seconds and (key, mode) of every section, a section lasts until the next one starts
+    section_start_times: np.ndarray = field(default_factory=lambda: np.zeros(1))
+    section_keys: list[tuple[str, str]] = field(default_factory=list)
+    _tables: np.ndarray = field(default=None, init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        if not self.section_keys:
+            self.section_keys = [(self.key, self.mode)]
+        self.section_start_times = np.asarray(self.section_start_times, dtype=np.float64)
+
+    def section_indexes(self, times: np.ndarray) -> np.ndarray:
+        """Section of every time"""
+        indexes = np.searchsorted(self.section_start_times, np.asarray(times, dtype=np.float64), side="right") - 1
+        return np.maximum(indexes, 0)
+
+    def allowed_notes_at(self, time: float) -> set[str]:
+        """Allowed note names of the section at time"""
+        return get_allowed_notes_for_key(*self.section_keys[int(self.section_indexes([time])[0])])
+
+    def quantize(self, midi_notes: np.ndarray, times: np.ndarray) -> np.ndarray:
+        """Quantize every MIDI note to the key of its section like quantize_midi_notes_to_key"""
+        if self._tables is None:
+            self._tables = np.stack([get_key_quantization_table(get_allowed_notes_for_key(*section_key))
+                                     for section_key in self.section_keys])
+        midi_notes = np.asarray(midi_notes, dtype=np.int64)
+        sections = self.section_indexes(times)
+        in_table = (midi_notes >= 0) & (midi_notes < MIDI_NOTE_COUNT)
+        quantized = midi_notes.copy()
+        quantized[in_table] = self._tables[sections[in_table], midi_notes[in_table]]
+        for index in np.flatnonzero(~in_table):
+            quantized[index] = quantize_midi_note_to_key(
+                int(midi_notes[index]), get_allowed_notes_for_key(*self.section_keys[sections[index]]))
+        return quantized
+
+
+def __frame_blocks(y: np.ndarray, sr: int):
+    """Blocks of the audio with margins, yields the first and last frame, the offset of the first frame and samples"""
+    frame_count = 1 + len(y) // CHROMA_HOP_LENGTH
+    block_frames = int(CHROMA_BLOCK_SECONDS * sr) // CHROMA_HOP_LENGTH
+    margin_frames = int(np.ceil(CHROMA_BLOCK_MARGIN_SECONDS * sr / CHROMA_HOP_LENGTH))
+
+    # Blocks of equal length, so that the last block is not too short for the transform
+    block_count = max(round(frame_count / block_frames), 1)
+    block_bounds = np.linspace(0, frame_count, block_count + 1).astype(int)
+    for first_frame, last_frame in zip(block_bounds[:-1], block_bounds[1:]):
+        block_start_frame = max(first_frame - margin_frames, 0)
+        block = y[block_start_frame * CHROMA_HOP_LENGTH:(last_frame + margin_frames) * CHROMA_HOP_LENGTH]
+        yield first_frame, last_frame, first_frame - block_start_frame, block
+
+
+def estimate_tuning(y: np.ndarray, sr: int) -> float:
+    """
+    Tuning deviation of the whole audio like librosa.estimate_tuning, with the pitches tracked in blocks.
 
+    Args:
+        y: Mono samples
+        sr: Sample rate
 
-def detect_key_from_audio(audio_path: str) -> tuple[str, str]:
+    Returns:
+        Tuning deviation in fractions of a chroma bin
     """
-    Detect the key and mode (major/minor) of a song from audio file.
+    pitches = []
+    magnitudes = []
+    for first_frame, last_frame, offset, block in __frame_blocks(y, sr):
+        pitch, magnitude = librosa.piptrack(y=block, sr=sr, hop_length=CHROMA_HOP_LENGTH)
+        pitch = pitch[:, offset:offset + last_frame - first_frame]
+        magnitude = magnitude[:, offset:offset + last_frame - first_frame]
+        pitch_mask = pitch > 0
+        pitches.append(pitch[pitch_mask])
+        magnitudes.append(magnitude[pitch_mask])
+
+    pitches = np.concatenate(pitches)
+    magnitudes = np.concatenate(magnitudes)
+    threshold = np.median(magnitudes) if len(magnitudes) > 0 else 0.0
+    return librosa.pitch_tuning(pitches[magnitudes >= threshold], bins_per_octave=CHROMA_BINS_PER_OCTAVE)
+
+
+def compute_chroma(y: np.ndarray, sr: int) -> np.ndarray:
+    """
+    Chroma of the whole audio like librosa.feature.chroma_cqt, computed in blocks to bound the memory of the
+    constant-Q transform.
 
     Args:
-        audio_path: Path to audio file
+        y: Mono samples
+        sr: Sample rate
 
     Returns:
-        Tuple of (key_note, mode) e.g., ('C', 'major') or ('A', 'minor')
+        Chroma with shape (12, frames) and a frame every CHROMA_HOP_LENGTH samples
     """
-    print(f"{ULTRASINGER_HEAD} Detecting musical key")
+    # The tuning of the whole audio, the transform of a block would estimate the tuning of the block
+    tuning = estimate_tuning(y, sr)
+    chroma = np.zeros((12, 1 + len(y) // CHROMA_HOP_LENGTH), dtype=np.float32)
+    for first_frame, last_frame, offset, block in __frame_blocks(y, sr):
+        block_chroma = librosa.feature.chroma_cqt(y=block, sr=sr, hop_length=CHROMA_HOP_LENGTH, tuning=tuning,
+                                                  bins_per_octave=CHROMA_BINS_PER_OCTAVE)
+        chroma[:, first_frame:last_frame] = block_chroma[:, offset:offset + last_frame - first_frame]
+    return chroma
+
+
+def correlate_with_key_templates(chroma_profiles: np.ndarray) -> np.ndarray:
+    """
+    Pearson correlation of chroma profiles with the major and minor templates of all 12 keys.
+
+    Args:
+        chroma_profiles: Chroma profiles with shape (profiles, 12)
+
+    Returns:
+        Correlations with shape (profiles, 12 keys, 2 modes), nan for constant profiles
+    """
+    templates = np.array([np.roll(template / np.sum(template), shift)
+                          for shift in range(12) for template in [MAJOR_TEMPLATE, MINOR_TEMPLATE]])
+    templates = templates - templates.mean(axis=1, keepdims=True)
+    templates = templates / np.linalg.norm(templates, axis=1, keepdims=True)
+
+    profiles = np.atleast_2d(chroma_profiles).astype(np.float64)
+    profiles = profiles - profiles.mean(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        profiles = profiles / np.linalg.norm(profiles, axis=1, keepdims=True)
+    return (profiles @ templates.T).reshape(len(profiles), 12, 2)
+
 
-    y, sr = librosa.load(audio_path, sr=None, duration=60.0)  # Analyze first 60 seconds
-    chroma = librosa.feature.chroma_cqt(y=y, sr=sr)
-    chroma_avg = np.mean(chroma, axis=1)
-    chroma_avg = chroma_avg / np.sum(chroma_avg)
+def best_keys(correlations: np.ndarray) -> list[Optional[tuple[str, str]]]:
+    """Key with the highest correlation of every profile, the first key wins a tie, None without a correlation"""
+    flat = correlations.reshape(len(correlations), 24)
+    valid = np.where(np.isnan(flat), -np.inf, flat)
+    best = np.argmax(valid, axis=1)
+    return [(NOTE_NAMES[index // 2], MODES[index % 2]) if valid[row, index] > -1 else None
+            for row, index in enumerate(best)]
 
-    major_template = np.array([1, 0, 1, 0, 1, 1, 0, 1, 0, 1, 0, 1])  # Major scale pattern
-    minor_template = np.array([1, 0, 1, 1, 0, 1, 0, 1, 1, 0, 1, 0])  # Minor scale pattern
-    major_template = major_template / np.sum(major_template)
-    minor_template = minor_template / np.sum(minor_template)
 
-    best_correlation = -1
-    best_key = None
-    best_mode = None
+def detect_key_map(y: np.ndarray, sr: int) -> KeyMap:
+    """
+    Detect the key of the whole song and of every section of KEY_SECTION_SECONDS.
+
+    Args:
+        y: Mono samples
+        sr: Sample rate
+
+    Returns:
+        KeyMap, sections with the same key are merged. Sections without a clearly better key and short key
+        changes get the key of the song
+    """
+    chroma = compute_chroma(y, sr)
+    section_frames = max(int(KEY_SECTION_SECONDS * sr) // CHROMA_HOP_LENGTH, 1)
+    # Sections of equal length, a short last section would get a random key
+    section_count = max(round(chroma.shape[1] / section_frames), 1)
+    section_starts = np.linspace(0, chroma.shape[1], section_count + 1).astype(int)[:-1]
+    section_profiles = np.add.reduceat(chroma, section_starts, axis=1).T
+
+    # The key of the song uses the chroma of all frames, the sections are smoothed with their neighbours
+    song_profile = section_profiles.sum(axis=0)
+    smoothed_profiles = section_profiles.copy()
+    smoothed_profiles[1:] += KEY_SECTION_NEIGHBOUR_WEIGHT * section_profiles[:-1]
+    smoothed_profiles[:-1] += KEY_SECTION_NEIGHBOUR_WEIGHT * section_profiles[1:]
+    correlations = correlate_with_key_templates(np.vstack([song_profile, smoothed_profiles]))
+    keys = best_keys(correlations)
+    song_key = keys[0]
+    if song_key is None:
+        return KeyMap(None, None)
+
+    song_key_index = (NOTE_NAMES.index(song_key[0]), MODES.index(song_key[1]))
+    candidate_keys = []
+    for section_correlations, section_key in zip(correlations[1:], keys[1:]):
+        if section_key is not None:
+            key_correlation = section_correlations[NOTE_NAMES.index(section_key[0]), MODES.index(section_key[1])]
+            if (key_correlation < KEY_CHANGE_MIN_CORRELATION
+                    or key_correlation - section_correlations[song_key_index] < KEY_CHANGE_MIN_MARGIN):
+                section_key = None
+        candidate_keys.append(song_key if section_key is None else section_key)
+
+    # Hysteresis, runs of another key shorter than KEY_CHANGE_MIN_SECTIONS fall back to the key of the song
+    run_start = 0
+    for section in range(1, len(candidate_keys) + 1):
+        if section == len(candidate_keys) or candidate_keys[section] != candidate_keys[run_start]:
+            if section - run_start < KEY_CHANGE_MIN_SECTIONS:
+                candidate_keys[run_start:section] = [song_key] * (section - run_start)
+            run_start = section
+
+    start_times = []
+    section_keys = []
+    for section, section_key in enumerate(candidate_keys):
+        if section_keys and section_keys[-1] == section_key:
+            continue
+        start_times.append(section_starts[section] * CHROMA_HOP_LENGTH / sr)
+        section_keys.append(section_key)
+    start_times[0] = 0.0
+    return KeyMap(song_key[0], song_key[1], np.array(start_times), section_keys)
+
+
+def detect_key_map_from_audio(audio_path: str) -> KeyMap:
+    """
+    Detect the key map of a song from audio file.
+
+    Args:
+        audio_path: Path to audio file
 
-    # Try all 12 keys
-    for shift in range(12):
-        shifted_major = np.roll(major_template, shift)
-        shifted_minor = np.roll(minor_template, shift)
+    Returns:
+        KeyMap with the key of the whole song and of its sections
+    """
+    print(f"{ULTRASINGER_HEAD} Detecting musical key")
+
+    y, sr = load_audio(audio_path, KEY_DETECTION_SAMPLE_RATE)
+    key_map = detect_key_map(y, sr)
+
+    print(f"{ULTRASINGER_HEAD} Detected key: {blue_highlighted(str(key_map.key))} {blue_highlighted(str(key_map.mode))}")
+    if len(key_map.section_keys) > 1:
+        changes = ", ".join(f"{start_time:.0f}s {key} {mode}" for start_time, (key, mode)
+                            in zip(key_map.section_start_times[1:], key_map.section_keys[1:]))
+        print(f"{ULTRASINGER_HEAD} Key changes: {blue_highlighted(changes)}")
+    return key_map
 
-        major_corr = np.corrcoef(chroma_avg, shifted_major)[0, 1]
-        minor_corr = np.corrcoef(chroma_avg, shifted_minor)[0, 1]
 
-        if major_corr > best_correlation:
-            best_correlation = major_corr
-            best_key = NOTE_NAMES[shift]
-            best_mode = 'major'
+def detect_key_from_audio(audio_path: str) -> tuple[str, str]:
+    """
+    Detect the key and mode (major/minor) of a song from audio file.
 
-        if minor_corr > best_correlation:
-            best_correlation = minor_corr
-            best_key = NOTE_NAMES[shift]
-            best_mode = 'minor'
+    Args:
+        audio_path: Path to audio file
 
-    print(f"{ULTRASINGER_HEAD} Detected key: {blue_highlighted(best_key)} {blue_highlighted(best_mode)}")
-    return best_key, best_mode
+    Returns:
+        Tuple of (key_note, mode) e.g., ('C', 'major') or ('A', 'minor')
+    """
+    key_map = detect_key_map_from_audio(audio_path)
+    return key_map.key, key_map.mode
 
 
 def get_allowed_notes_for_key(key_note: str, mode: str) -> set[str]:
@@ -144,4 +358,80 @@ def quantize_note_to_key(note: str, allowed_notes: set[str]) -> str:
                 continue
 
     #print(f"{ULTRASINGER_HEAD} Moved {blue_highlighted(note)} to {blue_highlighted(best_note)}")
-    return best_note
\ No newline at end of file
+    return best_note
+
+def quantize_midi_note_to_key(midi_note: int, allowed_notes: set[str]) -> int:
+    """
+    Quantize a midi note number to the nearest allowed note in the key.
+
+    Same search as quantize_note_to_key, but on midi note numbers.
+
+    Args:
+        midi_note: MIDI note number (e.g. 61 for C#4)
+        allowed_notes: Set of allowed note names without octave
+
+    Returns:
+        Quantized MIDI note number
+    """
+    if NOTE_NAMES[midi_note % 12] in allowed_notes:
+        return midi_note
+
+    octave = midi_note // 12 - 1
+    min_distance = float('inf')
+    best_note = midi_note
+
+    for allowed_note_name in allowed_notes:
+        if allowed_note_name not in NOTE_NAMES:
+            continue
+        # Try same octave and adjacent octaves
+        for oct_offset in [-1, 0, 1]:
+            test_octave = octave + oct_offset
+            if test_octave < 0 or test_octave > 8:
+                continue
+
+            test_midi = NOTE_NAMES.index(allowed_note_name) + 12 * (test_octave + 1)
+            distance = abs(test_midi - midi_note)
+            if distance < min_distance:
+                min_distance = distance
+                best_note = test_midi
+
+    return best_note
+
+
+def get_key_quantization_table(allowed_notes: set[str]) -> np.ndarray:
+    """
+    Quantized MIDI note of all 128 MIDI note numbers, built once per key.
+
+    Args:
+        allowed_notes: Set of allowed note names without octave
+
+    Returns:
+        Array with the quantized MIDI note at the index of each MIDI note
+    """
+    key = tuple(allowed_notes)
+    if key not in _quantization_tables:
+        _quantization_tables[key] = np.array(
+            [quantize_midi_note_to_key(midi_note, allowed_notes) for midi_note in range(MIDI_NOTE_COUNT)],
+            dtype=np.int64)
+    return _quantization_tables[key]
+
+
+def quantize_midi_notes_to_key(midi_notes: np.ndarray, allowed_notes: set[str]) -> np.ndarray:
+    """
+    Quantize an array of MIDI note numbers like quantize_midi_note_to_key.
+
+    Args:
+        midi_notes: MIDI note numbers
+        allowed_notes: Set of allowed note names without octave
+
+    Returns:
+        Quantized MIDI note numbers
+    """
+    midi_notes = np.asarray(midi_notes, dtype=np.int64)
+    table = get_key_quantization_table(allowed_notes)
+    in_table = (midi_notes >= 0) & (midi_notes < MIDI_NOTE_COUNT)
+    quantized = midi_notes.copy()
+    quantized[in_table] = table[midi_notes[in_table]]
+    for index in np.flatnonzero(~in_table):
+        quantized[index] = quantize_midi_note_to_key(int(midi_notes[index]), allowed_notes)
+    return quantized
@@ -1,15 +1,25 @@
 """Separate vocals from audio"""
+import math
 import os
+import shutil
+from dataclasses import dataclass
 from enum import Enum
+from typing import Callable, Iterator, Optional
 
-import demucs.separate
+import librosa
+import numpy as np
+import soundfile as sf
 
+from modules.Audio.audio_store import store_audio
 from modules.console_colors import (
     ULTRASINGER_HEAD,
     blue_highlighted,
-    red_highlighted, green_highlighted,
+    gold_highlighted,
+    red_highlighted,
 )
-from modules.os_helper import check_file_exists
+from modules.ffmpeg_helper import decode_audio_to_float_wav, get_audio_duration_and_sample_rate
+from modules.model_registry import ModelKey, get_model
+from modules.stage_cache import StageCache
 
 class DemucsModel(Enum):
     HTDEMUCS = "htdemucs"           # first version of Hybrid Transformer Demucs. Trained on MusDB + 800 songs. Default model.
@@ -22,43 +32,314 @@ class DemucsModel(Enum):
     MDX_EXTRA_Q = "mdx_extra_q"     # quantized version of mdx_extra. Smaller download and storage but quality can be slightly worse.
     SIG = "SIG"                     # Placeholder for a single model from the model zoo.
 
-def separate_audio(input_file_path: str, output_folder: str, model: DemucsModel, device="cpu") -> None:
-    """Separate vocals from audio with demucs."""
+# Long songs can be separated in overlapping windows, the windows are crossfaded over the overlap
+SEPARATION_WINDOW_OVERLAP_SECONDS = 5.0
+
+# Given stems can be a little longer or shorter than the audio because of encoder padding
+STEM_DURATION_TOLERANCE_SECONDS = 0.5
+
+
+@dataclass
+class SeparatedAudio:
+    """Vocals and the sum of all other sources as (channels, samples) float32 arrays, rescaled like demucs"""
+
+    vocals: np.ndarray
+    instrumental: np.ndarray
+    sample_rate: int
+
+
+def _rescale_like_demucs(wav: np.ndarray) -> np.ndarray:
+    """Scale the audio down if its peak is above 1, the same as demucs --clip-mode rescale"""
+    return (wav / max(1.01 * float(np.abs(wav).max(initial=0)), 1)).astype(np.float32, copy=False)
+
+
+def _get_demucs_model(model: DemucsModel, device: str):
+    """Lazy load demucs model, it stays loaded for the next songs of the process"""
+    def load():
+        from demucs.pretrained import get_model as get_demucs_model
+
+        demucs_model = get_demucs_model(model.value)
+        demucs_model.eval()
+        return demucs_model
+
+    return get_model(ModelKey("demucs", model.value, device), load)
+
+
+def _check_segment(demucs_model, model: DemucsModel, segment: Optional[float]) -> None:
+    """Transformer models can not separate longer segments than they were trained on"""
+    from demucs.apply import BagOfModels
+    from demucs.htdemucs import HTDemucs
+
+    max_segment = float("inf")
+    if isinstance(demucs_model, HTDemucs):
+        max_segment = float(demucs_model.segment)
+    elif isinstance(demucs_model, BagOfModels):
+        max_segment = demucs_model.max_allowed_segment
+    if segment is not None and segment > max_segment:
+        raise ValueError(f"The demucs model {model.value} supports segments of at most {max_segment} seconds")
+
+
+def separate_audio_in_memory(input_file_path: str, model: DemucsModel, device="cpu",
+                             segment: Optional[float] = None) -> SeparatedAudio:
+    """Separate vocals from audio with the loaded demucs model, the same as demucs --two-stems vocals"""
+    # Imported on first use, as importing demucs and torch takes seconds
+    import torch
+    from demucs.apply import apply_model
+    from demucs.separate import load_track
 
     print(
         f"{ULTRASINGER_HEAD} Separating vocals from audio with {blue_highlighted('demucs')} with model {blue_highlighted(model.value)} and {red_highlighted(device)} as worker."
     )
 
-    demucs.separate.main(
-        [
-            "--two-stems", "vocals",
-            "-d", f"{device}",
-            "--float32",
-            "-n",
-            model.value,
-            "--out", f"{os.path.join(output_folder, 'separated')}",
-            f"{input_file_path}",
-        ]
+    demucs_model = _get_demucs_model(model, device)
+    _check_segment(demucs_model, model, segment)
+
+    wav = load_track(input_file_path, demucs_model.audio_channels, demucs_model.samplerate)
+    ref = wav.mean(0)
+    wav = (wav - ref.mean()) / ref.std()
+    with torch.no_grad():
+        sources = apply_model(demucs_model, wav[None], device=device, shifts=1, split=True, overlap=0.25,
+                              progress=True, num_workers=0, segment=segment)[0]
+    sources = sources * ref.std() + ref.mean()
+
+    sources = sources.cpu().numpy()
+    vocals_index = demucs_model.sources.index("vocals")
+    return SeparatedAudio(_rescale_like_demucs(sources[vocals_index]),
+                          _rescale_like_demucs(np.delete(sources, vocals_index, axis=0).sum(axis=0)),
+                          demucs_model.samplerate)
+
+
+def save_separated_audio(separated_audio: SeparatedAudio, output_folder: str) -> None:
+    """Write vocals.wav and no_vocals.wav as float32 wav files, which decode to exactly the separated samples"""
+    for stem, wav in [("vocals.wav", separated_audio.vocals), ("no_vocals.wav", separated_audio.instrumental)]:
+        sf.write(os.path.join(output_folder, stem), wav.T, separated_audio.sample_rate, subtype="FLOAT")
+
+
+def separate_audio(input_file_path: str, output_folder: str, model: DemucsModel, device="cpu",
+                   segment: Optional[float] = None) -> SeparatedAudio:
+    """Separate vocals from audio with demucs into vocals.wav and no_vocals.wav of the output folder"""
+    separated_audio = separate_audio_in_memory(input_file_path, model, device, segment)
+    save_separated_audio(separated_audio, output_folder)
+    return separated_audio
+
+
+def get_window_bounds(length: int, window_length: int, overlap: int) -> list[tuple[int, int]]:
+    """Start and end samples of windows, which overlap their neighbours by overlap samples
+
+    The last window is longer than the overlap, so every overlap lies within exactly two windows.
+    """
+    hop_length = window_length - overlap
+    count = max(math.ceil((length - overlap) / hop_length), 1)
+    return [(index * hop_length, min(index * hop_length + window_length, length)) for index in range(count)]
+
+
+def _convert_channels(wav: np.ndarray, channels: int) -> np.ndarray:
+    """Convert (channels, samples) audio to the channels of the model like demucs"""
+    if len(wav) == channels:
+        return wav
+    if channels == 1:
+        return wav.mean(axis=0, keepdims=True)
+    if len(wav) == 1:
+        return np.repeat(wav, channels, axis=0)
+    if len(wav) > channels:
+        return wav[:channels]
+    raise ValueError(f"Audio with {len(wav)} channels can not be converted to {channels} channels")
+
+
+def _get_normalization(audio_file: sf.SoundFile, channels: int, block_length: int) -> tuple[float, float]:
+    """Mean and standard deviation of the mono mix of the whole file, which demucs normalizes the input with"""
+    total = 0.0
+    total_squares = 0.0
+    audio_file.seek(0)
+    for block in audio_file.blocks(blocksize=block_length, dtype="float32", always_2d=True):
+        mono = _convert_channels(block.T, channels).mean(axis=0, dtype=np.float64)
+        total += mono.sum()
+        total_squares += np.square(mono).sum()
+    count = audio_file.frames
+    mean = total / count
+    std = math.sqrt(max(total_squares - count * mean * mean, 0.0) / max(count - 1, 1))
+    return mean, std
+
+
+def _overlap_add_windows(window_paths: list[str], bounds: list[tuple[int, int]], overlap: int,
+                         stem: str) -> Iterator[np.ndarray]:
+    """Consecutive (channels, samples) chunks of the crossfaded windows, only one window is loaded at a time"""
+    fade_in = ((np.arange(overlap) + 0.5) / overlap).astype(np.float32)
+    tail = None
+    for index, (window_path, (start, end)) in enumerate(zip(window_paths, bounds)):
+        window = np.load(os.path.join(window_path, f"{stem}.npy"))
+        if index > 0:
+            window[:, :overlap] *= fade_in
+            window[:, :overlap] += tail
+        if index == len(bounds) - 1:
+            yield window
+        else:
+            split = end - start - overlap
+            window[:, split:] *= fade_in[::-1]
+            tail = window[:, split:].copy()
+            yield window[:, :split]
+
+
+def _write_overlap_added_windows(output_file_path: str, window_paths: list[str], bounds: list[tuple[int, int]],
+                                 overlap: int, sample_rate: int, channels: int, stem: str) -> None:
+    """Write the crossfaded windows as float32 wav, rescaled like demucs if the peak is above 1"""
+    peak = max(float(np.abs(chunk).max(initial=0)) for chunk in
+               _overlap_add_windows(window_paths, bounds, overlap, stem))
+    scale = max(1.01 * peak, 1)
+    with sf.SoundFile(output_file_path, "w", samplerate=sample_rate, channels=channels, subtype="FLOAT") as output_file:
+        for chunk in _overlap_add_windows(window_paths, bounds, overlap, stem):
+            output_file.write((chunk / scale).T)
+
+
+def separate_decoded_audio_in_windows(stage_cache: StageCache,
+                                      input_file_path: str,
+                                      decoded_file_path: str,
+                                      output_folder: str,
+                                      separate_window: Callable[[np.ndarray], np.ndarray],
+                                      channels: int,
+                                      vocals_index: int,
+                                      params: dict,
+                                      window_seconds: float,
+                                      overlap_seconds: float = SEPARATION_WINDOW_OVERLAP_SECONDS,
+                                      skip_cache: bool = False) -> list[str]:
+    """Separate decoded audio in overlapping windows into vocals.wav and no_vocals.wav of the output folder
+
+    separate_window gets a normalized (channels, samples) window and returns its (sources, channels, samples).
+    The instrumental is the sum of all sources except vocals_index.
+    Every separated window is a stage cache entry of its own, keyed by the input file, so an interrupted
+    separation continues with the first missing window. Returns the entry folders of the windows.
+    """
+    with sf.SoundFile(decoded_file_path) as audio_file:
+        sample_rate = audio_file.samplerate
+        window_length = max(round(window_seconds * sample_rate), 1)
+        overlap = min(round(overlap_seconds * sample_rate), window_length // 2)
+        bounds = get_window_bounds(audio_file.frames, window_length, overlap)
+        mean, std = _get_normalization(audio_file, channels, window_length)
+
+        window_paths = []
+        for index, (start, end) in enumerate(bounds):
+            def separate(entry_path: str) -> None:
+                print(f"{ULTRASINGER_HEAD} Separating window {blue_highlighted(f'{index + 1}/{len(bounds)}')}")
+                audio_file.seek(start)
+                wav = _convert_channels(audio_file.read(end - start, dtype="float32", always_2d=True).T, channels)
+                sources = (separate_window(((wav - mean) / std).astype(np.float32)) * std + mean).astype(np.float32)
+                np.save(os.path.join(entry_path, "vocals.npy"), sources[vocals_index])
+                np.save(os.path.join(entry_path, "no_vocals.npy"), np.delete(sources, vocals_index, axis=0).sum(axis=0))
+
+            window_params = {**params, "window": window_seconds, "window_overlap": overlap_seconds,
+                             "window_index": index}
+            window_path, _ = stage_cache.get_or_create("separation_window", [input_file_path], window_params,
+                                                       separate, skip_cache)
+            window_paths.append(window_path)
+
+    for stem in ["vocals", "no_vocals"]:
+        _write_overlap_added_windows(os.path.join(output_folder, f"{stem}.wav"), window_paths, bounds, overlap,
+                                     sample_rate, channels, stem)
+    return window_paths
+
+
+def separate_audio_in_windows(stage_cache: StageCache, input_file_path: str, output_folder: str, model: DemucsModel,
+                              params: dict, window_seconds: float, device="cpu", segment: Optional[float] = None,
+                              skip_cache: bool = False) -> list[str]:
+    """Separate vocals from audio with demucs in overlapping windows, the memory does not grow with the song length
+
+    Returns the cache entry folders of the windows.
+    """
+    import torch
+    from demucs.apply import apply_model
+
+    print(
+        f"{ULTRASINGER_HEAD} Separating vocals from audio with {blue_highlighted('demucs')} with model {blue_highlighted(model.value)} and {red_highlighted(device)} as worker in windows of {blue_highlighted(f'{window_seconds:g}s')}."
     )
 
-def separate_vocal_from_audio(cache_folder_path: str,
+    demucs_model = _get_demucs_model(model, device)
+    _check_segment(demucs_model, model, segment)
+
+    def separate_window(wav: np.ndarray) -> np.ndarray:
+        with torch.no_grad():
+            return apply_model(demucs_model, torch.from_numpy(wav)[None], device=device, shifts=1, split=True,
+                               overlap=0.25, progress=False, num_workers=0, segment=segment)[0].cpu().numpy()
+
+    # Decoded and resampled once by ffmpeg, so the windows can be read from the file
+    decoded_file_path = os.path.join(output_folder, "decoded.wav")
+    decode_audio_to_float_wav(input_file_path, decoded_file_path, demucs_model.samplerate)
+    try:
+        return separate_decoded_audio_in_windows(stage_cache, input_file_path, decoded_file_path, output_folder,
+                                                 separate_window, demucs_model.audio_channels,
+                                                 demucs_model.sources.index("vocals"), params,
+                                                 window_seconds, skip_cache=skip_cache)
+    finally:
+        os.remove(decoded_file_path)
+
+
+def check_stems_match_audio(audio_file_path: str, stem_file_paths: list[str]) -> None:
+    """Check that given stems can be read and have the duration of the audio, raises a ValueError if not
+
+    Other sample rates only give a warning, as the stems are resampled for processing anyway.
+    """
+    duration, sample_rate = get_audio_duration_and_sample_rate(audio_file_path)
+    for stem_file_path in stem_file_paths:
+        try:
+            stem_duration, stem_sample_rate = get_audio_duration_and_sample_rate(stem_file_path)
+        except Exception as error:
+            # ffprobe failures of missing or broken files are raised as plain Exception
+            raise ValueError(f"The stem {stem_file_path} can not be read: {error}") from error
+        if abs(stem_duration - duration) > STEM_DURATION_TOLERANCE_SECONDS:
+            raise ValueError(
+                f"The stem {stem_file_path} is {stem_duration:.2f}s long, but the audio {audio_file_path} is {duration:.2f}s"
+            )
+        if stem_sample_rate != sample_rate:
+            print(
+                f"{ULTRASINGER_HEAD} {gold_highlighted('Warning:')} The stem {stem_file_path} has a sample rate of {stem_sample_rate} Hz, the audio of {sample_rate} Hz"
+            )
+
+
+def separate_vocal_from_audio(stage_cache: StageCache,
                               audio_output_file_path: str,
                               use_separated_vocal: bool,
                               create_karaoke: bool,
-                              pytorch_device: str,
+                              get_pytorch_device: Callable[[], str],
                               model: DemucsModel,
-                              skip_cache: bool = False) -> str:
-    """Separate vocal from audio"""
-    demucs_output_folder = os.path.splitext(os.path.basename(audio_output_file_path))[0]
-    audio_separation_path = os.path.join(cache_folder_path, "separated", model.value, demucs_output_folder)
-
-    vocals_path = os.path.join(audio_separation_path, "vocals.wav")
-    instrumental_path = os.path.join(audio_separation_path, "no_vocals.wav")
-    if use_separated_vocal or create_karaoke:
-        cache_available = check_file_exists(vocals_path) and check_file_exists(instrumental_path)
-        if skip_cache or not cache_available:
-            separate_audio(audio_output_file_path, cache_folder_path, model, pytorch_device)
+                              skip_cache: bool = False,
+                              segment: Optional[float] = None,
+                              window_seconds: Optional[float] = None) -> tuple[str, Optional[SeparatedAudio]]:
+    """Separate vocal from audio, returns the folder with vocals.wav and no_vocals.wav and the separated audio
+
+    The separated audio is only returned if the song was just separated as a whole. Its mono vocals are put into the
+    audio store, so the stages do not decode the written vocals.wav again.
+    The device is only requested if the separation is not cached, as checking it imports torch.
+    With window_seconds the audio is separated in overlapping windows, which are cached until the whole song is done.
+    """
+    params = {"model": model.value, "two_stems": "vocals", "float32": True}
+    if segment is not None:
+        params["segment"] = segment
+    window_params = dict(params)
+    if window_seconds is not None:
+        params["window"] = window_seconds
+        params["window_overlap"] = SEPARATION_WINDOW_OVERLAP_SECONDS
+    if not (use_separated_vocal or create_karaoke):
+        return stage_cache.get_entry_path("separation",
+                                          stage_cache.get_key("separation", [audio_output_file_path], params)), None
+
+    window_paths = []
+    separated = {}
+
+    def separate(entry_path: str) -> None:
+        if window_seconds is None:
+            separated["audio"] = separate_audio(audio_output_file_path, entry_path, model, get_pytorch_device(),
+                                                segment)
         else:
-            print(f"{ULTRASINGER_HEAD} {green_highlighted('cache')} reusing cached separated vocals")
+            window_paths.extend(separate_audio_in_windows(stage_cache, audio_output_file_path, entry_path, model,
+                                                          window_params, window_seconds, get_pytorch_device(),
+                                                          segment, skip_cache))
 
-    return audio_separation_path
+    audio_separation_path, _ = stage_cache.get_or_create("separation", [audio_output_file_path], params, separate,
+                                                         skip_cache)
+    # The windows are only kept to resume an interrupted separation
+    for window_path in window_paths:
+        shutil.rmtree(window_path, ignore_errors=True)
+    separated_audio = separated.get("audio")
+    if separated_audio is not None:
+        store_audio(os.path.join(audio_separation_path, "vocals.wav"), librosa.to_mono(separated_audio.vocals),
+                    separated_audio.sample_rate)
+    return audio_separation_path, separated_audio
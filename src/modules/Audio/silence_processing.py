@@ -1,12 +1,17 @@
 """Silence processing module"""
-import librosa
-import soundfile as sf
+from bisect import bisect_left, bisect_right
 
-from pydub import AudioSegment, silence
+import numpy as np
+import soundfile as sf
 
+from modules.Audio.audio_store import load_audio
 from modules.console_colors import ULTRASINGER_HEAD
 from modules.Speech_Recognition.TranscribedData import TranscribedData
 
+# Milliseconds of audio per block of the silence detection
+SILENCE_BLOCK_MS = 60 * 1000
+
+
 def remove_silence_from_transcription_data(audio_path: str, transcribed_data: list[TranscribedData]) -> list[
     TranscribedData]:
     """Remove silence from given transcription data"""
@@ -23,22 +28,98 @@ def remove_silence_from_transcription_data(audio_path: str, transcribed_data: li
 def get_silence_sections(audio_path: str,
                          min_silence_len=50,
                          silence_thresh=-50) -> list[tuple[float, float]]:
-    y = AudioSegment.from_wav(audio_path)
-    s = silence.detect_silence(y, min_silence_len=min_silence_len, silence_thresh=silence_thresh)
+    samples, sample_rate = load_audio(audio_path)
+    return get_silence_sections_from_samples(samples, sample_rate, min_silence_len, silence_thresh)
+
+
+def get_silence_sections_from_samples(samples,
+                                      sample_rate: int,
+                                      min_silence_len=50,
+                                      silence_thresh=-50) -> list[tuple[float, float]]:
+    """Silence sections in seconds of mono float samples"""
+    # 16 bit like the written wav files
+    int_samples = np.clip(np.round(samples * 32768), -32768, 32767).astype(np.int16)
+    s = detect_silence(int_samples, sample_rate, min_silence_len, silence_thresh)
     s = [((start / 1000), (stop / 1000)) for start, stop in s]  # convert to sec
     return s
 
 
+def detect_silence(int_samples: np.ndarray,
+                   sample_rate: int,
+                   min_silence_len=50,
+                   silence_thresh=-50) -> list[tuple[int, int]]:
+    """Silent sections in milliseconds of mono 16 bit samples, same result as pydub.silence.detect_silence
+
+    Like pydub, every window of min_silence_len ms is checked in 1 ms steps, but with cumulative sums instead of
+    slicing the audio for every window.
+    """
+    seg_len = round(1000 * (len(int_samples) / sample_rate))
+    if seg_len < min_silence_len:
+        return []
+
+    max_possible_amplitude = 2 ** 15
+    threshold = 10 ** (silence_thresh / 20) * max_possible_amplitude
+
+    # First sample of every millisecond, as pydub converts a position in ms to samples
+    ms_starts = (np.arange(seg_len + 1) * (sample_rate / 1000.0)).astype(np.int64)
+    ms_sample_starts = np.minimum(ms_starts, len(int_samples))
+
+    # Sum of squares per millisecond, in blocks to bound the memory of long audio
+    ms_sums = np.empty(seg_len, dtype=np.int64)
+    for block_start in range(0, seg_len, SILENCE_BLOCK_MS):
+        block_end = min(block_start + SILENCE_BLOCK_MS, seg_len)
+        first_sample = ms_sample_starts[block_start]
+        squares = int_samples[first_sample:ms_sample_starts[block_end]].astype(np.int64) ** 2
+        square_sums = np.concatenate(([0], np.cumsum(squares)))
+        ms_sums[block_start:block_end] = np.diff(square_sums[ms_sample_starts[block_start:block_end + 1] - first_sample])
+
+    # rms of every window like audioop.rms, pydub pads missing samples at the end with zeros
+    window_starts = np.arange(seg_len - min_silence_len + 1)
+    cumulative_sums = np.concatenate(([0], np.cumsum(ms_sums)))
+    window_sums = cumulative_sums[window_starts + min_silence_len] - cumulative_sums[window_starts]
+    window_lengths = ms_starts[window_starts + min_silence_len] - ms_starts[window_starts]
+    with np.errstate(invalid="ignore", divide="ignore"):
+        rms = np.floor(np.sqrt(window_sums / window_lengths))
+    rms[window_lengths == 0] = 0
+
+    silence_starts = window_starts[rms <= threshold]
+    if len(silence_starts) == 0:
+        return []
+
+    # Combine the silent windows into ranges, windows which overlap or touch belong to the same range
+    gaps = np.flatnonzero(np.diff(silence_starts) > min_silence_len)
+    range_starts = silence_starts[np.concatenate(([0], gaps + 1))]
+    range_ends = silence_starts[np.concatenate((gaps, [len(silence_starts) - 1]))] + min_silence_len
+    return [(int(start), int(end)) for start, end in zip(range_starts, range_ends)]
+
+
 def remove_silence(silence_parts_list: list[tuple[float, float]], transcribed_data: list[TranscribedData]):
     new_transcribed_data = []
 
+    # Detected silences are sorted and apart, so only the silences between the start and end of a word are visited.
+    # Other lists are searched completely.
+    is_sorted = all(silence_start <= silence_end for silence_start, silence_end in silence_parts_list) and all(
+        silence_parts_list[i][1] < silence_parts_list[i + 1][0] for i in range(len(silence_parts_list) - 1)
+    )
+    silence_starts = [silence_start for silence_start, _ in silence_parts_list]
+    silence_ends = [silence_end for _, silence_end in silence_parts_list]
+
     for data in transcribed_data:
         new_transcribed_data.append(data)
 
         origin_end = data.end
         was_split = False
 
-        for silence_start, silence_end in silence_parts_list:
+        if is_sorted:
+            # Silences before the first one ending at or after the start and after the end are skipped anyway
+            first_index = bisect_left(silence_ends, data.start)
+            last_index = bisect_right(silence_starts, origin_end)
+        else:
+            first_index = 0
+            last_index = len(silence_parts_list)
+
+        for silence_index in range(first_index, last_index):
+            silence_start, silence_end = silence_parts_list[silence_index]
 
             # |    ****    | silence
             # |  **    **  | data
@@ -50,7 +131,10 @@ def remove_silence(silence_parts_list: list[tuple[float, float]], transcribed_da
             # |  **********  | data
             # |0 1 2 3 4 5 6 | time
             if silence_start >= data.start and silence_end <= origin_end:
-                next_index = silence_parts_list.index((silence_start, silence_end)) + 1
+                if is_sorted:
+                    next_index = silence_index + 1
+                else:
+                    next_index = silence_parts_list.index((silence_start, silence_end)) + 1
                 if next_index < len(silence_parts_list) and silence_parts_list[next_index][0] < origin_end:
                     split_end = silence_parts_list[next_index][0]
 
@@ -98,7 +182,11 @@ def remove_silence(silence_parts_list: list[tuple[float, float]], transcribed_da
             # |     **   | data
             # |0 1 2 3 4 | time
             if silence_start < data.start and silence_end > origin_end:
-                new_transcribed_data.remove(data)
+                if is_sorted:
+                    # Nothing was split from the word before, so it is the last one
+                    new_transcribed_data.pop()
+                else:
+                    new_transcribed_data.remove(data)
                 break
 
             # |    ****    | silence
@@ -126,8 +214,14 @@ def mute_no_singing_parts(mono_output_path, mute_output_path):
     print(
         f"{ULTRASINGER_HEAD} Mute audio parts with no singing"
     )
-    silence_sections = get_silence_sections(mono_output_path)
-    y, sr = librosa.load(mono_output_path, sr=None)
+    y, sr = load_audio(mono_output_path)
+    y = mute_silence_sections(y.copy(), sr)
+    sf.write(mute_output_path, y, sr)
+
+
+def mute_silence_sections(y, sr: int):
+    """Mute the parts of mono float samples with no singing in place"""
+    silence_sections = get_silence_sections_from_samples(y, sr)
     # Mute the parts of the audio with no singing
     for i in silence_sections:
         # Define the time range to mute
@@ -140,4 +234,4 @@ def mute_no_singing_parts(mono_output_path, mute_output_path):
         end_sample = int(end_time * sr)
 
         y[start_sample:end_sample] = 0
-    sf.write(mute_output_path, y, sr)
+    return y
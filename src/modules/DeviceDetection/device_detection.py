@@ -1,7 +1,5 @@
 """Device detection module."""
 
-import torch
-
 from modules.console_colors import ULTRASINGER_HEAD, red_highlighted, blue_highlighted
 
 pytorch_gpu_supported = False
@@ -17,6 +15,9 @@ def check_gpu_support() -> str:
 
 
 def __check_pytorch_support():
+    # Imported on first use, as importing torch takes seconds
+    import torch
+
     pytorch_gpu_supported = torch.cuda.is_available()
     if not pytorch_gpu_supported:
         print(
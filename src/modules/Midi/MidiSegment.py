@@ -1,9 +1,23 @@
 from dataclasses import dataclass
+from functools import lru_cache
+
+import librosa
+
+
+@lru_cache(maxsize=None)
+def midi_note_to_name(midi_note: int) -> str:
+  """Note name like C♯4 of a midi note number"""
+  return librosa.midi_to_note(midi_note)
 
 
 @dataclass
 class MidiSegment:
-  note: str
+  midi_note: int
   start: float
   end: float
   word: str
+
+  @property
+  def note(self) -> str:
+    """Note name, only for display and sheet export"""
+    return midi_note_to_name(self.midi_note)
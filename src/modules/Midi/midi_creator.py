@@ -4,7 +4,6 @@ import math
 import os
 from collections import Counter
 
-import librosa
 import numpy as np
 import pretty_midi
 import unidecode
@@ -17,7 +16,7 @@ from modules.console_colors import (
 from modules.Ultrastar.ultrastar_txt import UltrastarTxtValue
 from modules.Pitcher.pitched_data import PitchedData
 from modules.Pitcher.pitched_data_helper import get_frequencies_with_high_confidence
-from modules.Audio.key_detector import quantize_note_to_key
+from modules.Audio.key_detector import KeyMap, quantize_midi_notes_to_key
 
 def create_midi_instrument(midi_segments: list[MidiSegment]) -> object:
     """Converts an Ultrastar data to a midi instrument"""
@@ -28,7 +27,7 @@ def create_midi_instrument(midi_segments: list[MidiSegment]) -> object:
     velocity = 100
 
     for i, midi_segment in enumerate(midi_segments):
-        note = pretty_midi.Note(velocity, librosa.note_to_midi(midi_segment.note), midi_segment.start, midi_segment.end)
+        note = pretty_midi.Note(velocity, midi_segment.midi_note, midi_segment.start, midi_segment.end)
         instrument.notes.append(note)
 
     return instrument
@@ -58,15 +57,12 @@ class MidiCreator:
     """Docstring"""
 
 
-def convert_frequencies_to_notes(frequency: [str]) -> list[list[str]]:
-    """Converts frequencies to notes"""
-    notes = []
-    for freq in frequency:
-        notes.append(librosa.hz_to_note(float(freq)))
-    return notes
+def convert_frequencies_to_midi_notes(frequencies: list[float]) -> list[int]:
+    """Converts frequencies to midi note numbers, frequencies without a note raise like librosa.hz_to_note"""
+    return [int(midi_note) for midi_note in convert_frequencies_to_midi(np.asarray(frequencies, dtype=np.float64))]
 
 
-def most_frequent(array: [str]) -> list[tuple[str, int]]:
+def most_frequent(array: list) -> list[tuple[object, int]]:
     """Get most frequent item in array"""
     return Counter(array).most_common(1)
 
@@ -83,33 +79,111 @@ def find_nearest_index(array: list[float], value: float) -> int:
     return idx
 
 
+def find_nearest_indexes(array: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Nearest index in array for all values, same result as find_nearest_index"""
+    idx = np.searchsorted(array, values, side="left")
+    previous = np.maximum(idx - 1, 0)
+    current = np.minimum(idx, len(array) - 1)
+    use_previous = (idx > 0) & (
+        (idx == len(array)) | (np.abs(values - array[previous]) < np.abs(values - array[current]))
+    )
+    return np.where(use_previous, idx - 1, idx)
+
+
+def convert_frequencies_to_midi(frequencies: np.ndarray) -> np.ndarray:
+    """Rounded midi numbers of frequencies, calculated like librosa.hz_to_note"""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.round(12 * (np.log2(frequencies) - np.log2(440.0)) + 69)
+
+
+def get_midi_numbers_of_segments(start_times: list[float], end_times: list[float],
+                                 pitched_data: PitchedData) -> tuple[np.ndarray, np.ndarray]:
+    """Most frequent midi number of every segment like create_midi_note_from_pitched_data
+
+    Segments without frames or with frequencies without a note are marked for the single segment path, which raises
+    the same errors.
+    """
+    times = np.asarray(pitched_data.times, dtype=np.float64)
+    if len(start_times) == 0 or len(times) == 0:
+        return np.full(len(start_times), np.nan), np.ones(len(start_times), dtype=bool)
+    high_confidence = np.asarray(pitched_data.confidence, dtype=np.float64) > 0.4
+    midi_numbers = convert_frequencies_to_midi(np.asarray(pitched_data.frequencies, dtype=np.float64))
+
+    # Frames of every segment, a segment with the same nearest start and end frame uses that frame
+    starts = find_nearest_indexes(times, np.asarray(start_times, dtype=np.float64))
+    ends = find_nearest_indexes(times, np.asarray(end_times, dtype=np.float64))
+    ends = np.where(starts == ends, starts + 1, ends)
+    lengths = np.maximum(ends - starts, 0)
+    segment_ids = np.repeat(np.arange(len(starts)), lengths)
+    frames = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(starts, lengths)
+
+    # Frames with high confidence, or all frames of a segment without any
+    has_high_confidence = np.bincount(segment_ids, weights=high_confidence[frames], minlength=len(starts)) > 0
+    selected = high_confidence[frames] | ~has_high_confidence[segment_ids]
+    segment_ids = segment_ids[selected]
+    selected_midi = midi_numbers[frames[selected]]
+
+    # Most frequent midi number of every segment, ties go to the number which comes first like Counter.most_common
+    valid = np.isfinite(selected_midi)
+    lowest = int(selected_midi[valid].min()) if valid.any() else 0
+    midi_range = int(selected_midi[valid].max()) - lowest + 1 if valid.any() else 1
+    keys = segment_ids * midi_range + (np.where(valid, selected_midi, lowest) - lowest).astype(np.int64)
+    unique_keys, first_positions, counts = np.unique(keys, return_index=True, return_counts=True)
+    unique_segments = unique_keys // midi_range
+    order = np.lexsort((first_positions, -counts, unique_segments))
+    is_first = np.concatenate(([True], unique_segments[order][1:] != unique_segments[order][:-1]))
+    segment_midi = np.full(len(starts), np.nan)
+    segment_midi[unique_segments[order][is_first]] = (unique_keys[order][is_first] % midi_range) + lowest
+
+    # Segments without frames or with invalid frequencies
+    fallback = (lengths == 0) | np.isnan(segment_midi)
+    fallback[np.unique(segment_ids[~valid])] = True
+    return segment_midi, fallback
+
+
 def create_midi_notes_from_pitched_data(start_times: list[float], end_times: list[float], words: list[str],
-                                         pitched_data: PitchedData, allowed_notes: set[str] = None) -> list[MidiSegment]:
+                                         pitched_data: PitchedData, allowed_notes: set[str] = None,
+                                         key_map: KeyMap = None) -> list[MidiSegment]:
     """Create midi notes from pitched data
 
+    Gives the same notes as create_midi_note_from_pitched_data for every segment, but the frames of all segments
+    are selected and counted at once.
+
     Args:
         start_times: List of start times
         end_times: List of end times
         words: List of words/syllables
         pitched_data: Pitched data containing frequencies and confidence
         allowed_notes: Optional set of allowed note names for key quantization
+        key_map: Optional key map, every segment is quantized to the key at its start instead of allowed_notes
 
     Returns:
         List of MidiSegments
     """
     print(f"{ULTRASINGER_HEAD} Creating midi_segments")
 
-    midi_segments = []
+    if len(start_times) == 0:
+        return []
+
+    segment_midi, fallback = get_midi_numbers_of_segments(start_times, end_times, pitched_data)
+    midi_notes = np.where(fallback, 0, segment_midi).astype(np.int64)
+    if key_map is not None:
+        midi_notes = key_map.quantize(midi_notes, start_times)
+    elif allowed_notes is not None:
+        midi_notes = quantize_midi_notes_to_key(midi_notes, allowed_notes)
 
+    midi_segments = []
     for index, start_time in enumerate(start_times):
         end_time = end_times[index]
         word = str(words[index])
 
-        midi_segment = create_midi_note_from_pitched_data(start_time, end_time, pitched_data, word, allowed_notes)
-        midi_segments.append(midi_segment)
+        if fallback[index]:
+            segment_allowed_notes = allowed_notes if key_map is None else key_map.allowed_notes_at(start_time)
+            midi_segments.append(
+                create_midi_note_from_pitched_data(start_time, end_time, pitched_data, word, segment_allowed_notes))
+            continue
 
-        # todo: Progress?
-        # print(filename + " f: " + str(mean))
+        midi_segments.append(MidiSegment(int(midi_notes[index]), start_time, end_time, word))
     return midi_segments
 
 
@@ -140,24 +214,26 @@ def create_midi_note_from_pitched_data(start_time: float, end_time: float, pitch
 
     conf_f = get_frequencies_with_high_confidence(freqs, confs)
 
-    notes = convert_frequencies_to_notes(conf_f)
+    midi_notes = convert_frequencies_to_midi_notes(conf_f)
 
-    note = most_frequent(notes)[0][0]
+    midi_note = most_frequent(midi_notes)[0][0]
 
     if allowed_notes is not None:
-        note = quantize_note_to_key(note, allowed_notes)
+        midi_note = int(quantize_midi_notes_to_key([midi_note], allowed_notes)[0])
 
-    return MidiSegment(note, start_time, end_time, word)
+    return MidiSegment(midi_note, start_time, end_time, word)
 
 
 def create_midi_segments_from_transcribed_data(transcribed_data: list[TranscribedData], pitched_data: PitchedData,
-                                                allowed_notes: set[str] = None) -> list[MidiSegment]:
+                                                allowed_notes: set[str] = None,
+                                                key_map: KeyMap = None) -> list[MidiSegment]:
     """Create MIDI segments from transcribed data
 
     Args:
         transcribed_data: List of transcribed data segments
         pitched_data: Pitched data containing frequencies and confidence
         allowed_notes: Optional set of allowed note names for key quantization
+        key_map: Optional key map for key quantization per section
 
     Returns:
         List of MidiSegments
@@ -172,7 +248,7 @@ def create_midi_segments_from_transcribed_data(transcribed_data: list[Transcribe
             end_times.append(midi_segment.end)
             words.append(midi_segment.word)
         midi_segments = create_midi_notes_from_pitched_data(start_times, end_times, words,
-                                                            pitched_data, allowed_notes)
+                                                            pitched_data, allowed_notes, key_map)
         return midi_segments
 
 
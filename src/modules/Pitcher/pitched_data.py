@@ -1,14 +1,60 @@
 """Pitched data"""
-from dataclasses import dataclass
+import os
+from dataclasses import dataclass, field
+from typing import Optional
 
-from dataclasses_json import dataclass_json
+import numpy as np
+from dataclasses_json import config, dataclass_json
+
+PITCHED_DATA_JSON_FILE = "pitched_data.json"
+PITCHED_DATA_FIELDS = ["times", "frequencies", "confidence"]
+
+
+def _array_field():
+    """Arrays are written as lists to keep the JSON format of older versions"""
+    return field(metadata=config(encoder=lambda array: np.asarray(array).tolist(), decoder=list))
 
 
 @dataclass_json
 @dataclass
 class PitchedData:
-    """Pitched data from crepe"""
+    """Pitched data from crepe
+
+    The SwiftF0 times are float64, frequencies and confidence float32. Arrays of these types are used without a copy.
+    """
+
+    times: np.ndarray = _array_field()
+    frequencies: np.ndarray = _array_field()
+    confidence: np.ndarray = _array_field()
+
+    def __post_init__(self):
+        self.times = np.asarray(self.times, dtype=np.float64)
+        self.frequencies = np.asarray(self.frequencies, dtype=np.float32)
+        self.confidence = np.asarray(self.confidence, dtype=np.float32)
+
+    def __eq__(self, other):
+        if not isinstance(other, PitchedData):
+            return NotImplemented
+        return all(np.array_equal(getattr(self, name), getattr(other, name)) for name in PITCHED_DATA_FIELDS)
+
+
+def save_pitched_data(pitched_data: PitchedData, folder_path: str) -> None:
+    """Save pitched data as one .npy file per field"""
+    for name in PITCHED_DATA_FIELDS:
+        np.save(os.path.join(folder_path, f"{name}.npy"), getattr(pitched_data, name))
+
+
+def load_pitched_data(folder_path: str, mmap_mode: Optional[str] = None) -> PitchedData:
+    """Load pitched data saved by save_pitched_data
+
+    The arrays are read into memory by default. Memory mapped arrays keep the files open, which stops the cache
+    entry from being removed on Windows, so only use mmap_mode if the entry outlives the arrays.
 
-    times: list[float]
-    frequencies: list[float]
-    confidence: list[float]
+    Folders of older versions with a pitched_data.json are still read.
+    """
+    json_path = os.path.join(folder_path, PITCHED_DATA_JSON_FILE)
+    if not os.path.exists(os.path.join(folder_path, "times.npy")) and os.path.exists(json_path):
+        with open(json_path, encoding="utf-8") as file:
+            return PitchedData.from_json(file.read())
+    return PitchedData(*[np.load(os.path.join(folder_path, f"{name}.npy"), mmap_mode=mmap_mode)
+                         for name in PITCHED_DATA_FIELDS])
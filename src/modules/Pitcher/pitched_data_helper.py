@@ -5,7 +5,8 @@ def get_frequencies_with_high_confidence(
     """Get frequency with high confidence"""
     conf_f = []
     for i, conf in enumerate(confidences):
-        if conf > threshold:
+        # float32 confidences are compared as float, as NumPy compares a float32 with a float in float32
+        if float(conf) > threshold:
             conf_f.append(frequencies[i])
     if not conf_f:
         conf_f = frequencies
@@ -1,14 +1,25 @@
 """Pitcher module"""
+import math
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import librosa
 import numpy as np
+import soundfile as sf
 
-from scipy.io import wavfile
 from swift_f0 import SwiftF0
 
+from modules.Audio.audio_store import SWIFT_F0_SAMPLE_RATE, load_audio
 from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted
 from modules.Pitcher.pitched_data import PitchedData
 
 _swift_f0_detector = None
 
+# Streaming reads blocks of the file, the margins give the frames at the block edges their full context
+PITCH_BLOCK_SECONDS = 30.0
+PITCH_BLOCK_MARGIN_SECONDS = 1.0
+
 def _get_detector():
     """Lazy initialize SwiftF0 detector"""
     global _swift_f0_detector
@@ -27,31 +38,128 @@ def get_pitch_with_file(
     print(
         f"{ULTRASINGER_HEAD} Pitching with {blue_highlighted('SwiftF0')}"
     )
-    sample_rate, audio = wavfile.read(filename)
-
-    # Convert stereo to mono if needed
-    if len(audio.shape) > 1:
-        audio = np.mean(audio, axis=1)
-
-    # Normalize audio to float32 based on dtype
-    if audio.dtype == np.uint8:
-        # uint8: range [0, 255] -> subtract 128 and divide by 128
-        audio = (audio.astype(np.float32) - 128.0) / 128.0
-    elif audio.dtype in [np.int16, np.int32, np.int64]:
-        # Signed integers: use iinfo to get max value and normalize
-        dtype_info = np.iinfo(audio.dtype)
-        max_val = max(abs(dtype_info.min), abs(dtype_info.max))
-        audio = audio.astype(np.float32) / float(max_val)
-    elif audio.dtype == np.float64:
-        # float64: cast to float32
-        audio = audio.astype(np.float32)
-    elif audio.dtype != np.float32:
-        # Fallback for other types: assume int16 range
-        audio = audio.astype(np.float32) / 32768.0
+    # Resampled once and shared, SwiftF0 skips its own resampling at 16 kHz
+    audio, sample_rate = load_audio(filename, SWIFT_F0_SAMPLE_RATE)
 
     return get_pitch_with_swift_f0(audio, sample_rate)
 
 
+def get_pitch_with_file_streaming(
+    filename: str, block_seconds: float = PITCH_BLOCK_SECONDS
+) -> PitchedData:
+    """Pitch detection using SwiftF0, reading the file in blocks
+
+    The memory does not grow with the length of the file. The frames have the same timestamps as
+    get_pitch_with_file, only the resampling at the block edges can change them slightly.
+    """
+
+    print(
+        f"{ULTRASINGER_HEAD} Pitching with {blue_highlighted('SwiftF0')} in blocks of {blue_highlighted(f'{block_seconds:g}s')}"
+    )
+    detector = _get_detector()
+    hop_length = SwiftF0.HOP_LENGTH
+
+    with sf.SoundFile(filename) as audio_file:
+        native_sample_rate = audio_file.samplerate
+        native_length = audio_file.frames
+        length = math.ceil(native_length * SWIFT_F0_SAMPLE_RATE / native_sample_rate)
+
+        # Block bounds are frame starts at 16 kHz, which are also whole samples at the native rate
+        step = math.lcm(hop_length, SWIFT_F0_SAMPLE_RATE // math.gcd(SWIFT_F0_SAMPLE_RATE, native_sample_rate))
+        block_length = max(round(block_seconds * SWIFT_F0_SAMPLE_RATE / step), 1) * step
+        margin = math.ceil(PITCH_BLOCK_MARGIN_SECONDS * SWIFT_F0_SAMPLE_RATE / step) * step
+
+        frame_count = max(length // hop_length, 1)
+        frequencies = np.zeros(frame_count, dtype=np.float32)
+        confidence = np.zeros(frame_count, dtype=np.float32)
+        for block_start in range(0, length, block_length):
+            block_end = min(block_start + block_length, length)
+            read_start = max(block_start - margin, 0)
+            read_end = min(block_end + margin, length)
+
+            native_start = read_start * native_sample_rate // SWIFT_F0_SAMPLE_RATE
+            native_end = min(math.ceil(read_end * native_sample_rate / SWIFT_F0_SAMPLE_RATE), native_length)
+            audio_file.seek(native_start)
+            block = librosa.to_mono(audio_file.read(native_end - native_start, dtype="float32", always_2d=True).T)
+            if native_sample_rate != SWIFT_F0_SAMPLE_RATE:
+                block = librosa.resample(block, orig_sr=native_sample_rate, target_sr=SWIFT_F0_SAMPLE_RATE)
+
+            result = detector.detect_from_array(block, SWIFT_F0_SAMPLE_RATE)
+            first_frame = block_start // hop_length
+            last_frame = frame_count if block_end == length else block_end // hop_length
+            offset = first_frame - read_start // hop_length
+            frequencies[first_frame:last_frame] = result.pitch_hz[offset:offset + last_frame - first_frame]
+            confidence[first_frame:last_frame] = result.confidence[offset:offset + last_frame - first_frame]
+
+    times = (np.arange(frame_count) * hop_length + SwiftF0.CENTER_OFFSET) / SWIFT_F0_SAMPLE_RATE
+    return PitchedData(times, frequencies, confidence)
+
+
+def get_pitch_with_file_parallel(
+    filename: str, workers: int
+) -> PitchedData:
+    """Pitch detection using SwiftF0 on chunks of the audio in worker processes
+
+    The 16 kHz audio is shared with the workers, every worker detects the frames of one chunk with a margin of context.
+    The result is the same as get_pitch_with_file.
+    """
+
+    print(
+        f"{ULTRASINGER_HEAD} Pitching with {blue_highlighted('SwiftF0')} in {blue_highlighted(str(workers))} processes"
+    )
+    audio, sample_rate = load_audio(filename, SWIFT_F0_SAMPLE_RATE)
+    frame_count = len(audio) // SwiftF0.HOP_LENGTH
+    chunk_frames = math.ceil(frame_count / max(workers, 1))
+    margin_frames = math.ceil(PITCH_BLOCK_MARGIN_SECONDS * SWIFT_F0_SAMPLE_RATE / SwiftF0.HOP_LENGTH)
+    if workers <= 1 or chunk_frames <= margin_frames:
+        return get_pitch_with_swift_f0(audio, sample_rate)
+
+    frequencies = np.zeros(frame_count, dtype=np.float32)
+    confidence = np.zeros(frame_count, dtype=np.float32)
+    shared_audio = shared_memory.SharedMemory(create=True, size=audio.nbytes)
+    try:
+        np.ndarray(audio.shape, dtype=np.float32, buffer=shared_audio.buf)[:] = audio
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            futures = [
+                executor.submit(_pitch_chunk, shared_audio.name, len(audio), first_frame,
+                                min(first_frame + chunk_frames, frame_count))
+                for first_frame in range(0, frame_count, chunk_frames)
+            ]
+            # Only the frames of its own chunk are taken from every worker, the margins overlap
+            for future in futures:
+                first_frame, chunk_frequencies, chunk_confidence = future.result()
+                frequencies[first_frame:first_frame + len(chunk_frequencies)] = chunk_frequencies
+                confidence[first_frame:first_frame + len(chunk_confidence)] = chunk_confidence
+    finally:
+        shared_audio.close()
+        shared_audio.unlink()
+
+    times = (np.arange(frame_count) * SwiftF0.HOP_LENGTH + SwiftF0.CENTER_OFFSET) / SWIFT_F0_SAMPLE_RATE
+    return PitchedData(times, frequencies, confidence)
+
+
+def _pitch_chunk(
+    shared_memory_name: str, length: int, first_frame: int, last_frame: int
+) -> tuple[int, np.ndarray, np.ndarray]:
+    """Frequencies and confidence of the frames first_frame to last_frame of the shared 16 kHz audio"""
+    shared_audio = shared_memory.SharedMemory(name=shared_memory_name)
+    try:
+        audio = np.ndarray((length,), dtype=np.float32, buffer=shared_audio.buf)
+        hop_length = SwiftF0.HOP_LENGTH
+        margin = math.ceil(PITCH_BLOCK_MARGIN_SECONDS * SWIFT_F0_SAMPLE_RATE / hop_length) * hop_length
+        read_start = max(first_frame * hop_length - margin, 0)
+        read_end = min(last_frame * hop_length + margin, length)
+        # The detector copies the samples
+        result = _get_detector().detect_from_array(audio[read_start:read_end], SWIFT_F0_SAMPLE_RATE)
+        del audio
+    finally:
+        shared_audio.close()
+
+    offset = first_frame - read_start // hop_length
+    return (first_frame, result.pitch_hz[offset:offset + last_frame - first_frame],
+            result.confidence[offset:offset + last_frame - first_frame])
+
+
 def get_pitch_with_swift_f0(
     audio: np.ndarray, sample_rate: int
 ) -> PitchedData:
@@ -65,26 +173,21 @@ def get_pitch_with_swift_f0(
     # Detect pitch
     result = detector.detect_from_array(audio, sample_rate)
 
-    # Convert to PitchedData format
-    times = [float(t) for t in result.timestamps]
-    frequencies = [float(f) for f in result.pitch_hz]
-    confidence = [float(c) for c in result.confidence]
-
-    return PitchedData(times, frequencies, confidence)
+    # The arrays of the detector are used without a copy
+    return PitchedData(result.timestamps, result.pitch_hz, result.confidence)
 
 
 def get_pitched_data_with_high_confidence(
     pitched_data: PitchedData, threshold=0.4
 ) -> PitchedData:
     """Get frequency with high confidence"""
-    new_pitched_data = PitchedData([], [], [])
-    for i, conf in enumerate(pitched_data.confidence):
-        if conf > threshold:
-            new_pitched_data.times.append(pitched_data.times[i])
-            new_pitched_data.frequencies.append(pitched_data.frequencies[i])
-            new_pitched_data.confidence.append(pitched_data.confidence[i])
-
-    return new_pitched_data
+    # In float64, as NumPy compares a float32 with a float in float32
+    high_confidence = pitched_data.confidence.astype(np.float64) > threshold
+    return PitchedData(
+        pitched_data.times[high_confidence],
+        pitched_data.frequencies[high_confidence],
+        pitched_data.confidence[high_confidence],
+    )
 
 
 class Pitcher:
@@ -1,4 +1,5 @@
 from dataclasses import dataclass
+from typing import Optional
 
 from dataclasses_json import dataclass_json
 
@@ -12,3 +13,4 @@ class TranscriptionResult:
 
     transcribed_data: list[TranscribedData]
     detected_language: str
+    device: Optional[str] = None  # Device the transcription ran on, e.g. cpu or cuda
@@ -22,12 +22,15 @@ def _patched_torch_load(*args, **kwargs):
 torch.load = _patched_torch_load
 
 import whisperx
-from enum import Enum
 from torch.cuda import OutOfMemoryError
 
+from modules.Audio.audio_store import WHISPER_SAMPLE_RATE, load_audio
 from modules.Speech_Recognition.TranscriptionResult import TranscriptionResult
 from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted, red_highlighted
 from modules.Speech_Recognition.TranscribedData import TranscribedData, from_whisper
+from modules.Speech_Recognition.WhisperModel import WhisperModel
+from modules.model_registry import ModelKey, get_model
+from modules.tracing import span
 
 #Addition for numbers to words
 import re
@@ -40,15 +43,24 @@ re_split_preserve_space = re.compile(r'(\d+|\W+|\w+)')
 
 MEMORY_ERROR_MESSAGE = f"{ULTRASINGER_HEAD} {blue_highlighted('whisper')} ran out of GPU memory; reduce --whisper_batch_size or force usage of cpu with --force_cpu"
 
-class WhisperModel(Enum):
-    """Whisper model"""
-    TINY = "tiny"
-    BASE = "base"
-    SMALL = "small"
-    MEDIUM = "medium"
-    LARGE_V1 = "large-v1"
-    LARGE_V2 = "large-v2"
-    LARGE_V3 = "large-v3"
+
+def _get_whisper_model(model: WhisperModel, device: str, compute_type: str, language: str):
+    """Lazy load whisper model, it stays loaded for the next songs of the process"""
+    def load():
+        torch.load = _patched_torch_load
+        return whisperx.load_model(model.value, language=language, device=device, compute_type=compute_type)
+
+    return get_model(ModelKey("whisper", model.value, device, compute_type, language), load)
+
+
+def _get_align_model(language: str, device: str, alignment_model: str):
+    """Lazy load alignment model and metadata, they stay loaded for the next songs of the process"""
+    def load():
+        torch.load = _patched_torch_load
+        return whisperx.load_align_model(language_code=language, device=device, model_name=alignment_model)
+
+    return get_model(ModelKey("whisper_align", str(alignment_model), device, language=language), load)
+
 
 #Addition for numbers to words (Using previous code from louispan in PR#135)
 def number_to_words(line,language='en'):
@@ -113,17 +125,17 @@ def transcribe_with_whisper(
 
     try:
         torch.cuda.empty_cache()
-        loaded_whisper_model = whisperx.load_model(
-            model.value, language=language, device=device, compute_type=compute_type
-        )
+        with span("whisper_model"):
+            loaded_whisper_model = _get_whisper_model(model, device, compute_type, language)
 
-        audio = whisperx.load_audio(audio_path)
+        audio, _ = load_audio(audio_path, WHISPER_SAMPLE_RATE)
 
         print(f"{ULTRASINGER_HEAD} Transcribing {audio_path}")
 
-        result = loaded_whisper_model.transcribe(
-            audio, batch_size=batch_size, language=language
-        )
+        with span("whisper_transcription"):
+            result = loaded_whisper_model.transcribe(
+                audio, batch_size=batch_size, language=language
+            )
 
         detected_language = result["language"]
         if language is None:
@@ -131,9 +143,7 @@ def transcribe_with_whisper(
 
         # load alignment model and metadata
         try:
-            model_a, metadata = whisperx.load_align_model(
-                language_code=language, device=device, model_name=alignment_model
-            )
+            model_a, metadata = _get_align_model(language, device, alignment_model)
         except ValueError as ve:
             print(
                 f"{red_highlighted(f'{ve}')}"
@@ -149,14 +159,15 @@ def transcribe_with_whisper(
                 obj["text"] = number_to_words(obj["text"],language)
 
         # align whisper output
-        result_aligned = whisperx.align(
-            result["segments"],
-            model_a,
-            metadata,
-            audio,
-            device,
-            return_char_alignments=False,
-        )
+        with span("whisper_alignment"):
+            result_aligned = whisperx.align(
+                result["segments"],
+                model_a,
+                metadata,
+                audio,
+                device,
+                return_char_alignments=False,
+            )
 
         transcribed_data = convert_to_transcribed_data(result_aligned)
 
@@ -0,0 +1,13 @@
+"""Whisper model names"""
+from enum import Enum
+
+
+class WhisperModel(Enum):
+    """Whisper model"""
+    TINY = "tiny"
+    BASE = "base"
+    SMALL = "small"
+    MEDIUM = "medium"
+    LARGE_V1 = "large-v1"
+    LARGE_V2 = "large-v2"
+    LARGE_V3 = "large-v3"
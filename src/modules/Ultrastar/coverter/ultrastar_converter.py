@@ -1,5 +1,7 @@
 """Ultrastar Converter"""
 
+import numpy as np
+
 from modules.Ultrastar.ultrastar_txt import UltrastarTxtValue
 
 
@@ -89,6 +91,18 @@ def get_end_time(gap: str, ultrastar_bpm: str, startBeat: float, duration: float
     return end_time
 
 
+def get_note_line_times(ultrastar_class: UltrastarTxtValue) -> tuple[np.ndarray, np.ndarray]:
+    """Start and end times of all note lines, same as get_start_time_from_ultrastar and get_end_time_from_ultrastar"""
+
+    gap = __convert_gap(ultrastar_class.gap)
+    real_bpm = __convert_bpm(ultrastar_class.bpm)
+    start_beats = np.array([int(note_line.startBeat) for note_line in ultrastar_class.UltrastarNoteLines],
+                           dtype=np.int64)
+    end_beats = start_beats + np.array([int(note_line.duration) for note_line in ultrastar_class.UltrastarNoteLines],
+                                       dtype=np.int64)
+    return beat_to_second(start_beats, real_bpm) + gap, beat_to_second(end_beats, real_bpm) + gap
+
+
 def __convert_gap(gap: str) -> float:
     gap = float(gap.replace(",", ".")) / 1000
     return gap
@@ -1,4 +1,3 @@
-import librosa
 import pretty_midi
 
 from modules.Midi.MidiSegment import MidiSegment
@@ -11,8 +10,7 @@ from modules.console_colors import ULTRASINGER_HEAD
 def convert_midi_note_to_ultrastar_note(midi_segment: MidiSegment) -> int:
     """Convert midi notes to ultrastar notes"""
 
-    note_number_librosa = librosa.note_to_midi(midi_segment.note)
-    ultrastar_note = midi_note_to_ultrastar_note(note_number_librosa)
+    ultrastar_note = midi_note_to_ultrastar_note(midi_segment.midi_note)
     return ultrastar_note
 
 
@@ -54,7 +52,7 @@ def ultrastar_to_midi_segments(ultrastar_txt: UltrastarTxtValue) -> list[MidiSeg
         start_time = get_start_time_from_ultrastar(ultrastar_txt, i)
         end_time = get_end_time_from_ultrastar(ultrastar_txt, i)
         midi_segments.append(
-            MidiSegment(librosa.midi_to_note(ultrastar_note_to_midi_note(data.pitch)),
+            MidiSegment(ultrastar_note_to_midi_note(data.pitch),
                         start_time,
                         end_time,
                         data.word,
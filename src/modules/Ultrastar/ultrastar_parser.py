@@ -1,5 +1,6 @@
 """Ultrastar txt parser"""
 import os
+from typing import Optional
 
 from modules import os_helper
 
@@ -53,6 +54,10 @@ def parse(input_file: str) -> UltrastarTxtValue:
                 ultrastar_class.cover = line.split(":")[1].replace("\n", "")
             elif line.startswith(f"#{UltrastarTxtTag.BACKGROUND.value}"):
                 ultrastar_class.background = line.split(":")[1].replace("\n", "")
+            elif line.startswith(f"#{UltrastarTxtTag.VOCALS.value}"):
+                ultrastar_class.vocals = line.split(":")[1].replace("\n", "")
+            elif line.startswith(f"#{UltrastarTxtTag.INSTRUMENTAL.value}"):
+                ultrastar_class.instrumental = line.split(":")[1].replace("\n", "")
         elif line.startswith(
             (
                 f"{UltrastarTxtNoteTypeTag.FREESTYLE.value} ",
@@ -84,6 +89,16 @@ def parse(input_file: str) -> UltrastarTxtValue:
     return ultrastar_class
 
 
+def get_stem_file_paths(input_file_path: str, ultrastar_class: UltrastarTxtValue) -> tuple[Optional[str], Optional[str]]:
+    """Paths of the vocals and instrumental referenced by the txt, None if not referenced or not next to the txt"""
+    dirname = os.path.dirname(input_file_path)
+    stem_file_paths = []
+    for stem in [ultrastar_class.vocals, ultrastar_class.instrumental]:
+        stem_file_path = os.path.join(dirname, stem.strip()) if stem and stem.strip() else None
+        stem_file_paths.append(stem_file_path if stem_file_path is not None and os.path.isfile(stem_file_path) else None)
+    return stem_file_paths[0], stem_file_paths[1]
+
+
 def parse_ultrastar_txt(input_file_path: str, output_folder_path: str) -> tuple[str, str, str, UltrastarTxtValue, str]:
     """Parse Ultrastar txt"""
     ultrastar_class = parse(input_file_path)
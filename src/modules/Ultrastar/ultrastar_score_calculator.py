@@ -3,7 +3,7 @@ from dataclasses import dataclass
 
 from dataclasses_json import dataclass_json
 
-import librosa
+import numpy as np
 
 from modules.ProcessData import ProcessData
 from modules.Ultrastar import ultrastar_parser
@@ -16,10 +16,9 @@ from modules.console_colors import (
     light_blue_highlighted,
     underlined,
 )
-from modules.Midi.midi_creator import create_midi_note_from_pitched_data
+from modules.Midi.midi_creator import create_midi_note_from_pitched_data, get_midi_numbers_of_segments
 from modules.Ultrastar.coverter.ultrastar_converter import (
-    get_end_time_from_ultrastar,
-    get_start_time_from_ultrastar,
+    get_note_line_times,
     ultrastar_note_to_midi_note,
 )
 from modules.Ultrastar.ultrastar_txt import UltrastarTxtValue, UltrastarTxtNoteTypeTag
@@ -95,8 +94,72 @@ def print_score(score: Score) -> None:
     )
 
 
-def calculate_score(pitched_data: PitchedData, ultrastar_class: UltrastarTxtValue) -> (Score, Score):
-    """Calculate score."""
+STEP_SIZE = 0.09  # Todo: Whats is the step size of the game? Its not 1/bps -> one beat in seconds s = 60/bpm
+POINTS_PER_PART = {
+    UltrastarTxtNoteTypeTag.NORMAL.value: ("notes", 1),
+    UltrastarTxtNoteTypeTag.GOLDEN.value: ("golden_notes", 2),
+    UltrastarTxtNoteTypeTag.RAP.value: ("rap", 1),
+    UltrastarTxtNoteTypeTag.RAP_GOLDEN.value: ("golden_rap", 2),
+}
+
+
+@dataclass
+class ScoreParts:
+    """Parts of STEP_SIZE seconds of all scored note lines"""
+
+    line_indexes: list[int]
+    # Can be 0 or negative for lines which end before they start
+    parts_per_line: np.ndarray
+    part_lines: np.ndarray
+    starts: np.ndarray
+    ends: np.ndarray
+
+
+def create_score_parts(ultrastar_class: UltrastarTxtValue) -> ScoreParts:
+    """Split all note lines with a word, which are not freestyle, into parts"""
+
+    line_indexes = [
+        i for i, note_line in enumerate(ultrastar_class.UltrastarNoteLines)
+        if note_line.word != "" and note_line.noteType != UltrastarTxtNoteTypeTag.FREESTYLE
+    ]
+    start_times, end_times = get_note_line_times(ultrastar_class)
+    start_times = start_times[line_indexes]
+    end_times = end_times[line_indexes]
+
+    parts_per_line = ((end_times - start_times) / STEP_SIZE).astype(np.int64)
+    parts_per_line[parts_per_line == 0] = 1
+    part_counts = np.maximum(parts_per_line, 0)
+
+    part_lines = np.repeat(np.arange(len(line_indexes)), part_counts)
+    part_numbers = np.arange(part_counts.sum()) - np.repeat(np.cumsum(part_counts) - part_counts, part_counts)
+    line_end_times = end_times[part_lines]
+    starts = start_times[part_lines] + STEP_SIZE * part_numbers
+    ends = starts + STEP_SIZE
+    # The last part ends with the line
+    ends = np.where((line_end_times < ends) | (part_numbers == parts_per_line[part_lines] - 1), line_end_times, ends)
+    return ScoreParts(line_indexes, parts_per_line, part_lines, starts, ends)
+
+
+def get_part_midi_notes(score_parts: ScoreParts, pitched_data: PitchedData,
+                        ultrastar_class: UltrastarTxtValue) -> np.ndarray:
+    """Midi note of every part like create_midi_note_from_pitched_data"""
+
+    segment_midi, fallback = get_midi_numbers_of_segments(score_parts.starts, score_parts.ends, pitched_data)
+    part_midi_notes = np.zeros(len(segment_midi), dtype=np.int64)
+    part_midi_notes[~fallback] = segment_midi[~fallback]
+    for part in np.flatnonzero(fallback):
+        note_line = ultrastar_class.UltrastarNoteLines[score_parts.line_indexes[score_parts.part_lines[part]]]
+        part_midi_notes[part] = create_midi_note_from_pitched_data(
+            float(score_parts.starts[part]), float(score_parts.ends[part]), pitched_data, note_line.word).midi_note
+    return part_midi_notes
+
+
+def calculate_score(pitched_data: PitchedData, ultrastar_class: UltrastarTxtValue,
+                    part_midi_notes: np.ndarray = None) -> (Score, Score):
+    """Calculate score.
+
+    part_midi_notes are the notes of the parts of an UltraStar txt with the same timing, to not detect them again.
+    """
 
     print(ULTRASINGER_HEAD + " Calculating Ultrastar Points")
 
@@ -107,54 +170,33 @@ def calculate_score(pitched_data: PitchedData, ultrastar_class: UltrastarTxtValu
         print(f"{ULTRASINGER_HEAD} No note lines found in Ultrastar txt, returning 0 points")
         return get_score(simple_points), get_score(accurate_points)
     reachable_line_bonus_per_word = MAX_SONG_LINE_BONUS / len(ultrastar_class.UltrastarNoteLines)
-    step_size = 0.09  # Todo: Whats is the step size of the game? Its not 1/bps -> one beat in seconds s = 60/bpm
-
-    for i, note_line in enumerate(ultrastar_class.UltrastarNoteLines):
-        if note_line.word == "":
-            continue
-
-        if note_line.noteType == UltrastarTxtNoteTypeTag.FREESTYLE:
-            continue
-
-        start_time = get_start_time_from_ultrastar(ultrastar_class, i)
-        end_time = get_end_time_from_ultrastar(ultrastar_class, i)
-        duration = end_time - start_time
-        parts = int(duration / step_size)
-        parts = 1 if parts == 0 else parts
-
-        accurate_part_line_bonus_points = 0
-        simple_part_line_bonus_points = 0
-
-        ultrastar_midi_note = ultrastar_note_to_midi_note(int(note_line.pitch))
-        ultrastar_note = librosa.midi_to_note(ultrastar_midi_note)
 
-        for part in range(parts):
-            start = start_time + step_size * part
-            end = start + step_size
-
-            if end_time < end or part == parts - 1:
-                end = end_time
-
-            midi_segment = create_midi_note_from_pitched_data(start, end, pitched_data, note_line.word)
-
-            if midi_segment.note[:-1] == ultrastar_note[:-1]:
-                # Ignore octave high
-                simple_points = add_point(note_line.noteType, simple_points)
-                simple_part_line_bonus_points += 1
-
-            if midi_segment.note == ultrastar_note:
-                # Octave high must be the same
-                accurate_points = add_point(note_line.noteType, accurate_points)
-                accurate_part_line_bonus_points += 1
-
-            accurate_points.parts += 1
-            simple_points.parts += 1
-
-        if accurate_part_line_bonus_points >= parts:
-            accurate_points.line_bonus += reachable_line_bonus_per_word
-
-        if simple_part_line_bonus_points >= parts:
-            simple_points.line_bonus += reachable_line_bonus_per_word
+    score_parts = create_score_parts(ultrastar_class)
+    if part_midi_notes is None:
+        part_midi_notes = get_part_midi_notes(score_parts, pitched_data, ultrastar_class)
+
+    scored_lines = [ultrastar_class.UltrastarNoteLines[i] for i in score_parts.line_indexes]
+    line_midi_notes = np.array([ultrastar_note_to_midi_note(int(note_line.pitch)) for note_line in scored_lines],
+                               dtype=np.int64)
+
+    part_lines = score_parts.part_lines
+    # Ignore octave high
+    simple_hits = part_midi_notes % 12 == line_midi_notes[part_lines] % 12
+    # Octave high must be the same
+    accurate_hits = part_midi_notes == line_midi_notes[part_lines]
+
+    line_count = len(scored_lines)
+    for points, hits in [(simple_points, simple_hits), (accurate_points, accurate_hits)]:
+        hits_per_line = np.bincount(part_lines[hits], minlength=line_count)
+        for note_type, (attribute, points_per_part) in POINTS_PER_PART.items():
+            is_type = np.array([note_line.noteType == note_type for note_line in scored_lines], dtype=bool)
+            setattr(points, attribute,
+                    getattr(points, attribute) + points_per_part * int(hits_per_line[is_type].sum()))
+        points.parts += len(part_lines)
+
+        # Added one by one in the order of the lines, so the float sum is the same
+        for _ in range(int(np.count_nonzero(hits_per_line >= score_parts.parts_per_line))):
+            points.line_bonus += reachable_line_bonus_per_word
 
     return get_score(simple_points), get_score(accurate_points)
 
@@ -174,11 +216,12 @@ def print_score_calculation(simple_points: Score, accurate_points: Score) -> Non
 
 
 def calculate_score_points_from_txt(pitched_data: PitchedData,
-                                    ultrastar_txt: UltrastarTxtValue) -> tuple[Score, Score]:
+                                    ultrastar_txt: UltrastarTxtValue,
+                                    part_midi_notes: np.ndarray = None) -> tuple[Score, Score]:
     (
         simple_score,
         accurate_score,
-    ) = calculate_score(pitched_data, ultrastar_txt)
+    ) = calculate_score(pitched_data, ultrastar_txt, part_midi_notes)
     print_score_calculation(simple_score, accurate_score)
     return simple_score, accurate_score
 
@@ -194,8 +237,18 @@ def calculate_score_points(
         (simple_score, accurate_score) = calculate_score_points_from_txt(processed_data.pitched_data, ultrastar_txt)
     else:
         print(f"{ULTRASINGER_HEAD} {blue_highlighted('Score of original Ultrastar txt')}")
-        (_, _) = calculate_score_points_from_txt(processed_data.pitched_data, processed_data.parsed_file)
+        original_parts = create_score_parts(processed_data.parsed_file)
+        original_part_midi_notes = get_part_midi_notes(original_parts, processed_data.pitched_data,
+                                                       processed_data.parsed_file)
+        (_, _) = calculate_score_points_from_txt(processed_data.pitched_data, processed_data.parsed_file,
+                                                 original_part_midi_notes)
         print(f"{ULTRASINGER_HEAD} {blue_highlighted('Score of re-pitched Ultrastar txt')}")
         ultrastar_txt = ultrastar_parser.parse(ultrastar_file_output_path)
-        (simple_score, accurate_score) = calculate_score_points_from_txt(processed_data.pitched_data, ultrastar_txt)
+        # The re-pitched txt mostly keeps the timing, then the notes of the parts are the same
+        repitched_parts = create_score_parts(ultrastar_txt)
+        same_parts = (np.array_equal(original_parts.starts, repitched_parts.starts)
+                      and np.array_equal(original_parts.ends, repitched_parts.ends))
+        (simple_score, accurate_score) = calculate_score_points_from_txt(
+            processed_data.pitched_data, ultrastar_txt, original_part_midi_notes if same_parts else None
+        )
     return simple_score, accurate_score
@@ -0,0 +1,96 @@
+"""Batch processing of multiple songs in one process"""
+
+import glob
+import os
+from dataclasses import dataclass
+from typing import Optional
+
+from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted, green_highlighted, red_highlighted
+
+AUDIO_VIDEO_EXTENSIONS = (
+    ".mp3", ".wav", ".flac", ".ogg", ".m4a", ".aac", ".opus", ".wma",
+    ".mp4", ".mkv", ".webm", ".avi", ".mov",
+)
+ULTRASTAR_TXT_EXTENSION = ".txt"
+GLOB_CHARACTERS = "*?["
+
+
+@dataclass
+class BatchResult:
+    """Result of one song in a batch"""
+    input_file_path: str
+    ultrastar_file_output: Optional[str] = None
+    error: Optional[str] = None
+
+
+def is_supported_input_file(file_path: str) -> bool:
+    """Checks if the file is an audio/video file UltraSinger can process"""
+    return os.path.splitext(file_path)[1].lower() in AUDIO_VIDEO_EXTENSIONS
+
+
+def is_batch_input(input_path: str) -> bool:
+    """Checks if the input is a YouTube link, an audio/video file or an UltraStar txt file"""
+    return (input_path.startswith("https:") or is_supported_input_file(input_path)
+            or input_path.lower().endswith(ULTRASTAR_TXT_EXTENSION))
+
+
+def __read_list_file(list_file_path: str) -> list[str]:
+    """Read input files from a list file, one path or YouTube link per line"""
+    base_folder = os.path.dirname(os.path.abspath(list_file_path))
+    input_files = []
+    with open(list_file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            entry = line.strip()
+            if not entry or entry.startswith("#"):
+                continue
+            if not entry.startswith("https:") and not os.path.isabs(entry):
+                entry = os.path.join(base_folder, entry)
+            input_files.append(entry)
+    return input_files
+
+
+def collect_batch_input_files(batch_input: str) -> list[str]:
+    """Collect input files from a folder, a glob pattern or a list file
+
+    A folder yields the files directly inside it, a glob pattern all matching files. Any other file is read as a
+    list file with one path or YouTube link per line; empty lines and lines starting with '#' are ignored.
+    All three keep only YouTube links, audio/video files and UltraStar txt files.
+    """
+    if os.path.isdir(batch_input):
+        input_files = [
+            os.path.join(batch_input, name)
+            for name in sorted(os.listdir(batch_input))
+            if os.path.isfile(os.path.join(batch_input, name))
+        ]
+    elif any(char in batch_input for char in GLOB_CHARACTERS):
+        input_files = [path for path in sorted(glob.glob(batch_input, recursive=True)) if os.path.isfile(path)]
+    elif os.path.isfile(batch_input):
+        input_files = __read_list_file(batch_input)
+    else:
+        raise FileNotFoundError(f"Batch input {batch_input} is neither a folder, a glob pattern nor a list file")
+
+    input_files = [input_file for input_file in input_files if is_batch_input(input_file)]
+    # Keep the order but drop duplicates
+    return list(dict.fromkeys(input_files))
+
+
+def get_batch_output_base_folder(batch_input: str) -> str:
+    """Default output folder for a batch if none is given"""
+    if os.path.isdir(batch_input):
+        return os.path.join(batch_input, "output")
+    if any(char in batch_input for char in GLOB_CHARACTERS):
+        return os.path.join(os.getcwd(), "output")
+    return os.path.join(os.path.dirname(os.path.abspath(batch_input)), "output")
+
+
+def print_batch_summary(results: list[BatchResult]) -> None:
+    """Print summary of a finished batch"""
+    succeeded = [result for result in results if result.error is None]
+    failed = [result for result in results if result.error is not None]
+
+    print(
+        f"{ULTRASINGER_HEAD} Batch finished: {green_highlighted(str(len(succeeded)))} succeeded, "
+        f"{red_highlighted(str(len(failed)))} failed"
+    )
+    for result in failed:
+        print(f"{ULTRASINGER_HEAD} {red_highlighted('Failed:')} {blue_highlighted(result.input_file_path)} -> {result.error}")
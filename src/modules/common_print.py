@@ -27,10 +27,24 @@ def print_help() -> None:
     ## INPUT is ultrastar.txt ##
     default  Creates all
 
+    [batch]
+    --batch                 Folder, glob pattern (e.g. "songs/*.mp3") or list file with one input per line.
+                            Audio, video and UltraStar txt files and YouTube links are used, other files are skipped.
+                            All songs are processed in one run and the models are only loaded once.
+    --batch_workers         Number of worker processes. Every worker loads its own models >> ((default) is 1)
+
+    [daemon]
+    --daemon                Keep UltraSinger running with loaded models and accept jobs on http://127.0.0.1:[port]/jobs
+    --daemon_port           Port of the local job API >> ((default) is 8723)
+    --daemon_queue_size     Max number of waiting jobs >> ((default) is 16)
 
     [separation]
     # Default is htdemucs
     --demucs              Model name htdemucs|htdemucs_ft|htdemucs_6s|hdemucs_mmi|mdx|mdx_extra|mdx_q|mdx_extra_q >> ((default) is htdemucs)
+    --demucs_segment      Seconds per separated segment, smaller segments need less memory >> ((default) is the model default)
+    --separation_window   Separate long songs in overlapping windows of these seconds, an interrupted separation resumes with the next window >> ((default) is the whole song)
+    --vocals              Separated vocals of the input, skips the separation. Must be given together with --instrumental
+    --instrumental        Separated instrumental of the input, skips the separation. Must be given together with --vocals
 
     [transcription]
     # Default is whisper
@@ -53,12 +67,20 @@ def print_help() -> None:
     --disable_karaoke       Disable creation of karaoke style txt file. Karaoke is enabled by default.
     --create_audio_chunks   Enable creation of audio chunks. Audio chunks are disabled by default.
     --keep_cache            Keep cache folder after creation. Cache folder is removed by default.
+    --cache_path            Shared cache folder for separation, denoise, transcription and pitch results. Results are reused for the same audio content.
+    --cache_max_size        Disk budget of the cache in GB. Least recently used entries are evicted after every song, audio before transcription and pitch data.
+    --model_cache_max_size  Memory budget of the loaded models in GB, RAM and GPU together. Least recently used models are unloaded, for batches with many languages >> ((default) keeps all)
     --plot                  Enable creation of plots. Plots are disabled by default.
     --quantize_to_key       Quantize notes to the detected musical key. This removes slides and out-of-key notes.
     --format_version        0.3.0|1.0.0|1.1.0|1.2.0 >> ((default) is 1.2.0)
     --musescore_path        path to MuseScore executable
     --keep_numbers          Transcribe numbers as digits and not words
     --ffmpeg                Path to ffmpeg and ffprobe executable
+    --pipeline_workers      Number of threads for independent steps like key, BPM, transcription and pitch, which then compete for CPU and GPU >> ((default) is 1, all steps one after another)
+    --in_memory_preprocessing  Denoise, convert to mono and mute in memory and only write the processing audio
+    --streaming_pitch       Read the audio in blocks for the pitch detection, the memory does not grow with the length of the song
+    --pitch_workers         Number of processes for the pitch detection, the audio is split into one chunk per process >> ((default) is 1)
+    --trace                 Write time, CPU, memory, IO, cache and loaded model hits of every step to [song].trace.json and [song].chrome_trace.json
 
     [yt-dlp]
     --cookiefile            File name where cookies should be read from and dumped to.
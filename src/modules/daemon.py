@@ -0,0 +1,248 @@
+"""Resident daemon mode with a local job API
+
+The daemon keeps one process alive, so the loaded models stay warm between songs.
+Jobs are accepted over HTTP on localhost and processed one after another by a single worker thread.
+
+POST /jobs        {"input": "path/to/song.mp3", "settings": {"whisper_model": "large-v3"}}
+GET  /jobs        List all jobs
+GET  /jobs/<id>   Status and output paths of a job
+GET  /health      Daemon status
+"""
+
+import json
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from dataclasses import dataclass, field, asdict
+from enum import Enum
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted, gold_highlighted, red_highlighted
+
+DAEMON_HOST = "127.0.0.1"
+# Finished and failed jobs are kept for status requests, the oldest are removed first
+DAEMON_MAX_FINISHED_JOBS = 100
+
+
+class JobStatus(str, Enum):
+    """Status of a daemon job"""
+    QUEUED = "queued"
+    RUNNING = "running"
+    FINISHED = "finished"
+    FAILED = "failed"
+
+
+@dataclass
+class Job:
+    """Job of the daemon"""
+    id: str
+    input_file_path: str
+    settings_overrides: dict = field(default_factory=dict)
+    status: JobStatus = JobStatus.QUEUED
+    output_folder_path: Optional[str] = None
+    ultrastar_file_output: Optional[str] = None
+    error: Optional[str] = None
+    created_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    def to_dict(self) -> dict:
+        job_dict = asdict(self)
+        job_dict["status"] = self.status.value
+        return job_dict
+
+
+@dataclass
+class JobResult:
+    """Output paths of a finished job"""
+    output_folder_path: str
+    ultrastar_file_output: str
+
+
+def __convert_setting(key: str, value, setting_type: type):
+    """Value of a JSON override as the type of the setting, raises a ValueError if it has another type"""
+    try:
+        if issubclass(setting_type, Enum):
+            return setting_type(value)
+        if setting_type is bool:
+            if isinstance(value, str) and value.lower() in ("true", "false"):
+                return value.lower() == "true"
+        elif setting_type is int:
+            if isinstance(value, str) or (isinstance(value, float) and value.is_integer()):
+                return int(value)
+        elif setting_type is float:
+            if isinstance(value, (str, int)) and not isinstance(value, bool):
+                return float(value)
+        if type(value) is setting_type:
+            return value
+    except (ValueError, TypeError):
+        pass
+    raise ValueError(f"Invalid value for setting {key}: {value!r}, expected {setting_type.__name__}")
+
+
+def apply_settings_overrides(settings, overrides: dict):
+    """Apply per job overrides to a settings object
+
+    Only the settings of JOB_SETTINGS can be overridden, the others belong to the daemon process. Values are
+    converted to the type of the current setting, settings which are None by default get their type from
+    OPTIONAL_SETTING_TYPES and can be set to None.
+    """
+    optional_setting_types = getattr(settings, "OPTIONAL_SETTING_TYPES", {})
+    for key, value in overrides.items():
+        if key.isupper() or key.startswith("_") or not hasattr(type(settings), key):
+            raise ValueError(f"Unknown setting: {key}")
+        if key not in settings.JOB_SETTINGS:
+            raise ValueError(f"Setting {key} can not be overridden per job")
+        current = getattr(settings, key)
+        if key in optional_setting_types:
+            if value is not None:
+                value = __convert_setting(key, value, optional_setting_types[key])
+        elif current is not None:
+            value = __convert_setting(key, value, type(current))
+        setattr(settings, key, value)
+    return settings
+
+
+class JobQueue:
+    """Bounded job queue with a single worker thread, only the last max_finished_jobs finished jobs are kept"""
+
+    def __init__(self, run_job: Callable[[Job], JobResult], max_size: int,
+                 max_finished_jobs: int = DAEMON_MAX_FINISHED_JOBS):
+        self.run_job = run_job
+        self.max_finished_jobs = max_finished_jobs
+        self.jobs: dict[str, Job] = {}
+        self.__finished_job_ids = deque()
+        self.__queue = queue.Queue(maxsize=max_size)
+        self.__lock = threading.Lock()
+        self.__worker = threading.Thread(target=self.__work, name="UltraSingerJobWorker", daemon=True)
+
+    def start(self) -> None:
+        self.__worker.start()
+
+    def submit(self, input_file_path: str, settings_overrides: dict) -> Job:
+        """Add a job to the queue. Raises queue.Full if the queue is full"""
+        job = Job(id=uuid.uuid4().hex, input_file_path=input_file_path, settings_overrides=settings_overrides)
+        with self.__lock:
+            self.__queue.put_nowait(job)
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        with self.__lock:
+            return self.jobs.get(job_id)
+
+    def list(self) -> list[Job]:
+        with self.__lock:
+            return list(self.jobs.values())
+
+    def queued_count(self) -> int:
+        return self.__queue.qsize()
+
+    def join(self) -> None:
+        """Wait until all queued jobs are processed"""
+        self.__queue.join()
+
+    def __work(self) -> None:
+        while True:
+            job = self.__queue.get()
+            job.status = JobStatus.RUNNING
+            job.started_at = time.time()
+            print(f"{ULTRASINGER_HEAD} {gold_highlighted('Daemon')} Running job {blue_highlighted(job.id)} -> {job.input_file_path}")
+            try:
+                result = self.run_job(job)
+                job.output_folder_path = result.output_folder_path
+                job.ultrastar_file_output = result.ultrastar_file_output
+                job.status = JobStatus.FINISHED
+            except (Exception, SystemExit) as exception:
+                # A failed job must not stop the daemon
+                print(f"{ULTRASINGER_HEAD} {red_highlighted('Error:')} Job {job.id} failed -> {exception}")
+                job.error = repr(exception)
+                job.status = JobStatus.FAILED
+            finally:
+                job.finished_at = time.time()
+                with self.__lock:
+                    self.__finished_job_ids.append(job.id)
+                    while len(self.__finished_job_ids) > self.max_finished_jobs:
+                        del self.jobs[self.__finished_job_ids.popleft()]
+                self.__queue.task_done()
+
+
+def __create_request_handler(job_queue: JobQueue, validate_overrides: Callable[[dict], None]):
+    class JobRequestHandler(BaseHTTPRequestHandler):
+        """HTTP handler of the job API"""
+
+        def do_GET(self):
+            path = self.path.rstrip("/")
+            if path == "/health":
+                self.__send(200, {"status": "ok", "queued": job_queue.queued_count()})
+            elif path == "/jobs":
+                self.__send(200, [job.to_dict() for job in job_queue.list()])
+            elif path.startswith("/jobs/"):
+                job = job_queue.get(path[len("/jobs/"):])
+                if job is None:
+                    self.__send(404, {"error": "Unknown job"})
+                else:
+                    self.__send(200, job.to_dict())
+            else:
+                self.__send(404, {"error": "Unknown path"})
+
+        def do_POST(self):
+            if self.path.rstrip("/") != "/jobs":
+                self.__send(404, {"error": "Unknown path"})
+                return
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+                input_file_path = body["input"]
+                settings_overrides = body.get("settings", {})
+                validate_overrides(settings_overrides)
+            except (ValueError, KeyError, TypeError) as error:
+                self.__send(400, {"error": f"Invalid job: {error}"})
+                return
+            try:
+                job = job_queue.submit(input_file_path, settings_overrides)
+            except queue.Full:
+                self.__send(503, {"error": "Job queue is full"})
+                return
+            self.__send(202, job.to_dict())
+
+        def log_message(self, format, *args):
+            # Keep the console for the pipeline output
+            pass
+
+        def __send(self, status: int, content) -> None:
+            data = json.dumps(content).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return JobRequestHandler
+
+
+def create_daemon_server(job_queue: JobQueue, port: int,
+                         validate_overrides: Callable[[dict], None]) -> ThreadingHTTPServer:
+    """Create the localhost HTTP server of the job API"""
+    handler = __create_request_handler(job_queue, validate_overrides)
+    return ThreadingHTTPServer((DAEMON_HOST, port), handler)
+
+
+def serve_daemon(run_job: Callable[[Job], JobResult], port: int, max_queue_size: int,
+                 validate_overrides: Callable[[dict], None]) -> None:
+    """Run the daemon until it gets interrupted"""
+    job_queue = JobQueue(run_job, max_queue_size)
+    job_queue.start()
+    server = create_daemon_server(job_queue, port, validate_overrides)
+    print(
+        f"{ULTRASINGER_HEAD} {gold_highlighted('Daemon Mode')} - accepting jobs on {blue_highlighted(f'http://{DAEMON_HOST}:{port}/jobs')}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(f"{ULTRASINGER_HEAD} Stopping daemon")
+    finally:
+        server.server_close()
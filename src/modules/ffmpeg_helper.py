@@ -1,5 +1,6 @@
 """FFmpeg helper module."""
 
+import json
 import os
 import shutil
 import subprocess
@@ -51,6 +52,30 @@ def extract_audio(input_video_path: str, output_audio_path: str) -> None:
         raise Exception(f"FFmpeg audio extraction failed: {result.stderr}")
 
 
+def decode_audio_to_float_wav(input_audio_path: str, output_audio_path: str, sample_rate: int) -> None:
+    """Decode audio to a float32 wav with the given sample rate, ffmpeg streams without holding the audio in memory"""
+    ffmpeg_path, _ = get_ffmpeg_and_ffprobe_paths()
+
+    cmd = [
+        ffmpeg_path,
+        "-i",
+        input_audio_path,
+        "-vn",  # No video
+        "-ar",
+        str(sample_rate),
+        "-acodec",
+        "pcm_f32le",
+        "-loglevel",
+        "error",
+        "-y",  # Overwrite output file if exists
+        output_audio_path,
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFmpeg audio decoding failed: {result.stderr}")
+
+
 def remove_audio_from_video(input_video_path: str, output_video_path: str) -> None:
     """Remove audio from video file without re-encoding video"""
     ffmpeg_path, _ = get_ffmpeg_and_ffprobe_paths()
@@ -91,6 +116,28 @@ def is_video_file(file_path: str) -> bool:
         return False
 
 
+def get_audio_duration_and_sample_rate(file_path: str) -> tuple[float, int]:
+    """Duration in seconds and sample rate of the first audio stream using ffprobe"""
+    _, ffprobe_path = get_ffmpeg_and_ffprobe_paths()
+
+    cmd = [
+        ffprobe_path,
+        "-v", "error",
+        "-select_streams", "a:0",
+        "-show_entries", "stream=sample_rate:format=duration",
+        "-of", "json",
+        file_path
+    ]
+
+    result = subprocess.run(cmd, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise Exception(f"FFprobe failed: {result.stderr}")
+    probe = json.loads(result.stdout)
+    if not probe.get("streams"):
+        raise Exception(f"No audio stream found in {file_path}")
+    return float(probe["format"]["duration"]), int(probe["streams"][0]["sample_rate"])
+
+
 def get_audio_codec_and_extension(video_file_path: str) -> str:
     """
     Detect audio codec from video file and return codec name and appropriate file extension.
@@ -2,7 +2,7 @@ from rich.console import Console
 from rich.table import Table
 from Settings import Settings  
 from modules.Audio.separation import DemucsModel
-from modules.Speech_Recognition.Whisper import WhisperModel
+from modules.Speech_Recognition.WhisperModel import WhisperModel
 from modules.DeviceDetection.device_detection import check_gpu_support
 
 import os  
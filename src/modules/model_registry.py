@@ -0,0 +1,164 @@
+"""Loaded models shared between the songs of a process
+
+Batch workers and the daemon process many songs in one process. A model is loaded once per backend, model name,
+device, compute type and language and kept for the next songs. With a memory budget the least recently used models
+are unloaded first, the model that was just requested is always kept. The budget counts host and GPU memory together.
+"""
+
+import gc
+import itertools
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Callable, Optional
+
+from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted
+from modules.tracing import annotate, get_resident_bytes
+
+
+@dataclass(frozen=True)
+class ModelKey:
+    """Everything a loaded model depends on"""
+    backend: str
+    model_name: str
+    device: str = "cpu"
+    compute_type: Optional[str] = None
+    language: Optional[str] = None
+
+
+@dataclass
+class LoadedModel:
+    model: Any
+    size_bytes: int
+
+
+@dataclass
+class ModelRegistryCounters:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+_loaded_models: "OrderedDict[ModelKey, LoadedModel]" = OrderedDict()
+_counters = ModelRegistryCounters()
+_max_bytes: Optional[int] = None
+# Held while loading, so the same model is never loaded twice by concurrent stages
+_registry_lock = threading.RLock()
+
+
+def get_cuda_allocated_bytes() -> int:
+    """GPU memory allocated by torch on the current device, 0 if torch is not imported or has no GPU"""
+    # torch is only imported if a model needs it
+    torch = sys.modules.get("torch")
+    if torch is None or not torch.cuda.is_available():
+        return 0
+    return torch.cuda.memory_allocated()
+
+
+def estimate_model_size(model: Any, memory_growth: Optional[int]) -> int:
+    """Bytes of the parameters and buffers of torch modules, else the memory growth while loading
+
+    Models like faster-whisper keep their weights outside of torch, so only the memory growth shows their size.
+    The growth is the resident memory plus the GPU memory allocated by torch. GPU memory of libraries with their own
+    allocator, like CTranslate2 of faster-whisper, is not seen, so their size on CUDA is underestimated.
+    """
+    size = 0
+    for part in model if isinstance(model, (tuple, list)) else [model]:
+        if hasattr(part, "parameters") and hasattr(part, "buffers"):
+            size += sum(tensor.numel() * tensor.element_size()
+                        for tensor in itertools.chain(part.parameters(), part.buffers()))
+    if size == 0 and memory_growth is not None:
+        size = max(memory_growth, 0)
+    return size
+
+
+def set_model_budget(max_bytes: Optional[int]) -> None:
+    """RAM budget of all loaded models in bytes, None keeps all models"""
+    global _max_bytes
+    with _registry_lock:
+        _max_bytes = max_bytes
+        __evict(None)
+
+
+def get_model(key: ModelKey, load: Callable[[], Any]) -> Any:
+    """Loaded model of the key, load is only called if the model is not loaded yet"""
+    with _registry_lock:
+        if key in _loaded_models:
+            _loaded_models.move_to_end(key)
+            _counters.hits += 1
+            annotate(**{f"model_{key.backend}": "hit"})
+            print(f"{ULTRASINGER_HEAD} Reusing loaded {blue_highlighted(key.backend)} model")
+            return _loaded_models[key].model
+
+        _counters.misses += 1
+        annotate(**{f"model_{key.backend}": "miss"})
+        start_resident_bytes = get_resident_bytes()
+        start_cuda_bytes = get_cuda_allocated_bytes()
+        model = load()
+        end_resident_bytes = get_resident_bytes()
+        memory_growth = (None if start_resident_bytes is None or end_resident_bytes is None
+                         else end_resident_bytes - start_resident_bytes
+                         + get_cuda_allocated_bytes() - start_cuda_bytes)
+        _loaded_models[key] = LoadedModel(model, estimate_model_size(model, memory_growth))
+        __evict(key)
+        return model
+
+
+def __evict(keep_key: Optional[ModelKey]) -> None:
+    """Unload the least recently used models until the loaded models are within the budget"""
+    if _max_bytes is None:
+        return
+    total_bytes = sum(loaded_model.size_bytes for loaded_model in _loaded_models.values())
+    evicted = False
+    for key in list(_loaded_models):
+        if total_bytes <= _max_bytes:
+            break
+        if key == keep_key:
+            continue
+        total_bytes -= _loaded_models.pop(key).size_bytes
+        _counters.evictions += 1
+        evicted = True
+        print(f"{ULTRASINGER_HEAD} Unloading {blue_highlighted(key.backend)} model {blue_highlighted(key.model_name)}")
+
+    if evicted:
+        __free_memory()
+
+
+def __free_memory() -> None:
+    """Free the memory of unloaded models, also the GPU memory cached by torch"""
+    gc.collect()
+    # torch is only imported if a model needs it
+    torch = sys.modules.get("torch")
+    if torch is not None and torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def unload_models() -> None:
+    """Unload all models, the counters are kept"""
+    with _registry_lock:
+        _loaded_models.clear()
+        __free_memory()
+
+
+def get_model_registry_report() -> dict:
+    """Counters and loaded models for the trace report, the counters are counted since the start of the process"""
+    with _registry_lock:
+        return {
+            "hits": _counters.hits,
+            "misses": _counters.misses,
+            "evictions": _counters.evictions,
+            "max_mb": None if _max_bytes is None else _max_bytes / 1024 ** 2,
+            "loaded_mb": sum(loaded_model.size_bytes for loaded_model in _loaded_models.values()) / 1024 ** 2,
+            "loaded_models": [
+                {
+                    "backend": key.backend,
+                    "model_name": key.model_name,
+                    "device": key.device,
+                    "compute_type": key.compute_type,
+                    "language": key.language,
+                    "size_mb": loaded_model.size_bytes / 1024 ** 2,
+                }
+                for key, loaded_model in _loaded_models.items()
+            ],
+        }
@@ -0,0 +1,98 @@
+"""Pipeline of stages with declared inputs and outputs
+
+Every stage is a function that gets its inputs as keyword arguments and returns its outputs:
+nothing for no output, the value for one output and a tuple for more outputs.
+A stage runs as soon as all of its inputs are available, so independent stages run concurrently.
+"""
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+from modules.tracing import span
+
+
+@dataclass
+class Stage:
+    """Stage of the pipeline"""
+    name: str
+    run: Callable[..., Any]
+    inputs: list[str] = field(default_factory=list)
+    outputs: list[str] = field(default_factory=list)
+
+
+def validate_stages(stages: list[Stage], initial_values: dict) -> None:
+    """Check that every input is produced exactly once and the graph has no cycles"""
+    producers = {name: None for name in initial_values}
+    for stage in stages:
+        for output in stage.outputs:
+            if output in producers:
+                raise ValueError(f"Output {output} of stage {stage.name} is already produced")
+            producers[output] = stage.name
+
+    for stage in stages:
+        for stage_input in stage.inputs:
+            if stage_input not in producers:
+                raise ValueError(f"Input {stage_input} of stage {stage.name} is not produced by any stage")
+
+    available = set(initial_values)
+    remaining = list(stages)
+    while remaining:
+        ready = [stage for stage in remaining if all(i in available for i in stage.inputs)]
+        if not ready:
+            raise ValueError(f"Stages {[stage.name for stage in remaining]} have cyclic dependencies")
+        for stage in ready:
+            available.update(stage.outputs)
+            remaining.remove(stage)
+
+
+def __store_outputs(stage: Stage, result: Any, values: dict) -> None:
+    if len(stage.outputs) == 1:
+        values[stage.outputs[0]] = result
+    elif len(stage.outputs) > 1:
+        if not isinstance(result, tuple) or len(result) != len(stage.outputs):
+            raise ValueError(f"Stage {stage.name} must return {len(stage.outputs)} outputs")
+        for output, value in zip(stage.outputs, result):
+            values[output] = value
+
+
+def __run_stage(stage: Stage, values: dict) -> Any:
+    with span(stage.name):
+        return stage.run(**{stage_input: values[stage_input] for stage_input in stage.inputs})
+
+
+def run_stages(stages: list[Stage], initial_values: dict = None, max_workers: int = 1) -> dict:
+    """Run all stages in dependency order and return all values
+
+    With one worker the stages run in the calling thread in the declared order.
+    With more workers every stage runs on a thread pool as soon as its inputs are available.
+    """
+    values = dict(initial_values or {})
+    validate_stages(stages, values)
+    pending = list(stages)
+
+    if max_workers <= 1:
+        while pending:
+            stage = next(stage for stage in pending if all(i in values for i in stage.inputs))
+            pending.remove(stage)
+            __store_outputs(stage, __run_stage(stage, values), values)
+        return values
+
+    running: dict[Future, Stage] = {}
+    with ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="UltraSingerStage") as executor:
+        while pending or running:
+            for stage in [stage for stage in pending if all(i in values for i in stage.inputs)]:
+                pending.remove(stage)
+                running[executor.submit(__run_stage, stage, dict(values))] = stage
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                stage = running.pop(future)
+                exception = future.exception()
+                if exception is not None:
+                    # Let running stages finish, but do not start new ones
+                    pending.clear()
+                    wait(running)
+                    raise exception
+                __store_outputs(stage, future.result(), values)
+    return values
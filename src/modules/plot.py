@@ -4,10 +4,15 @@ from dataclasses import dataclass
 from re import sub
 
 import librosa
+import matplotlib
 import numpy
+
+# Plots are only saved to files and may be created outside the main thread
+matplotlib.use("Agg")
 from matplotlib import pyplot as plt
 from matplotlib.patches import Rectangle
 
+from modules.Audio.audio_store import load_audio
 from modules.ProcessData import ProcessData
 from modules.console_colors import ULTRASINGER_HEAD
 from modules.Pitcher.pitched_data import PitchedData
@@ -30,10 +35,9 @@ OCTAVES = [0, 1, 2, 3, 4, 5, 6, 7, 8]
 X_TICK_SIZE = 5
 
 
-def __get_frequency_range(midi_note: str) -> float:
+def __get_frequency_range(midi_note: int) -> float:
     """Get frequency range"""
-    midi = librosa.note_to_midi(midi_note)
-    frequency_range = librosa.midi_to_hz(midi + 1) - librosa.midi_to_hz(midi)
+    frequency_range = librosa.midi_to_hz(midi_note + 1) - librosa.midi_to_hz(midi_note)
     return frequency_range
 
 
@@ -187,31 +191,25 @@ def __create_gaps(pitched_data: PitchedData, step_size: float) -> PitchedData:
     This way the graph is only continuous where it should be.
 
     """
-    pitched_data_with_gaps = PitchedData([], [], [])
-
-    previous_time = 0
-    for i, time in enumerate(pitched_data.times):
-        comes_right_after_previous = time - previous_time <= step_size
-        previous_frequency_is_not_gap = (
-                len(pitched_data_with_gaps.frequencies) > 0
-                and str(pitched_data_with_gaps.frequencies[-1]) != "nan"
-        )
-        if previous_frequency_is_not_gap and not comes_right_after_previous:
-            pitched_data_with_gaps.times.append(time)
-            pitched_data_with_gaps.frequencies.append(float("nan"))
-            pitched_data_with_gaps.confidence.append(pitched_data.confidence[i])
-
-        pitched_data_with_gaps.times.append(time)
-        pitched_data_with_gaps.frequencies.append(pitched_data.frequencies[i])
-        pitched_data_with_gaps.confidence.append(pitched_data.confidence[i])
-
-        previous_time = time
+    times = pitched_data.times
+    frequencies = pitched_data.frequencies
+
+    # A gap goes before every frame which does not come right after a frame with a frequency
+    gap_indexes = numpy.flatnonzero(
+        (numpy.diff(times) > step_size) & ~numpy.isnan(frequencies[:-1])
+    ) + 1
+
+    pitched_data_with_gaps = PitchedData(
+        numpy.insert(times, gap_indexes, times[gap_indexes]),
+        numpy.insert(frequencies, gap_indexes, numpy.nan),
+        numpy.insert(pitched_data.confidence, gap_indexes, pitched_data.confidence[gap_indexes]),
+    )
 
     return pitched_data_with_gaps
 
 
-def __plot_word(midi_note: str, start, end, word):
-    note_frequency = librosa.note_to_hz(midi_note)
+def __plot_word(midi_note: int, start, end, word):
+    note_frequency = librosa.midi_to_hz(midi_note)
     frequency_range = __get_frequency_range(midi_note)
 
     half_frequency_range = frequency_range / 2
@@ -240,7 +238,7 @@ def __plot_words(midi_segments: list[MidiSegment]):
     """Draw rectangles for each word"""
     if midi_segments is not None:
         for i, midi_segment in enumerate(midi_segments):
-            __plot_word(midi_segment.note, midi_segment.start, midi_segment.end, midi_segment.word)
+            __plot_word(midi_segment.midi_note, midi_segment.start, midi_segment.end, midi_segment.word)
 
 
 def __snake(s):
@@ -263,7 +261,7 @@ def __plot_spectrogram(audio_seperation_path: str,
         f"{ULTRASINGER_HEAD} Creating plot{': ' + title}"
     )
 
-    audio, sr = librosa.load(audio_seperation_path, sr=None)
+    audio, sr = load_audio(audio_seperation_path)
     powerSpectrum, frequenciesFound, time, imageAxis = plt.specgram(audio, Fs=sr)
     plt.colorbar()
 
@@ -0,0 +1,209 @@
+"""Content-addressed cache of stage results
+
+Every entry is a folder <root>/<stage>/<key>. The key is a hash of the input file contents, the stage
+parameters and the code version, so the same audio hits the cache independent of its name or output folder.
+Entries are created in a temporary folder and renamed when complete, so a crashed run never leaves a
+truncated entry behind.
+
+The cache can be kept below a disk budget. Entries are evicted least recently used first, but cheap to keep
+results like transcriptions and pitch data are only evicted when no large audio intermediates are left.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable
+
+from modules.console_colors import ULTRASINGER_HEAD, green_highlighted
+from modules.tracing import annotate
+
+HASH_BLOCK_SIZE = 1024 * 1024
+TEMP_ENTRY_SUFFIX = ".tmp"
+
+# Entries of lower tiers are evicted first. Stages without a tier are in tier 0
+STAGE_RETENTION_TIERS = {
+    "separation": 0,
+    "denoise": 0,
+    "preprocess": 0,
+    "transcription": 1,
+    "pitch": 1,
+}
+# Entries used within this time may belong to a song running in another process
+EVICTION_GRACE_SECONDS = 10 * 60
+
+_file_hashes: dict[tuple[str, int, int], str] = {}
+_file_hashes_lock = threading.Lock()
+
+
+def get_file_hash(file_path: str) -> str:
+    """Sha256 of the file content, remembered as long as path, size and modification time stay the same"""
+    stat = os.stat(file_path)
+    file_id = (os.path.abspath(file_path), stat.st_size, stat.st_mtime_ns)
+    with _file_hashes_lock:
+        if file_id in _file_hashes:
+            return _file_hashes[file_id]
+
+    file_hash = hashlib.sha256()
+    with open(file_path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            file_hash.update(block)
+
+    with _file_hashes_lock:
+        _file_hashes[file_id] = file_hash.hexdigest()
+    return _file_hashes[file_id]
+
+
+@dataclass
+class CacheEntry:
+    """Entry of the stage cache on disk"""
+    path: str
+    stage: str
+    size: int
+    last_used: float
+
+
+def get_folder_size(folder_path: str) -> int:
+    """Size of all files in a folder in bytes"""
+    size = 0
+    for root, _, files in os.walk(folder_path):
+        for name in files:
+            try:
+                size += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                # File was removed in the meantime
+                pass
+    return size
+
+
+class StageCache:
+    """Content-addressed cache of stage results"""
+
+    def __init__(self, root_folder_path: str, code_version: str):
+        self.root_folder_path = root_folder_path
+        self.code_version = code_version
+
+    def get_key(self, stage: str, input_file_paths: list[str], params: dict) -> str:
+        """Key of a stage result from its input files, parameters and the code version"""
+        content = json.dumps(
+            {
+                "stage": stage,
+                "version": self.code_version,
+                "inputs": [get_file_hash(path) for path in input_file_paths],
+                "params": params,
+            },
+            sort_keys=True,
+            default=str,
+        )
+        return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+    def get_entry_path(self, stage: str, key: str) -> str:
+        return os.path.join(self.root_folder_path, stage, key)
+
+    def get_or_create(self, stage: str, input_file_paths: list[str], params: dict,
+                      create: Callable[[str], None], skip_cache: bool = False) -> tuple[str, bool]:
+        """Get the entry folder of a stage result, create it if it is missing
+
+        create gets an empty folder and must write the stage result into it.
+        Returns the entry folder and whether it was found in the cache.
+        """
+        key = self.get_key(stage, input_file_paths, params)
+        entry_path = self.get_entry_path(stage, key)
+        if not skip_cache and os.path.isdir(entry_path):
+            print(f"{ULTRASINGER_HEAD} {green_highlighted('cache')} reusing cached {stage}")
+            self.__touch(entry_path)
+            annotate(**{f"cache_{stage}": "hit"})
+            return entry_path, True
+
+        annotate(**{f"cache_{stage}": "miss"})
+
+        temp_entry_path = f"{entry_path}.{uuid.uuid4().hex}{TEMP_ENTRY_SUFFIX}"
+        os.makedirs(temp_entry_path)
+        try:
+            create(temp_entry_path)
+            if skip_cache and os.path.isdir(entry_path):
+                shutil.rmtree(entry_path)
+            try:
+                os.replace(temp_entry_path, entry_path)
+            except OSError:
+                # Another process created the same entry in the meantime
+                if not os.path.isdir(entry_path):
+                    raise
+        finally:
+            if os.path.isdir(temp_entry_path):
+                shutil.rmtree(temp_entry_path)
+        return entry_path, False
+
+    def list_entries(self) -> list[CacheEntry]:
+        """All complete entries of the cache"""
+        entries = []
+        if not os.path.isdir(self.root_folder_path):
+            return entries
+        for stage in os.listdir(self.root_folder_path):
+            stage_path = os.path.join(self.root_folder_path, stage)
+            if not os.path.isdir(stage_path):
+                continue
+            for name in os.listdir(stage_path):
+                path = os.path.join(stage_path, name)
+                if name.endswith(TEMP_ENTRY_SUFFIX) or not os.path.isdir(path):
+                    continue
+                try:
+                    last_used = os.path.getmtime(path)
+                except OSError:
+                    continue
+                entries.append(CacheEntry(path, stage, get_folder_size(path), last_used))
+        return entries
+
+    def evict(self, max_size: int, grace_seconds: float = 0) -> list[CacheEntry]:
+        """Evict entries until the cache is below max_size bytes and return the evicted entries
+
+        Lower retention tiers are evicted first and within a tier the least recently used entry.
+        Entries used within grace_seconds are kept, use EVICTION_GRACE_SECONDS if other processes share the cache.
+        """
+        self.__remove_stale_temp_entries()
+        entries = self.list_entries()
+        total_size = sum(entry.size for entry in entries)
+        grace_time = time.time() - grace_seconds
+
+        evicted = []
+        for entry in sorted(entries, key=lambda e: (STAGE_RETENTION_TIERS.get(e.stage, 0), e.last_used)):
+            if total_size <= max_size:
+                break
+            if entry.last_used > grace_time:
+                continue
+            shutil.rmtree(entry.path, ignore_errors=True)
+            total_size -= entry.size
+            evicted.append(entry)
+
+        if evicted:
+            print(
+                f"{ULTRASINGER_HEAD} {green_highlighted('cache')} evicted {len(evicted)} entries, "
+                f"{total_size / 1024 ** 3:.2f} GB left"
+            )
+        return evicted
+
+    def __remove_stale_temp_entries(self) -> None:
+        if not os.path.isdir(self.root_folder_path):
+            return
+        grace_time = time.time() - EVICTION_GRACE_SECONDS
+        for stage in os.listdir(self.root_folder_path):
+            stage_path = os.path.join(self.root_folder_path, stage)
+            if not os.path.isdir(stage_path):
+                continue
+            for name in os.listdir(stage_path):
+                path = os.path.join(stage_path, name)
+                if name.endswith(TEMP_ENTRY_SUFFIX) and os.path.getmtime(path) < grace_time:
+                    # Left behind by a crashed run
+                    shutil.rmtree(path, ignore_errors=True)
+
+    @staticmethod
+    def __touch(entry_path: str) -> None:
+        """Mark the entry as used, the modification time of the folder is the last use"""
+        try:
+            os.utime(entry_path)
+        except OSError:
+            pass
@@ -0,0 +1,232 @@
+"""Tracing of the processing stages
+
+Every span records wall time, CPU time of its thread and of finished subprocesses like ffmpeg,
+growth of the resident memory, bytes read and written and annotations like cache hits.
+Subprocess CPU time, memory and IO are measured for the whole process, so concurrent spans share them.
+The peak resident memory is only reported for the whole process, as the OS does not reset it per span.
+The report is written as JSON and as a Chrome trace event file, which can be opened in chrome://tracing or Perfetto.
+"""
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass, field, asdict
+from typing import Optional
+
+from modules.console_colors import ULTRASINGER_HEAD, blue_highlighted
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows
+    resource = None
+
+PROC_IO_PATH = "/proc/self/io"
+PROC_STATM_PATH = "/proc/self/statm"
+
+
+@dataclass
+class Span:
+    """Measured span of a stage"""
+    name: str
+    parent: Optional[str]
+    thread_name: str
+    thread_id: int
+    start_seconds: float
+    wall_seconds: float = 0.0
+    cpu_seconds: float = 0.0
+    children_cpu_seconds: Optional[float] = None
+    rss_delta_mb: Optional[float] = None
+    read_bytes: Optional[int] = None
+    write_bytes: Optional[int] = None
+    attributes: dict = field(default_factory=dict)
+
+
+class Tracer:
+    """Collects the spans of one song"""
+
+    def __init__(self, name: str = ""):
+        self.name = name
+        self.start_time = time.time()
+        self.start_counter = time.perf_counter()
+        self.spans: list[Span] = []
+        self.attributes: dict = {}
+        self.__lock = threading.Lock()
+
+    def add_span(self, span: Span) -> None:
+        with self.__lock:
+            self.spans.append(span)
+
+    def elapsed_seconds(self) -> float:
+        return time.perf_counter() - self.start_counter
+
+    def to_dict(self) -> dict:
+        with self.__lock:
+            spans = [asdict(span) for span in self.spans]
+        return {
+            "name": self.name,
+            "start_time": self.start_time,
+            "wall_seconds": self.elapsed_seconds(),
+            "process_peak_rss_mb": get_peak_rss_mb(),
+            "attributes": self.attributes,
+            "spans": spans,
+        }
+
+    def to_chrome_trace(self) -> dict:
+        """Trace events with complete events for the spans"""
+        pid = os.getpid()
+        with self.__lock:
+            spans = list(self.spans)
+        events = [
+            {
+                "name": span.name,
+                "cat": "stage",
+                "ph": "X",
+                "ts": span.start_seconds * 1e6,
+                "dur": span.wall_seconds * 1e6,
+                "pid": pid,
+                "tid": span.thread_id,
+                "args": {
+                    "cpu_seconds": span.cpu_seconds,
+                    "children_cpu_seconds": span.children_cpu_seconds,
+                    "rss_delta_mb": span.rss_delta_mb,
+                    "read_bytes": span.read_bytes,
+                    "write_bytes": span.write_bytes,
+                    **span.attributes,
+                },
+            }
+            for span in spans
+        ]
+        thread_names = {span.thread_id: span.thread_name for span in spans}
+        events += [
+            {"name": "thread_name", "ph": "M", "pid": pid, "tid": thread_id, "args": {"name": thread_name}}
+            for thread_id, thread_name in thread_names.items()
+        ]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+_tracer: Optional[Tracer] = None
+_local = threading.local()
+
+
+def get_children_cpu_seconds() -> Optional[float]:
+    """CPU time of all finished subprocesses"""
+    if resource is None:
+        return None
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def get_resident_bytes() -> Optional[int]:
+    """Current resident memory of the process"""
+    try:
+        with open(PROC_STATM_PATH, "r", encoding="utf-8") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+def get_peak_rss_mb() -> Optional[float]:
+    """Peak resident memory of the process since its start, in the daemon also of the previous songs"""
+    if resource is None:
+        return None
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Bytes on macOS, kilobytes on Linux
+    return max_rss / 1024 ** 2 if sys.platform == "darwin" else max_rss / 1024
+
+
+def get_io_bytes() -> tuple[Optional[int], Optional[int]]:
+    """Bytes read from and written to storage by the process"""
+    try:
+        with open(PROC_IO_PATH, "r", encoding="utf-8") as file:
+            values = dict(line.split(": ") for line in file.read().splitlines())
+        return int(values["read_bytes"]), int(values["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None, None
+
+
+def start_trace(name: str = "") -> Tracer:
+    """Start collecting spans"""
+    global _tracer
+    _tracer = Tracer(name)
+    return _tracer
+
+
+def stop_trace() -> Optional[Tracer]:
+    """Stop collecting spans and return the tracer"""
+    global _tracer
+    tracer, _tracer = _tracer, None
+    return tracer
+
+
+def __difference(end, start):
+    if end is None or start is None:
+        return None
+    return end - start
+
+
+@contextmanager
+def span(name: str, **attributes):
+    """Measure the enclosed code as span, does nothing if no trace is running"""
+    tracer = _tracer
+    if tracer is None:
+        yield None
+        return
+
+    stack = getattr(_local, "stack", None)
+    if stack is None:
+        stack = _local.stack = []
+    thread = threading.current_thread()
+    current = Span(
+        name=name,
+        parent=stack[-1].name if stack else None,
+        thread_name=thread.name,
+        thread_id=thread.ident,
+        start_seconds=tracer.elapsed_seconds(),
+        attributes=dict(attributes),
+    )
+    start_counter = time.perf_counter()
+    start_cpu = time.thread_time()
+    start_children_cpu = get_children_cpu_seconds()
+    start_resident_bytes = get_resident_bytes()
+    start_read, start_write = get_io_bytes()
+    stack.append(current)
+    try:
+        yield current
+    finally:
+        stack.pop()
+        current.wall_seconds = time.perf_counter() - start_counter
+        current.cpu_seconds = time.thread_time() - start_cpu
+        current.children_cpu_seconds = __difference(get_children_cpu_seconds(), start_children_cpu)
+        resident_bytes_delta = __difference(get_resident_bytes(), start_resident_bytes)
+        current.rss_delta_mb = None if resident_bytes_delta is None else resident_bytes_delta / 1024 ** 2
+        end_read, end_write = get_io_bytes()
+        current.read_bytes = __difference(end_read, start_read)
+        current.write_bytes = __difference(end_write, start_write)
+        tracer.add_span(current)
+
+
+def annotate(**attributes) -> None:
+    """Add attributes to the innermost running span of the current thread"""
+    stack = getattr(_local, "stack", None)
+    if _tracer is not None and stack:
+        stack[-1].attributes.update(attributes)
+
+
+def write_trace_report(tracer: Tracer, output_folder_path: str, basename: str) -> tuple[str, str]:
+    """Write the JSON report and the Chrome trace of a song and print the slowest stages"""
+    report_path = os.path.join(output_folder_path, f"{basename}.trace.json")
+    chrome_trace_path = os.path.join(output_folder_path, f"{basename}.chrome_trace.json")
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(tracer.to_dict(), file, indent=2)
+    with open(chrome_trace_path, "w", encoding="utf-8") as file:
+        json.dump(tracer.to_chrome_trace(), file)
+
+    print(f"{ULTRASINGER_HEAD} {blue_highlighted('Trace')} total {tracer.elapsed_seconds():.2f}s -> {report_path}")
+    top_level_spans = [span for span in tracer.spans if span.parent is None]
+    for top_span in sorted(top_level_spans, key=lambda s: s.wall_seconds, reverse=True):
+        print(f"{ULTRASINGER_HEAD}   {top_span.name}: {top_span.wall_seconds:.2f}s wall, {top_span.cpu_seconds:.2f}s cpu")
+    return report_path, chrome_trace_path